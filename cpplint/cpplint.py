@@ -41,17 +41,38 @@ We do a small hack, which is to ignore //'s with "'s after them on the
 same line, but it is far from perfect (in either direction).
 """
 
+import array
+import bisect
 import codecs
+import collections
 import copy
+import cProfile
 import getopt
+import heapq
+import io
+import itertools
+import json
 import math  # for log
+import mmap
+import multiprocessing
 import os
 import re
+import signal
+import socket
 import sre_compile
+import stat
 import string
+import subprocess
 import sys
+import threading
+import time
+import traceback
 import unicodedata
-import sysconfig
+
+try:
+  from urllib import unquote  # Python 2
+except ImportError:
+  from urllib.parse import unquote  # Python 3
 
 try:
   xrange          # Python 2
@@ -63,8 +84,18 @@ _USAGE = """
 Syntax: cpplint.py [--verbose=#] [--output=vs7] [--filter=-x,+y,...]
                    [--counting=total|toplevel|detailed] [--root=subdir]
                    [--linelength=digits] [--headers=x,y,...]
+                   [--mmap_threshold=bytes] [--stream_threshold=bytes]
+                   [--long_line_threshold=chars]
+                   [--generated_files=skip|reduced|full]
+                   [--profile] [--regex_stats=file] [--report-slow=N]
+                   [--profile-output=path] [--metrics=file]
+                   [--diff=rev|-] [--staged] [--files-from=path|-]
                    [--quiet]
         <file> [file] ...
+       cpplint.py --files-from-git [flags] [pathspec] ...
+       cpplint.py --daemon=socket
+       cpplint.py --persistent-worker
+       cpplint.py --lsp [flags]
 
   The style guidelines this tries to follow are those in
     https://google.github.io/styleguide/cppguide.html
@@ -93,6 +124,54 @@ Syntax: cpplint.py [--verbose=#] [--output=vs7] [--filter=-x,+y,...]
     quiet
       Don't print anything if no errors are found.
 
+    profile
+      At the end, print a table of the calls, time and errors of each check
+      function, and of the setup phases such as building CleansedLines.
+      "Self s" is the time spent in the function itself, "Total s" includes
+      the checks that it calls, and "Errors" counts the errors the function
+      emitted itself, before filtering.  Without this flag the checks run
+      unwrapped, so they cost nothing extra.
+
+    regex_stats=file
+      Write the number of calls, matches and seconds of each regular
+      expression pattern to file as JSON, most expensive first.  Patterns
+      whose slowest call on a single line took 10ms or more are marked as
+      suspected of catastrophic backtracking, along with the start of that
+      line.  Covers the patterns run through Match, Search and ReplaceAll
+      and the module-level _LazyRegex patterns.
+
+      Examples:
+        --regex_stats=regex_stats.json
+
+    report-slow=N
+      At the end, print the N files that took longest to lint and the N
+      lines that took longest to check, with their durations.
+
+      Examples:
+        --report-slow=10
+
+    profile-output=path
+      Profile the run and write the profile to path.  If path ends with
+      .json, it is a speedscope flame graph (https://www.speedscope.app) with
+      one profile per linted file, whose frames are the checks, the setup
+      phases and ProcessLine.  Otherwise it is a cProfile dump of the whole
+      run, for the pstats module, snakeviz and similar tools; it covers every
+      function but adds the files together.
+
+      Examples:
+        --profile-output=cpplint.prof
+        --profile-output=cpplint.speedscope.json
+
+    metrics=file
+      At the end, write counters of the run to file in the OpenMetrics text
+      format, for Prometheus and similar scrapers: the files, lines and bytes
+      read, the CPPLINT.cfg files parsed, the hits and misses of the regexp
+      cache, the errors reported per category, and the wall-clock and CPU
+      seconds of the run.
+
+      Examples:
+        --metrics=cpplint.prom
+
     filter=-x,+y,...
       Specify a comma-separated list of category-filters to apply: only
       error messages whose category names pass the filters will be printed.
@@ -153,6 +232,133 @@ Syntax: cpplint.py [--verbose=#] [--output=vs7] [--filter=-x,+y,...]
         --headers=hpp,hxx
         --headers=hpp
 
+    mmap_threshold=bytes
+      Files of at least this size are memory-mapped and their lines are
+      decoded as the checks need them, instead of the whole file being held
+      in memory.  The default is 67108864 (64MB).
+
+      Examples:
+        --mmap_threshold=1000000
+
+    stream_threshold=bytes
+      Files of at least this size are linted in streaming mode, which reads
+      them twice but only keeps the lines near the one being checked in
+      memory, so memory use does not grow with the file.  Checks that need
+      to see further than 1000 lines away may miss or misreport constructs
+      that span more lines than that, and the header guard check is
+      skipped.  By default streaming mode is off.
+
+      Examples:
+        --stream_threshold=500000000
+
+    long_line_threshold=chars
+      Lines longer than this, such as the lines of minified code, only get
+      the NOLINT, tab, trailing whitespace and line length checks, because
+      the other checks can take time quadratic in the length of a line.
+      Each such line is reported as readability/long_line.  The default is
+      10000; 0 checks every line in full.
+
+      Examples:
+        --long_line_threshold=50000
+
+    generated_files=skip|reduced|full
+      What to do with files whose first 4096 characters contain a marker
+      of generated code, such as "DO NOT EDIT", "@generated" or the banners
+      of protoc, flatc and SWIG.  "skip" ignores them, "reduced" only checks
+      their lines for invalid UTF-8, NUL bytes, tabs, trailing whitespace,
+      length and mixed line endings, and "full" lints them like any other
+      file.  The default is full.
+
+      Examples:
+        --generated_files=skip
+
+    diff=rev|-
+      Only report errors on the lines changed since the git revision rev,
+      as "git diff rev" shows them for the current directory, or by the
+      unified diff given on stdin for "-".  The files are those the diff
+      changes, or the ones given that it changes; files where it only
+      removes lines are not linted.  Most checks only run near the changed
+      lines, so an error they would find on a changed line from further
+      away is missed.  A file the diff adds also gets the errors about the
+      whole file, such as a missing copyright line.
+
+      Examples:
+        --diff=origin/main
+        git diff -U0 HEAD~3 | cpplint.py --diff=-
+
+    staged
+      Lint what is staged in git, as a pre-commit hook would: the files
+      added, copied or modified in the index under the current directory,
+      or the ones given among them, as they are in the index.  The names of
+      the files still find their CPPLINT.cfg files and header guards.  With
+      --diff=rev, the index is compared with rev.
+
+      Examples:
+        --staged --diff=HEAD
+
+    files-from-git
+      Lint the files git tracks under the current directory, or the ones
+      matching the pathspecs given instead of files, as listed by one
+      git ls-files.  Files without a valid extension, and files excluded by
+      the exclude_files of their CPPLINT.cfg files, are skipped without a
+      message.  Linting starts while git is still listing files.
+
+      Examples:
+        --files-from-git
+        --files-from-git 'src/*.cc'
+
+    files-from=path|-
+      Also lint the files listed in the file at path, or on stdin for "-",
+      after the ones given.  The names are separated by NUL characters, as
+      find -print0 writes them, or else by line feeds.  The list is read as
+      files are linted, so it can come from a pipe and be of any length.
+
+      Examples:
+        find src -name '*.cc' -print0 | cpplint.py --files-from=-
+
+    Any argument @path is replaced by the arguments in the file at path, one
+    per line, so that flags and files do not have to fit on the command line.
+
+      Examples:
+        cpplint.py --quiet @files.txt
+
+    daemon=socket
+      Instead of linting files, listen on a Unix socket for the requests of
+      cpplint_client.py, which forwards its arguments and prints the same
+      output, with the same exit code, as cpplint.py would.  The daemon
+      keeps its compiled regexps, parsed CPPLINT.cfg files and version
+      control roots between requests, and reads a file or directory again
+      once its modification time changes.  Requests are served one at a
+      time; stop the daemon with SIGTERM or SIGINT.
+
+      Examples:
+        --daemon=/tmp/cpplint.sock
+
+    persistent-worker
+      Instead of linting files, read one JSON request per line from stdin
+      and write one JSON response per line to stdout, for build systems
+      that keep workers alive between actions.  A request looks like
+        {"id": 1, "flags": ["--linelength=100"], "files": ["a.cc"],
+         "contents": {"a.cc": "text to lint instead of the file"},
+         "cwd": "directory to run in"}
+      where only "files" is required.  The response has the "id", the
+      "exit" status, the "errors" as objects with the "file", "line",
+      "category", "confidence" and "message", the "error_count", the
+      "errors_by_category" counted as --counting asks, the rest of the
+      "stdout" and "stderr" output, and the wall-clock "seconds".  No state
+      is shared between requests except caches, which follow changes to
+      the files on disk.
+
+    lsp
+      Instead of linting files, serve the Language Server Protocol on stdin
+      and stdout.  The errors of the documents open in the editor are
+      published as diagnostics, with the category as the code and the
+      confidence in the data: when a document is opened, and when it has
+      not changed for 0.3 seconds after a change.  A lint is abandoned once
+      the document changes again.  The other flags given, and the
+      CPPLINT.cfg files, apply to every lint.  After an edit, only the
+      lines near it are checked again.
+
     cpplint.py supports per-directory configurations specified in CPPLINT.cfg
     files. CPPLINT.cfg file can contain a number of key=value pairs.
     Currently the following options are supported:
@@ -163,6 +369,8 @@ Syntax: cpplint.py [--verbose=#] [--output=vs7] [--filter=-x,+y,...]
       linelength=80
       root=subdir
       headers=x,y,...
+      generated_files=skip|reduced|full
+      generated_marker=text
 
     "set noparent" option prevents cpplint from traversing directory tree
     upwards looking for more .cfg files in parent directories. This option
@@ -184,6 +392,10 @@ Syntax: cpplint.py [--verbose=#] [--output=vs7] [--filter=-x,+y,...]
     The "headers" option is similar in function to the --headers flag
     (see example above).
 
+    The "generated_files" option is similar in function to the
+    --generated_files flag, and takes precedence over it.  Each
+    "generated_marker" line adds a text that marks a file as generated.
+
     CPPLINT.cfg has an effect on files in the same directory and all
     sub-directories, unless overridden by a nested configuration file.
 
@@ -226,6 +438,7 @@ _ERROR_CATEGORIES = [
     'readability/constructors',
     'readability/fn_size',
     'readability/inheritance',
+    'readability/long_line',
     'readability/multiline_comment',
     'readability/multiline_string',
     'readability/namespace',
@@ -543,6 +756,61 @@ _SEARCH_KERNEL_FILE = re.compile(r'\b(?:LINT_KERNEL_FILE)')
 
 _regexp_compile_cache = {}
 
+
+class _LazyRegex(object):
+  """A module-level regexp that is compiled the first time it is used.
+
+  Patterns that are tried against every line are declared with this class
+  instead of being passed to Match/Search as literals, which would hash the
+  pattern and look it up in _regexp_compile_cache on every call.  Compiling
+  is deferred so that importing cpplint stays cheap.  The first call to
+  match, search or sub compiles the pattern and rebinds those methods on the
+  instance to the ones of the compiled object, so later calls go straight
+  to the regexp engine.  With --regex_stats they are bound to recording
+  wrappers instead.
+  """
+
+  # Every instance, so that Reset() can undo the rebinding.
+  _instances = []
+
+  def __init__(self, pattern):
+    self.pattern = pattern
+    _LazyRegex._instances.append(self)
+
+  def _Compile(self):
+    if self.pattern not in _regexp_compile_cache:
+      _regexp_compile_cache[self.pattern] = sre_compile.compile(self.pattern)
+    compiled = _regexp_compile_cache[self.pattern]
+    regex_stats = _cpplint_state.regex_stats
+    if regex_stats is None:
+      self.match = compiled.match
+      self.search = compiled.search
+      self.sub = compiled.sub
+    else:
+      self.match = regex_stats.Wrap(self.pattern, compiled.match)
+      self.search = regex_stats.Wrap(self.pattern, compiled.search)
+      self.sub = regex_stats.Wrap(self.pattern, compiled.sub)
+
+  @classmethod
+  def Reset(cls):
+    """Makes every instance bind its methods again on its next use."""
+    for instance in cls._instances:
+      for name in ('match', 'search', 'sub'):
+        instance.__dict__.pop(name, None)
+
+  def match(self, s):
+    self._Compile()
+    return self.match(s)
+
+  def search(self, s):
+    self._Compile()
+    return self.search(s)
+
+  def sub(self, rep, s):
+    self._Compile()
+    return self.sub(rep, s)
+
+
 # {str, set(int)}: a map from error categories to sets of linenumbers
 # on which those errors are expected and should be suppressed.
 _error_suppressions = {}
@@ -556,6 +824,57 @@ _root_debug = False
 # This is set by --linelength flag.
 _line_length = 80
 
+# Files of at least this many bytes are memory-mapped and their lines are
+# decoded on demand instead of being read into memory as a whole.
+# This is set by --mmap_threshold flag.
+_mmap_threshold = 64 * 1024 * 1024
+
+# Files of at least this many bytes are linted in streaming mode, which only
+# keeps a window of lines in memory (see ProcessFileStream).  0 disables it.
+# This is set by --stream_threshold flag.
+_stream_threshold = 0
+
+# Lines longer than this many characters only get the checks of
+# CheckLongLine, since some regexps of the other checks take time quadratic
+# in the length of a line.  0 disables the limit.
+# This is set by --long_line_threshold flag.
+_long_line_threshold = 10000
+
+# Text that marks a file as the output of a code generator when it occurs in
+# the first _GENERATED_FILE_HEAD_SIZE characters of the file.  CPPLINT.cfg
+# can add more with generated_marker.
+_GENERATED_FILE_MARKERS = (
+    'DO NOT EDIT',
+    '@generated',
+    'Generated by the protocol buffer compiler',
+    'automatically generated by the FlatBuffers compiler',
+    'automatically generated by SWIG',
+    )
+_GENERATED_FILE_HEAD_SIZE = 4096
+
+# What is done with generated files: 'skip' them, run only the 'reduced'
+# checks of ProcessGeneratedFileData, or lint them in 'full' like any file.
+# This is set by --generated_files flag, and by the generated_files option
+# of CPPLINT.cfg for the files it applies to.
+_GENERATED_FILE_POLICIES = ('skip', 'reduced', 'full')
+_generated_files = 'full'
+
+# The Unix socket that --daemon listens on, or None to lint the files given.
+# This is set by --daemon flag.
+_daemon_socket = None
+
+# Whether to answer the JSON requests read from stdin instead of linting the
+# files given.  This is set by --persistent-worker flag.
+_persistent_worker = False
+
+# Whether to serve the Language Server Protocol on stdin and stdout instead of
+# linting the files given.  This is set by --lsp flag.
+_lsp = False
+
+# The number of lines on each side of the line being checked that streaming
+# mode keeps in memory.
+_STREAM_CONTEXT_LINES = 1000
+
 # The allowed extensions for file names
 # This is set by --extensions flag.
 _valid_extensions = set(['cc', 'h', 'cpp', 'cu', 'cuh'])
@@ -580,6 +899,9 @@ def ProcessHppHeadersOption(val):
 def IsHeaderExtension(file_extension):
   return file_extension in _hpp_headers
 
+_RE_NOLINT = _LazyRegex(r'\bNOLINT(NEXTLINE)?\b(\([^)]+\))?')
+
+
 def ParseNolintSuppressions(filename, raw_line, linenum, error):
   """Updates the global list of line error-suppressions.
 
@@ -593,7 +915,7 @@ def ParseNolintSuppressions(filename, raw_line, linenum, error):
     linenum: int, the number of the current line.
     error: function, an error handler.
   """
-  matched = Search(r'\bNOLINT(NEXTLINE)?\b(\([^)]+\))?', raw_line)
+  matched = _RE_NOLINT.search(raw_line)
   if matched:
     if matched.group(1):
       suppressed_line = linenum + 1
@@ -699,7 +1021,9 @@ class _IncludeState(object):
 
   include_list contains list of lists of (header, line number) pairs.
   It's a lists of lists rather than just one flat list to make it
-  easier to update across preprocessor boundaries.
+  easier to update across preprocessor boundaries.  Headers are added with
+  AddInclude(), which also indexes them so that FindHeader() does not have
+  to scan the list.
 
   Call CheckNextIncludeOrder() once for each header in the file, passing
   in the type constants defined above. Calls in an illegal order will
@@ -731,6 +1055,7 @@ class _IncludeState(object):
 
   def __init__(self):
     self.include_list = [[]]
+    self._header_lines = {}  # The line number of each header in include_list.
     self.ResetSection('')
 
   def FindHeader(self, header):
@@ -742,11 +1067,17 @@ class _IncludeState(object):
       Line number of previous occurrence, or -1 if the header has not
       been seen before.
     """
-    for section_list in self.include_list:
-      for f in section_list:
-        if f[0] == header:
-          return f[1]
-    return -1
+    return self._header_lines.get(header, -1)
+
+  def AddInclude(self, header, linenum):
+    """Adds a header that was not included before to the current section.
+
+    Args:
+      header: The header, as written in the #include.
+      linenum: The number of the line of the #include.
+    """
+    self.include_list[-1].append((header, linenum))
+    self._header_lines[header] = linenum
 
   def ResetSection(self, directive):
     """Reset section checking for preprocessor directive.
@@ -764,6 +1095,8 @@ class _IncludeState(object):
     if directive in ('if', 'ifdef', 'ifndef'):
       self.include_list.append([])
     elif directive in ('else', 'elif'):
+      for (header, _) in self.include_list[-1]:
+        del self._header_lines[header]
       self.include_list[-1] = []
 
   def SetLastHeader(self, header_path):
@@ -872,6 +1205,37 @@ class _CppLintState(object):
     self.counting = 'total'  # In what way are we counting errors?
     self.errors_by_category = {}  # string to int dict storing error counts
     self.quiet = False  # Suppress non-error messagess?
+    self.profile = None  # A _CheckProfile when --profile is given.
+    self.regex_stats = None  # A _RegexStats when --regex_stats is given.
+    self.regex_stats_path = None  # Where the _RegexStats are written.
+    self.slow_report = None  # A _SlowReport when --report-slow is given.
+    # A _PstatsProfile or _SpeedscopeProfile when --profile-output is given.
+    self.profile_output = None
+    self.profile_output_path = None  # Where the profile_output is written.
+    self.metrics = None  # A _RunMetrics when --metrics is given.
+    self.metrics_path = None  # Where the _RunMetrics are written.
+    self._recorders = []  # The recorders above, in the order they started.
+    # The generated file policy and markers for the file being processed,
+    # set by ProcessConfigOverrides.
+    self.generated_files = 'full'
+    self.generated_file_markers = list(_GENERATED_FILE_MARKERS)
+    # When a list, Error() appends the errors to it as (filename, linenum,
+    # category, confidence, message) instead of printing them.
+    self.findings = None
+    # The bytes to lint instead of the contents of a file, by filename.
+    self.file_contents = {}
+    # When a dict, ProcessFile lints each file with the IncrementalLinter
+    # kept in it by filename instead of with ProcessFileData.
+    self.incremental_linters = None
+    # When a dict, --diff was given: the numbers of the lines it changed, by
+    # filename.  Only errors on them are reported.
+    self.changed_lines = None
+    # When set, a function without arguments that returns True once the lint
+    # is no longer wanted; IncrementalLinter.Update() then stops early.
+    self.cancelled = None
+    # Whether the checks may look around a file on disk: for the top of its
+    # repository, for its header and for the headers it includes.
+    self.filesystem_lookups = True
 
     # output format:
     # "emacs" - format that emacs can parse (default)
@@ -935,6 +1299,60 @@ class _CppLintState(object):
     """ Restores filters previously backed up."""
     self.filters = self._filters_backup[:]
 
+  def EnableProfile(self):
+    """Starts recording a _CheckProfile of the checks that are run."""
+    if self.profile is None:
+      self.profile = _CheckProfile()
+      self._StartRecorder(self.profile)
+
+  def EnableRegexStats(self, path):
+    """Starts recording _RegexStats, to be written as JSON to path."""
+    if self.regex_stats is None:
+      self.regex_stats = _RegexStats()
+      self._StartRecorder(self.regex_stats)
+    self.regex_stats_path = path
+
+  def EnableSlowReport(self, limit):
+    """Starts recording the limit slowest files and lines."""
+    if self.slow_report is None:
+      self.slow_report = _SlowReport(limit)
+      self._StartRecorder(self.slow_report)
+
+  def EnableProfileOutput(self, path):
+    """Starts recording a profile, to be written to path.
+
+    The profile is a speedscope JSON file if path ends with .json, and a
+    pstats dump otherwise.
+    """
+    if self.profile_output is None:
+      if path.endswith('.json'):
+        self.profile_output = _SpeedscopeProfile()
+      else:
+        self.profile_output = _PstatsProfile()
+      self._StartRecorder(self.profile_output)
+    self.profile_output_path = path
+
+  def EnableMetrics(self, path):
+    """Starts counting _RunMetrics, to be written to path."""
+    if self.metrics is None:
+      self.metrics = _RunMetrics()
+      self._StartRecorder(self.metrics)
+    self.metrics_path = path
+
+  def _StartRecorder(self, recorder):
+    """Enables a recorder and remembers it for StopRecorders()."""
+    recorder.Enable()
+    self._recorders.append(recorder)
+
+  def StopRecorders(self):
+    """Disables the recorders, last started first.
+
+    Recorders that wrap the same function must be unwrapped in reverse order,
+    or the original function would be replaced by an outer wrapper again.
+    """
+    while self._recorders:
+      self._recorders.pop().Disable()
+
   def ResetErrorCounts(self):
     """Sets the module's error statistic back to zero."""
     self.error_count = 0
@@ -1094,6 +1512,30 @@ class _IncludeError(Exception):
   pass
 
 
+# The directories that mark the top of a git, hg or svn checkout.
+_VCS_DIRECTORIES = ('.git', '.hg', '.svn')
+
+# The _VCS_DIRECTORIES found in each directory looked at so far, by path, as
+# (mtime, names).  Creating or removing one of them changes the mtime of the
+# directory, which makes a long-running process such as --daemon look again.
+_vcs_directory_cache = {}
+
+
+def _VcsDirectories(directory):
+  """Returns the names in _VCS_DIRECTORIES that exist in a directory."""
+  try:
+    mtime = os.stat(directory).st_mtime
+  except OSError:
+    return ()
+  cached = _vcs_directory_cache.get(directory)
+  if cached and cached[0] == mtime:
+    return cached[1]
+  names = tuple(name for name in _VCS_DIRECTORIES
+                if os.path.exists(os.path.join(directory, name)))
+  _vcs_directory_cache[directory] = (mtime, names)
+  return names
+
+
 class FileInfo(object):
   """Provides utility functions for filenames.
 
@@ -1120,15 +1562,15 @@ class FileInfo(object):
     """
     fullname = self.FullName()
 
-    if os.path.exists(fullname):
+    if _cpplint_state.filesystem_lookups and os.path.exists(fullname):
       project_dir = os.path.dirname(fullname)
 
-      if os.path.exists(os.path.join(project_dir, ".svn")):
+      if '.svn' in _VcsDirectories(project_dir):
         # If there's a .svn file in the current directory, we recursively look
         # up the directory tree for the top of the SVN checkout
         root_dir = project_dir
         one_up_dir = os.path.dirname(root_dir)
-        while os.path.exists(os.path.join(one_up_dir, ".svn")):
+        while '.svn' in _VcsDirectories(one_up_dir):
           root_dir = os.path.dirname(root_dir)
           one_up_dir = os.path.dirname(one_up_dir)
 
@@ -1139,15 +1581,11 @@ class FileInfo(object):
       # searching up from the current path.
       root_dir = current_dir = os.path.dirname(fullname)
       while current_dir != os.path.dirname(current_dir):
-        if (os.path.exists(os.path.join(current_dir, ".git")) or
-            os.path.exists(os.path.join(current_dir, ".hg")) or
-            os.path.exists(os.path.join(current_dir, ".svn"))):
+        if _VcsDirectories(current_dir):
           root_dir = current_dir
         current_dir = os.path.dirname(current_dir)
 
-      if (os.path.exists(os.path.join(root_dir, ".git")) or
-          os.path.exists(os.path.join(root_dir, ".hg")) or
-          os.path.exists(os.path.join(root_dir, ".svn"))):
+      if _VcsDirectories(root_dir):
         prefix = os.path.commonprefix([root_dir, project_dir])
         return fullname[len(prefix) + 1:]
 
@@ -1235,9 +1673,15 @@ def Error(filename, linenum, category, confidence, message):
       and 1 meaning that it could be a legitimate construct.
     message: The error message.
   """
+  if (_cpplint_state.changed_lines is not None and
+      linenum not in _cpplint_state.changed_lines.get(filename, ())):
+    return
   if _ShouldPrintError(category, confidence, linenum):
     _cpplint_state.IncrementErrorCount(category)
-    if _cpplint_state.output_format == 'vs7':
+    if _cpplint_state.findings is not None:
+      _cpplint_state.findings.append(
+          (filename, linenum, category, confidence, message))
+    elif _cpplint_state.output_format == 'vs7':
       sys.stderr.write('%s(%s): error cpplint: [%s] %s [%d]\n' % (
           filename, linenum, category, message, confidence))
     elif _cpplint_state.output_format == 'eclipse':
@@ -1285,6 +1729,158 @@ def IsCppString(line):
   return ((line.count('"') - line.count(r'\"') - line.count("'\"'")) & 1) == 1
 
 
+# The number of computed lines a _LazyLines keeps before it starts over.
+_LAZY_LINES_CACHE_SIZE = 4096
+
+
+class _LazyLines(object):
+  """A sequence of lines that are computed on demand.
+
+  This stands in for the lists of lines of very large files, which are
+  memory-mapped instead of read (see ReadSourceFile).  It supports len(),
+  iteration, indexing, slicing and item assignment like a list, but it only
+  remembers the lines that were assigned and a bounded cache of the lines
+  that were computed, so its memory use does not grow with the file.
+  """
+
+  def __init__(self, num_lines, compute):
+    """Creates the sequence.
+
+    Args:
+      num_lines: The number of lines in the sequence.
+      compute: A function that takes a line index and returns the line.
+    """
+    self._num_lines = num_lines
+    self._compute = compute
+    self._assigned = {}
+    self._cache = {}
+
+  def __len__(self):
+    return self._num_lines
+
+  def __iter__(self):
+    for index in xrange(self._num_lines):
+      yield self[index]
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in xrange(*index.indices(self._num_lines))]
+    if index < 0:
+      index += self._num_lines
+    if not 0 <= index < self._num_lines:
+      raise IndexError('line index out of range')
+    if index in self._assigned:
+      return self._assigned[index]
+    line = self._cache.get(index)
+    if line is None:
+      if len(self._cache) >= _LAZY_LINES_CACHE_SIZE:
+        self._cache.clear()
+      line = self._compute(index)
+      self._cache[index] = line
+    return line
+
+  def __setitem__(self, index, line):
+    if index < 0:
+      index += self._num_lines
+    if not 0 <= index < self._num_lines:
+      raise IndexError('line index out of range')
+    self._assigned[index] = line
+    self._cache.pop(index, None)
+
+  def Surround(self, first, last):
+    """Returns a view of these lines with a line added at each end.
+
+    Args:
+      first: The line to add before the first line.
+      last: The line to add after the last line.
+
+    Returns:
+      A _LazyLines that is two lines longer than this one.
+    """
+    num_lines = self._num_lines
+
+    def Compute(index):
+      if index == 0:
+        return first
+      if index == num_lines + 1:
+        return last
+      return self[index - 1]
+
+    return _LazyLines(num_lines + 2, Compute)
+
+
+_RE_RAW_STRING_START = _LazyRegex(
+    r'^(.*?)\b(?:R|u8R|uR|UR|LR)"([^\s\\()]*)\((.*)$')
+
+# Matches a line up to a "//" that is not inside a string or character
+# literal.  A backslash in a literal only matches as the start of an escape,
+# so that every line has a single way to match and failing to match takes
+# linear time; letting it also match as a plain character made lines such
+# as '"a\"a\"a\...' take exponential time.
+_RE_UNQUOTED_LINE_COMMENT = _LazyRegex(
+    r'^(?:[^\'"]|\'(?:\\.|[^\'\\])*\'|"(?:\\.|[^"\\])*")*//')
+
+
+def _CleanseRawStringsInLine(line, delimiter):
+  """Removes C++11 raw strings from one line, see CleanseRawStrings.
+
+  Args:
+    line: The raw line.
+    delimiter: The delimiter that ends the raw string the line starts in, or
+               None if it does not start in one.
+
+  Returns:
+    A tuple of the line with raw strings replaced by empty strings and the
+    delimiter of the raw string that the next line starts in, or None.
+  """
+  if delimiter:
+    # Inside a raw string, look for the end
+    end = line.find(delimiter)
+    if end >= 0:
+      # Found the end of the string, match leading space for this
+      # line and resume copying the original lines, and also insert
+      # a "" on the last line.
+      leading_space = Match(r'^(\s*)\S', line)
+      line = leading_space.group(1) + '""' + line[end + len(delimiter):]
+      delimiter = None
+    else:
+      # Haven't found the end yet, append a blank line.
+      line = '""'
+
+  # Look for beginning of a raw string, and replace them with
+  # empty strings.  This is done in a loop to handle multiple raw
+  # strings on the same line.
+  while delimiter is None:
+    # Look for beginning of a raw string.
+    # See 2.14.15 [lex.string] for syntax.
+    #
+    # Once we have matched a raw string, we check the prefix of the
+    # line to make sure that the line is not part of a single line
+    # comment.  It's done this way because we remove raw strings
+    # before removing comments as opposed to removing comments
+    # before removing raw strings.  This is because there are some
+    # cpplint checks that requires the comments to be preserved, but
+    # we don't want to check comments that are inside raw strings.
+    matched = _RE_RAW_STRING_START.match(line)
+    if (matched and
+        not _RE_UNQUOTED_LINE_COMMENT.match(matched.group(1))):
+      delimiter = ')' + matched.group(2) + '"'
+
+      end = matched.group(3).find(delimiter)
+      if end >= 0:
+        # Raw string ended on same line
+        line = (matched.group(1) + '""' +
+                matched.group(3)[end + len(delimiter):])
+        delimiter = None
+      else:
+        # Start of a multi-line raw string
+        line = matched.group(1) + '""'
+    else:
+      break
+
+  return (line, delimiter)
+
+
 def CleanseRawStrings(raw_lines):
   """Removes C++11 raw strings from lines.
 
@@ -1302,72 +1898,41 @@ def CleanseRawStrings(raw_lines):
     raw_lines: list of raw lines.
 
   Returns:
-    list of lines with C++11 raw strings replaced by empty strings.
+    list of lines with C++11 raw strings replaced by empty strings.  If
+    raw_lines is a _LazyLines, so is the result, and only the lines that
+    changed are stored in it.
   """
 
   delimiter = None
-  lines_without_raw_strings = []
-  for line in raw_lines:
-    if delimiter:
-      # Inside a raw string, look for the end
-      end = line.find(delimiter)
-      if end >= 0:
-        # Found the end of the string, match leading space for this
-        # line and resume copying the original lines, and also insert
-        # a "" on the last line.
-        leading_space = Match(r'^(\s*)\S', line)
-        line = leading_space.group(1) + '""' + line[end + len(delimiter):]
-        delimiter = None
-      else:
-        # Haven't found the end yet, append a blank line.
-        line = '""'
-
-    # Look for beginning of a raw string, and replace them with
-    # empty strings.  This is done in a loop to handle multiple raw
-    # strings on the same line.
-    while delimiter is None:
-      # Look for beginning of a raw string.
-      # See 2.14.15 [lex.string] for syntax.
-      #
-      # Once we have matched a raw string, we check the prefix of the
-      # line to make sure that the line is not part of a single line
-      # comment.  It's done this way because we remove raw strings
-      # before removing comments as opposed to removing comments
-      # before removing raw strings.  This is because there are some
-      # cpplint checks that requires the comments to be preserved, but
-      # we don't want to check comments that are inside raw strings.
-      matched = Match(r'^(.*?)\b(?:R|u8R|uR|UR|LR)"([^\s\\()]*)\((.*)$', line)
-      if (matched and
-          not Match(r'^([^\'"]|\'(\\.|[^\'])*\'|"(\\.|[^"])*")*//',
-                    matched.group(1))):
-        delimiter = ')' + matched.group(2) + '"'
-
-        end = matched.group(3).find(delimiter)
-        if end >= 0:
-          # Raw string ended on same line
-          line = (matched.group(1) + '""' +
-                  matched.group(3)[end + len(delimiter):])
-          delimiter = None
-        else:
-          # Start of a multi-line raw string
-          line = matched.group(1) + '""'
-      else:
-        break
-
-    lines_without_raw_strings.append(line)
+  if isinstance(raw_lines, _LazyLines):
+    lines_without_raw_strings = _LazyLines(len(raw_lines),
+                                           raw_lines.__getitem__)
+  else:
+    lines_without_raw_strings = list(raw_lines)
+  for linenum, line in enumerate(raw_lines):
+    if delimiter is None and 'R"' not in line:
+      continue  # Every raw string prefix ends in R".
+    (cleansed_line, delimiter) = _CleanseRawStringsInLine(line, delimiter)
+    if cleansed_line is not line:
+      lines_without_raw_strings[linenum] = cleansed_line
 
   # TODO(unknown): if delimiter is not None here, we might want to
   # emit a warning for unterminated string.
   return lines_without_raw_strings
 
 
+def _IsMultiLineCommentStart(line):
+  """Returns whether a line starts a comment that goes beyond it."""
+  line = line.strip()
+  return line.startswith('/*') and line.find('*/', 2) < 0
+
+
 def FindNextMultiLineCommentStart(lines, lineix):
   """Find the beginning marker for a multiline comment."""
   while lineix < len(lines):
-    if lines[lineix].strip().startswith('/*'):
-      # Only return this marker if the comment goes beyond this line
-      if lines[lineix].strip().find('*/', 2) < 0:
-        return lineix
+    line = lines[lineix]
+    if '/*' in line and _IsMultiLineCommentStart(line):
+      return lineix
     lineix += 1
   return len(lines)
 
@@ -1421,6 +1986,9 @@ def CleanseComments(line):
   return _RE_PATTERN_CLEANSE_LINE_C_COMMENTS.sub('', line)
 
 
+_RE_FIRST_QUOTE = _LazyRegex(r'^([^\'"]*)([\'"])(.*)$')
+
+
 class CleansedLines(object):
   """Holds 4 copies of all lines with different preprocessing applied to them.
 
@@ -1429,20 +1997,33 @@ class CleansedLines(object):
   3) raw_lines member contains all the lines without processing.
   4) lines_without_raw_strings member is same as raw_lines, but with C++11 raw
      strings removed.
-  All these members are of <type 'list'>, and of the same length.
+  All these members are of <type 'list'>, and of the same length.  When
+  the lines are given as a _LazyLines, the members are _LazyLines too, and
+  each copy of a line is only made when it is needed.
   """
 
   def __init__(self, lines):
-    self.elided = []
-    self.lines = []
     self.raw_lines = lines
     self.num_lines = len(lines)
     self.lines_without_raw_strings = CleanseRawStrings(lines)
+    if isinstance(lines, _LazyLines):
+      self.lines = _LazyLines(self.num_lines, self._CleanseCommentsAt)
+      self.elided = _LazyLines(self.num_lines, self._ElideAt)
+      return
+    self.elided = []
+    self.lines = []
     for linenum in range(len(self.lines_without_raw_strings)):
-      self.lines.append(CleanseComments(
-          self.lines_without_raw_strings[linenum]))
-      elided = self._CollapseStrings(self.lines_without_raw_strings[linenum])
-      self.elided.append(CleanseComments(elided))
+      self.lines.append(self._CleanseCommentsAt(linenum))
+      self.elided.append(self._ElideAt(linenum))
+
+  def _CleanseCommentsAt(self, linenum):
+    """Returns the line at linenum without raw strings and comments."""
+    return CleanseComments(self.lines_without_raw_strings[linenum])
+
+  def _ElideAt(self, linenum):
+    """Returns the line at linenum without strings and comments."""
+    elided = self._CollapseStrings(self.lines_without_raw_strings[linenum])
+    return CleanseComments(elided)
 
   def NumLines(self):
     """Returns the number of lines represented."""
@@ -1474,7 +2055,7 @@ class CleansedLines(object):
     collapsed = ''
     while True:
       # Find the first quote character
-      match = Match(r'^([^\'"]*)([\'"])(.*)$', elided)
+      match = _RE_FIRST_QUOTE.match(elided)
       if not match:
         collapsed += elided
         break
@@ -1516,6 +2097,106 @@ class CleansedLines(object):
     return collapsed
 
 
+def _IterCleansedRows(lines, comment_limit):
+  """Cleanses lines one at a time, in order.
+
+  This does what RemoveMultiLineComments and CleansedLines do to a whole
+  file, carrying their state from one line to the next instead.
+
+  Args:
+    lines: An iterable of the lines of the file, including the marker lines.
+    comment_limit: The index of the line that starts the first unterminated
+                   multi-line comment, or None.  As in RemoveMultiLineComments,
+                   comments are not removed from that line on.
+
+  Yields:
+    A tuple of the line with multi-line comments removed, then also without
+    raw strings, then also without comments, and then also without strings,
+    for each line.
+  """
+  in_comment = False
+  delimiter = None
+  for linenum, line in enumerate(lines):
+    if comment_limit is None or linenum < comment_limit:
+      if not in_comment and _IsMultiLineCommentStart(line):
+        in_comment = True
+      if in_comment:
+        if line.strip().endswith('*/'):
+          in_comment = False
+        line = '/**/'
+    (without_raw_strings, delimiter) = _CleanseRawStringsInLine(line,
+                                                                delimiter)
+    elided = CleansedLines._CollapseStrings(without_raw_strings)
+    yield (line, without_raw_strings, CleanseComments(without_raw_strings),
+           CleanseComments(elided))
+
+
+class _WindowedLines(object):
+  """One of the copies of the lines held by a _StreamingCleansedLines."""
+
+  def __init__(self, rows, field):
+    self._rows = rows
+    self._field = field
+
+  def __len__(self):
+    return self._rows.NumLines()
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in xrange(*index.indices(len(self)))]
+    if index < 0:
+      index += len(self)
+    return self._rows.GetRow(index)[self._field]
+
+
+class _StreamingCleansedLines(object):
+  """A CleansedLines that only holds the lines near the current line.
+
+  The members are the same as those of CleansedLines, but only the lines
+  within _STREAM_CONTEXT_LINES of the line passed to Seek() are held; the
+  others read as empty strings.  Lines are cleansed as the window moves
+  forward, so it can't move back.
+  """
+
+  _EMPTY_ROW = ('', '', '', '')
+
+  def __init__(self, lines, num_lines, comment_limit):
+    """Creates the window.
+
+    Args:
+      lines: An iterable of the lines of the file, including the marker lines.
+      num_lines: The number of lines in lines.
+      comment_limit: See _IterCleansedRows.
+    """
+    self.num_lines = num_lines
+    self._row_iterator = _IterCleansedRows(lines, comment_limit)
+    self._rows = {}
+    self._start = 0
+    self._end = 0
+    self.raw_lines = _WindowedLines(self, 0)
+    self.lines_without_raw_strings = _WindowedLines(self, 1)
+    self.lines = _WindowedLines(self, 2)
+    self.elided = _WindowedLines(self, 3)
+
+  def NumLines(self):
+    """Returns the number of lines represented."""
+    return self.num_lines
+
+  def GetRow(self, linenum):
+    """Returns the copies of a line, or empty strings if it isn't held."""
+    return self._rows.get(linenum, self._EMPTY_ROW)
+
+  def Seek(self, linenum):
+    """Moves the window so that it is centered on linenum."""
+    end = min(linenum + _STREAM_CONTEXT_LINES + 1, self.num_lines)
+    while self._end < end:
+      self._rows[self._end] = next(self._row_iterator)
+      self._end += 1
+    while self._start < linenum - _STREAM_CONTEXT_LINES:
+      self._rows.pop(self._start, None)
+      self._start += 1
+
+
 def FindEndOfExpressionInLine(line, startpos, stack):
   """Find the position just after the end of current parenthesized expression.
 
@@ -1962,7 +2643,7 @@ def CheckForHeaderGuard(filename, clean_lines, error):
   no_single_line_comments = True
   for i in xrange(1, len(raw_lines) - 1):
     line = raw_lines[i]
-    if Match(r'^(?:(?:\'(?:\.|[^\'])*\')|(?:"(?:\.|[^"])*")|[^\'"])*//', line):
+    if _RE_UNQUOTED_LINE_COMMENT.match(line):
       no_single_line_comments = False
       break
 
@@ -1989,7 +2670,7 @@ def CheckHeaderFileIncluded(filename, include_state, error):
     return
 
   headerfile = filename[0:len(filename) - len(fileinfo.Extension())] + '.h'
-  if not os.path.exists(headerfile):
+  if not _cpplint_state.filesystem_lookups or not os.path.exists(headerfile):
     return
   headername = FileInfo(headerfile).RepositoryName()
   first_include = 0
@@ -2100,19 +2781,28 @@ def CheckForMultilineCommentsAndStrings(filename, clean_lines, linenum, error):
 # member function calls.
 _UNSAFE_FUNC_PREFIX = r'(?:[-+*/=%^&|(<]\s*|>\s+)'
 _THREADING_LIST = (
-    ('asctime(', 'asctime_r(', _UNSAFE_FUNC_PREFIX + r'asctime\([^)]+\)'),
-    ('ctime(', 'ctime_r(', _UNSAFE_FUNC_PREFIX + r'ctime\([^)]+\)'),
-    ('getgrgid(', 'getgrgid_r(', _UNSAFE_FUNC_PREFIX + r'getgrgid\([^)]+\)'),
-    ('getgrnam(', 'getgrnam_r(', _UNSAFE_FUNC_PREFIX + r'getgrnam\([^)]+\)'),
-    ('getlogin(', 'getlogin_r(', _UNSAFE_FUNC_PREFIX + r'getlogin\(\)'),
-    ('getpwnam(', 'getpwnam_r(', _UNSAFE_FUNC_PREFIX + r'getpwnam\([^)]+\)'),
-    ('getpwuid(', 'getpwuid_r(', _UNSAFE_FUNC_PREFIX + r'getpwuid\([^)]+\)'),
-    ('gmtime(', 'gmtime_r(', _UNSAFE_FUNC_PREFIX + r'gmtime\([^)]+\)'),
-    ('localtime(', 'localtime_r(', _UNSAFE_FUNC_PREFIX + r'localtime\([^)]+\)'),
-    ('rand(', 'rand_r(', _UNSAFE_FUNC_PREFIX + r'rand\(\)'),
+    ('asctime(', 'asctime_r(',
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'asctime\([^)]+\)')),
+    ('ctime(', 'ctime_r(', _LazyRegex(_UNSAFE_FUNC_PREFIX + r'ctime\([^)]+\)')),
+    ('getgrgid(', 'getgrgid_r(',
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'getgrgid\([^)]+\)')),
+    ('getgrnam(', 'getgrnam_r(',
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'getgrnam\([^)]+\)')),
+    ('getlogin(', 'getlogin_r(',
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'getlogin\(\)')),
+    ('getpwnam(', 'getpwnam_r(',
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'getpwnam\([^)]+\)')),
+    ('getpwuid(', 'getpwuid_r(',
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'getpwuid\([^)]+\)')),
+    ('gmtime(', 'gmtime_r(',
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'gmtime\([^)]+\)')),
+    ('localtime(', 'localtime_r(',
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'localtime\([^)]+\)')),
+    ('rand(', 'rand_r(', _LazyRegex(_UNSAFE_FUNC_PREFIX + r'rand\(\)')),
     ('strtok(', 'strtok_r(',
-     _UNSAFE_FUNC_PREFIX + r'strtok\([^)]+\)'),
-    ('ttyname(', 'ttyname_r(', _UNSAFE_FUNC_PREFIX + r'ttyname\([^)]+\)'),
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'strtok\([^)]+\)')),
+    ('ttyname(', 'ttyname_r(',
+     _LazyRegex(_UNSAFE_FUNC_PREFIX + r'ttyname\([^)]+\)')),
     )
 
 
@@ -2135,13 +2825,17 @@ def CheckPosixThreading(filename, clean_lines, linenum, error):
   for single_thread_func, multithread_safe_func, pattern in _THREADING_LIST:
     # Additional pattern matching check to confirm that this is the
     # function we are looking for
-    if Search(pattern, line):
+    if pattern.search(line):
       error(filename, linenum, 'runtime/threadsafe_fn', 2,
             'Consider using ' + multithread_safe_func +
             '...) instead of ' + single_thread_func +
             '...) for improved thread safety.')
 
 
+_RE_VLOG_SYMBOLIC_LEVEL = _LazyRegex(
+    r'\bVLOG\((INFO|ERROR|WARNING|DFATAL|FATAL)\)')
+
+
 def CheckVlogArguments(filename, clean_lines, linenum, error):
   """Checks that VLOG() is only used for defining a logging level.
 
@@ -2155,7 +2849,7 @@ def CheckVlogArguments(filename, clean_lines, linenum, error):
     error: The function to call with any errors found.
   """
   line = clean_lines.elided[linenum]
-  if Search(r'\bVLOG\((INFO|ERROR|WARNING|DFATAL|FATAL)\)', line):
+  if _RE_VLOG_SYMBOLIC_LEVEL.search(line):
     error(filename, linenum, 'runtime/vlog', 5,
           'VLOG() should be used with numeric verbosity level.  '
           'Use LOG() if you want symbolic severity levels.')
@@ -2198,8 +2892,12 @@ def IsMacroDefinition(clean_lines, linenum):
   return False
 
 
+_RE_FORWARD_CLASS_DECLARATION = _LazyRegex(
+    r'^\s*(\btemplate\b)*.*class\s+\w+;\s*$')
+
+
 def IsForwardClassDeclaration(clean_lines, linenum):
-  return Match(r'^\s*(\btemplate\b)*.*class\s+\w+;\s*$', clean_lines[linenum])
+  return _RE_FORWARD_CLASS_DECLARATION.match(clean_lines[linenum])
 
 
 class _BlockInfo(object):
@@ -2403,6 +3101,17 @@ class _PreprocessorInfo(object):
     self.seen_else = False
 
 
+_RE_PREPROCESSOR_IF = _LazyRegex(r'^\s*#\s*(if|ifdef|ifndef)\b')
+_RE_PREPROCESSOR_ELSE = _LazyRegex(r'^\s*#\s*(else|elif)\b')
+_RE_PREPROCESSOR_ENDIF = _LazyRegex(r'^\s*#\s*endif\b')
+_RE_NAMESPACE_DECLARATION = _LazyRegex(r'^\s*namespace\b\s*([:\w]+)?(.*)$')
+_RE_CLASS_DECLARATION = _LazyRegex(
+    r'^(\s*(?:template\s*<[\w\s<>,:]*>\s*)?'
+    r'(class|struct)\s+(?:[A-Z_]+\s+)*(\w+(?:::\w+)*))'
+    r'(.*)$')
+_RE_FIRST_BRACE_OR_SEMICOLON = _LazyRegex(r'^[^{;)}]*([{;)}])(.*)$')
+
+
 class NestingState(object):
   """Holds states related to parsing braces."""
 
@@ -2543,11 +3252,11 @@ class NestingState(object):
     Args:
       line: current line to check.
     """
-    if Match(r'^\s*#\s*(if|ifdef|ifndef)\b', line):
+    if _RE_PREPROCESSOR_IF.match(line):
       # Beginning of #if block, save the nesting stack here.  The saved
       # stack will allow us to restore the parsing state in the #else case.
       self.pp_stack.append(_PreprocessorInfo(copy.deepcopy(self.stack)))
-    elif Match(r'^\s*#\s*(else|elif)\b', line):
+    elif _RE_PREPROCESSOR_ELSE.match(line):
       # Beginning of #else block
       if self.pp_stack:
         if not self.pp_stack[-1].seen_else:
@@ -2562,7 +3271,7 @@ class NestingState(object):
       else:
         # TODO(unknown): unexpected #else, issue warning?
         pass
-    elif Match(r'^\s*#\s*endif\b', line):
+    elif _RE_PREPROCESSOR_ENDIF.match(line):
       # End of #if or #else blocks.
       if self.pp_stack:
         # If we saw an #else, we will need to restore the nesting
@@ -2634,7 +3343,7 @@ class NestingState(object):
       # declarations even if it weren't followed by a whitespace, this
       # is so that we don't confuse our namespace checker.  The
       # missing spaces will be flagged by CheckSpacing.
-      namespace_decl_match = Match(r'^\s*namespace\b\s*([:\w]+)?(.*)$', line)
+      namespace_decl_match = _RE_NAMESPACE_DECLARATION.match(line)
       if not namespace_decl_match:
         break
 
@@ -2651,10 +3360,7 @@ class NestingState(object):
     # such as in:
     #   class LOCKABLE API Object {
     #   };
-    class_decl_match = Match(
-        r'^(\s*(?:template\s*<[\w\s<>,:]*>\s*)?'
-        r'(class|struct)\s+(?:[A-Z_]+\s+)*(\w+(?:::\w+)*))'
-        r'(.*)$', line)
+    class_decl_match = _RE_CLASS_DECLARATION.match(line)
     if (class_decl_match and
         (not self.stack or self.stack[-1].open_parentheses == 0)):
       # We do not want to accept classes that are actually template arguments:
@@ -2707,7 +3413,7 @@ class NestingState(object):
     # Consume braces or semicolons from what's left of the line
     while True:
       # Match first brace, semicolon, or closed parenthesis.
-      matched = Match(r'^[^{;)}]*([{;)}])(.*)$', line)
+      matched = _RE_FIRST_BRACE_OR_SEMICOLON.match(line)
       if not matched:
         break
 
@@ -2777,6 +3483,22 @@ class NestingState(object):
               obj.name)
 
 
+_RE_PRINTF_Q_FORMAT = _LazyRegex(r'printf\s*\(.*".*%[-+ ]?\d*q')
+_RE_PRINTF_POSITIONAL_FORMAT = _LazyRegex(r'printf\s*\(.*".*%\d+\$')
+_RE_UNDEFINED_ESCAPE = _LazyRegex(r'("|\').*\\(%|\[|\(|{)')
+_RE_STORAGE_CLASS_NOT_FIRST = _LazyRegex(
+    r'\b(const|volatile|void|char|short|int|long'
+    r'|float|double|signed|unsigned'
+    r'|schar|u?int8|u?int16|u?int32|u?int64)'
+    r'\s+(register|static|extern|typedef)\b')
+_RE_ENDIF_WITH_TEXT = _LazyRegex(r'\s*#\s*endif\s*[^/\s]+')
+_RE_INNER_FORWARD_DECLARATION = _LazyRegex(r'\s*class\s+(\w+\s*::\s*)+\w+\s*;')
+_RE_MIN_MAX_OPERATOR = _LazyRegex(
+    r'(\w+|[+-]?\d+(\.\d*)?)\s*(<|>)\?=?\s*(\w+|[+-]?\d+)(\.\d*)?')
+_RE_CONST_STRING_REFERENCE_MEMBER = _LazyRegex(
+    r'^\s*const\s*string\s*&\s*\w+\s*;')
+
+
 def CheckForNonStandardConstructs(filename, clean_lines, linenum,
                                   nesting_state, error):
   r"""Logs an error if we see certain non-ANSI constructs ignored by gcc-2.
@@ -2809,47 +3531,42 @@ def CheckForNonStandardConstructs(filename, clean_lines, linenum,
   # Remove comments from the line, but leave in strings for now.
   line = clean_lines.lines[linenum]
 
-  if Search(r'printf\s*\(.*".*%[-+ ]?\d*q', line):
+  if _RE_PRINTF_Q_FORMAT.search(line):
     error(filename, linenum, 'runtime/printf_format', 3,
           '%q in format strings is deprecated.  Use %ll instead.')
 
-  if Search(r'printf\s*\(.*".*%\d+\$', line):
+  if _RE_PRINTF_POSITIONAL_FORMAT.search(line):
     error(filename, linenum, 'runtime/printf_format', 2,
           '%N$ formats are unconventional.  Try rewriting to avoid them.')
 
   # Remove escaped backslashes before looking for undefined escapes.
   line = line.replace('\\\\', '')
 
-  if Search(r'("|\').*\\(%|\[|\(|{)', line):
+  if _RE_UNDEFINED_ESCAPE.search(line):
     error(filename, linenum, 'build/printf_format', 3,
           '%, [, (, and { are undefined character escapes.  Unescape them.')
 
   # For the rest, work with both comments and strings removed.
   line = clean_lines.elided[linenum]
 
-  if Search(r'\b(const|volatile|void|char|short|int|long'
-            r'|float|double|signed|unsigned'
-            r'|schar|u?int8|u?int16|u?int32|u?int64)'
-            r'\s+(register|static|extern|typedef)\b',
-            line):
+  if _RE_STORAGE_CLASS_NOT_FIRST.search(line):
     error(filename, linenum, 'build/storage_class', 5,
           'Storage-class specifier (static, extern, typedef, etc) should be '
           'at the beginning of the declaration.')
 
-  if Match(r'\s*#\s*endif\s*[^/\s]+', line):
+  if _RE_ENDIF_WITH_TEXT.match(line):
     error(filename, linenum, 'build/endif_comment', 5,
           'Uncommented text after #endif is non-standard.  Use a comment.')
 
-  if Match(r'\s*class\s+(\w+\s*::\s*)+\w+\s*;', line):
+  if _RE_INNER_FORWARD_DECLARATION.match(line):
     error(filename, linenum, 'build/forward_decl', 5,
           'Inner-style forward declarations are invalid.  Remove this line.')
 
-  if Search(r'(\w+|[+-]?\d+(\.\d*)?)\s*(<|>)\?=?\s*(\w+|[+-]?\d+)(\.\d*)?',
-            line):
+  if _RE_MIN_MAX_OPERATOR.search(line):
     error(filename, linenum, 'build/deprecated', 3,
           '>? and <? (max and min) operators are non-standard and deprecated.')
 
-  if Search(r'^\s*const\s*string\s*&\s*\w+\s*;', line):
+  if _RE_CONST_STRING_REFERENCE_MEMBER.search(line):
     # TODO(unknown): Could it be expanded safely to arbitrary references,
     # without triggering too many false positives? The first
     # attempt triggered 5 warnings for mostly benign code in the regtest, hence
@@ -2937,6 +3654,22 @@ def CheckForNonStandardConstructs(filename, clean_lines, linenum,
               'Zero-parameter constructors should not be marked explicit.')
 
 
+_RE_CONTROL_STATEMENT_CONDITIONS = (
+    _LazyRegex(r'\bif\s*\((.*)\)\s*{'),
+    _LazyRegex(r'\bfor\s*\((.*)\)\s*{'),
+    _LazyRegex(r'\bwhile\s*\((.*)\)\s*[{;]'),
+    _LazyRegex(r'\bswitch\s*\((.*)\)\s*{'),
+    )
+_RE_CONTROL_KEYWORD = _LazyRegex(
+    r'\b(if|for|while|switch|return|new|delete|catch|sizeof)\b')
+_RE_FUNCTION_POINTER = _LazyRegex(r' \([^)]+\)\([^)]*(\)|,$)')
+_RE_ARRAY_POINTER = _LazyRegex(r' \([^)]+\)\[[^\]]+\]')
+_RE_SPACE_AFTER_CALL_PAREN = _LazyRegex(r'\w\s*\(\s(?!\s*\\$)')
+_RE_SPACE_AFTER_PAREN = _LazyRegex(r'\(\s+(?!(\s*\\)|\()')
+_RE_SPACE_BEFORE_PAREN = _LazyRegex(r'\w\s+\(')
+_RE_SPACE_BEFORE_CLOSE_PAREN = _LazyRegex(r'[^)]\s+\)\s*[^{\s]')
+
+
 def CheckSpacingForFunctionCall(filename, clean_lines, linenum, error):
   """Checks for the correctness of various spacing around function calls.
 
@@ -2953,11 +3686,8 @@ def CheckSpacingForFunctionCall(filename, clean_lines, linenum, error):
   # first see if we should be looking inside such an expression for a
   # function call, to which we can apply more strict standards.
   fncall = line    # if there's no control flow construct, look at whole line
-  for pattern in (r'\bif\s*\((.*)\)\s*{',
-                  r'\bfor\s*\((.*)\)\s*{',
-                  r'\bwhile\s*\((.*)\)\s*[{;]',
-                  r'\bswitch\s*\((.*)\)\s*{'):
-    match = Search(pattern, line)
+  for pattern in _RE_CONTROL_STATEMENT_CONDITIONS:
+    match = pattern.search(line)
     if match:
       fncall = match.group(1)    # look inside the parens for function calls
       break
@@ -2976,19 +3706,18 @@ def CheckSpacingForFunctionCall(filename, clean_lines, linenum, error):
   # Note that we assume the contents of [] to be short enough that
   # they'll never need to wrap.
   if (  # Ignore control structures.
-      not Search(r'\b(if|for|while|switch|return|new|delete|catch|sizeof)\b',
-                 fncall) and
+      not _RE_CONTROL_KEYWORD.search(fncall) and
       # Ignore pointers/references to functions.
-      not Search(r' \([^)]+\)\([^)]*(\)|,$)', fncall) and
+      not _RE_FUNCTION_POINTER.search(fncall) and
       # Ignore pointers/references to arrays.
-      not Search(r' \([^)]+\)\[[^\]]+\]', fncall)):
-    if Search(r'\w\s*\(\s(?!\s*\\$)', fncall):      # a ( used for a fn call
+      not _RE_ARRAY_POINTER.search(fncall)):
+    if _RE_SPACE_AFTER_CALL_PAREN.search(fncall):  # a ( used for a fn call
       error(filename, linenum, 'whitespace/parens', 4,
             'Extra space after ( in function call')
-    elif Search(r'\(\s+(?!(\s*\\)|\()', fncall):
+    elif _RE_SPACE_AFTER_PAREN.search(fncall):
       error(filename, linenum, 'whitespace/parens', 2,
             'Extra space after (')
-    if (Search(r'\w\s+\(', fncall) and
+    if (_RE_SPACE_BEFORE_PAREN.search(fncall) and
         not Search(r'_{0,2}asm_{0,2}\s+_{0,2}volatile_{0,2}\s+\(', fncall) and
         not Search(r'#\s*define|typedef|using\s+\w+\s*=', fncall) and
         not Search(r'\w\s+\((\w+::)*\*\w+\)\(', fncall) and
@@ -3003,7 +3732,7 @@ def CheckSpacingForFunctionCall(filename, clean_lines, linenum, error):
               'Extra space before ( in function call')
     # If the ) is followed only by a newline or a { + newline, assume it's
     # part of a control statement (if/while/etc), and don't complain
-    if Search(r'[^)]\s+\)\s*[^{\s]', fncall):
+    if _RE_SPACE_BEFORE_CLOSE_PAREN.search(fncall):
       # If the closing parenthesis is preceded by only whitespaces,
       # try to give a more descriptive error message.
       if Search(r'^\s+\)', fncall):
@@ -3043,6 +3772,12 @@ def CheckForNamespaceIndentation(filename, nesting_state, clean_lines, line,
                                     line, error)
 
 
+_RE_FUNCTION_START = _LazyRegex(
+    r'(\w(\w|::|\*|\&|\s)*)\(')  # decls * & space::name( ...
+_RE_FUNCTION_END = _LazyRegex(r'^\}\s*$')
+_RE_BLANK_LINE = _LazyRegex(r'^\s*$')
+
+
 def CheckForFunctionLengths(filename, clean_lines, linenum,
                             function_state, error):
   """Reports for long function bodies.
@@ -3071,8 +3806,7 @@ def CheckForFunctionLengths(filename, clean_lines, linenum,
   joined_line = ''
 
   starting_func = False
-  regexp = r'(\w(\w|::|\*|\&|\s)*)\('  # decls * & space::name( ...
-  match_result = Match(regexp, line)
+  match_result = _RE_FUNCTION_START.match(line)
   if match_result:
     # If the name is all caps and underscores, figure it's a macro and
     # ignore it, unless it's TEST or TEST_F.
@@ -3104,10 +3838,10 @@ def CheckForFunctionLengths(filename, clean_lines, linenum,
       # No body for the function (or evidence of a non-function) was found.
       error(filename, linenum, 'readability/fn_size', 5,
             'Lint failed to find start of function body.')
-  elif Match(r'^\}\s*$', line):  # function end
+  elif _RE_FUNCTION_END.match(line):  # function end
     function_state.Check(error, filename, linenum)
     function_state.End()
-  elif not Match(r'^\s*$', line):
+  elif not _RE_BLANK_LINE.match(line):
     function_state.Count()  # Count non-blank/non-comment lines.
 
 
@@ -3168,6 +3902,12 @@ def CheckComment(line, filename, linenum, next_line_start, error):
               'Should have a space between // and comment')
 
 
+_RE_SPACE_BEFORE_BRACKET = _LazyRegex(r'\w\s+\[')
+_RE_LAMBDA_OR_DELETE_BRACKET = _LazyRegex(r'(?:auto&?|delete|return)\s+\[')
+_RE_RANGE_FOR_NO_SPACE_AFTER_COLON = _LazyRegex(r'for *\(.*[^:]:[^: ]')
+_RE_RANGE_FOR_NO_SPACE_BEFORE_COLON = _LazyRegex(r'for *\(.*[^: ]:[^:]')
+
+
 def CheckSpacing(filename, clean_lines, linenum, nesting_state, error):
   """Checks for the correctness of various spacing issues in the code.
 
@@ -3284,18 +4024,33 @@ def CheckSpacing(filename, clean_lines, linenum, nesting_state, error):
 
   # You shouldn't have spaces before your brackets, except maybe after
   # 'delete []', 'return []() {};', or 'auto [abc, ...] = ...;'.
-  if Search(r'\w\s+\[', line) and not Search(r'(?:auto&?|delete|return)\s+\[', line):
+  if (_RE_SPACE_BEFORE_BRACKET.search(line) and
+      not _RE_LAMBDA_OR_DELETE_BRACKET.search(line)):
     error(filename, linenum, 'whitespace/braces', 5,
           'Extra space before [')
 
   # In range-based for, we wanted spaces before and after the colon, but
   # not around "::" tokens that might appear.
-  if (Search(r'for *\(.*[^:]:[^: ]', line) or
-      Search(r'for *\(.*[^: ]:[^:]', line)):
+  if (_RE_RANGE_FOR_NO_SPACE_AFTER_COLON.search(line) or
+      _RE_RANGE_FOR_NO_SPACE_BEFORE_COLON.search(line)):
     error(filename, linenum, 'whitespace/forcolon', 2,
           'Missing space around colon in range-based for loop')
 
 
+_RE_OPERATOR_DECLARATION = _LazyRegex(r'^(.*\boperator\b)(\S+)(\s*\(.*)$')
+_RE_ASSIGNMENT_NO_SPACE_BEFORE = _LazyRegex(r'[\w.]=')
+_RE_ASSIGNMENT_NO_SPACE_AFTER = _LazyRegex(r'=[\w.]')
+_RE_COMPARISON_NO_SPACE = _LazyRegex(
+    r'[^<>=!\s](==|!=|<=|>=|\|\|)[^<>=!\s,;\)]')
+_RE_INCLUDE_DIRECTIVE = _LazyRegex(r'#.*include')
+_RE_LESS_THAN_NO_SPACE = _LazyRegex(r'^(.*[^\s<])<[^\s=<,]')
+_RE_GREATER_THAN_NO_SPACE = _LazyRegex(r'^(.*[^-\s>])>[^\s=>,]')
+_RE_SHIFT_LEFT_NO_SPACE = _LazyRegex(
+    r'(operator|[^\s(<])(?:L|UL|LL|ULL|l|ul|ll|ull)?<<([^\s,=<])')
+_RE_SHIFT_RIGHT_NO_SPACE = _LazyRegex(r'>>[a-zA-Z_]')
+_RE_UNARY_OPERATOR_SPACE = _LazyRegex(r'(!\s|~\s|[\s]--[\s;]|[\s]\+\+[\s;])')
+
+
 def CheckOperatorSpacing(filename, clean_lines, linenum, error):
   """Checks for horizontal spacing around operators.
 
@@ -3314,7 +4069,7 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
   # The replacement is done repeatedly to avoid false positives from
   # operators that call operators.
   while True:
-    match = Match(r'^(.*\boperator\b)(\S+)(\s*\(.*)$', line)
+    match = _RE_OPERATOR_DECLARATION.match(line)
     if match:
       line = match.group(1) + ('_' * len(match.group(2))) + match.group(3)
     else:
@@ -3324,8 +4079,8 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
   # Otherwise not.  Note we only check for non-spaces on *both* sides;
   # sometimes people put non-spaces on one side when aligning ='s among
   # many lines (not that this is behavior that I approve of...)
-  if ((Search(r'[\w.]=', line) or
-       Search(r'=[\w.]', line))
+  if ((_RE_ASSIGNMENT_NO_SPACE_BEFORE.search(line) or
+       _RE_ASSIGNMENT_NO_SPACE_AFTER.search(line))
       and not Search(r'\b(if|while|for) ', line)
       # Operators taken from [lex.operators] in C++11 standard.
       and not Search(r'(>=|<=|==|!=|&=|\^=|\|=|\+=|\*=|\/=|\%=)', line)
@@ -3348,16 +4103,16 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
   #
   # Note that && is not included here.  This is because there are too
   # many false positives due to RValue references.
-  match = Search(r'[^<>=!\s](==|!=|<=|>=|\|\|)[^<>=!\s,;\)]', line)
+  match = _RE_COMPARISON_NO_SPACE.search(line)
   if match:
     error(filename, linenum, 'whitespace/operators', 3,
           'Missing spaces around %s' % match.group(1))
-  elif not Match(r'#.*include', line):
+  elif not _RE_INCLUDE_DIRECTIVE.match(line):
     # Look for < that is not surrounded by spaces.  This is only
     # triggered if both sides are missing spaces, even though
     # technically should should flag if at least one side is missing a
     # space.  This is done to avoid some false positives with shifts.
-    match = Match(r'^(.*[^\s<])<[^\s=<,]', line)
+    match = _RE_LESS_THAN_NO_SPACE.match(line)
     if match:
       (_, _, end_pos) = CloseExpression(
           clean_lines, linenum, len(match.group(1)))
@@ -3368,7 +4123,7 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
     # Look for > that is not surrounded by spaces.  Similar to the
     # above, we only trigger if both sides are missing spaces to avoid
     # false positives with shifts.
-    match = Match(r'^(.*[^-\s>])>[^\s=>,]', line)
+    match = _RE_GREATER_THAN_NO_SPACE.match(line)
     if match:
       (_, _, start_pos) = ReverseCloseExpression(
           clean_lines, linenum, len(match.group(1)))
@@ -3381,7 +4136,7 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
   #
   # We also allow operators following an opening parenthesis, since
   # those tend to be macros that deal with operators.
-  match = Search(r'(operator|[^\s(<])(?:L|UL|LL|ULL|l|ul|ll|ull)?<<([^\s,=<])', line)
+  match = _RE_SHIFT_LEFT_NO_SPACE.search(line)
   if (match and not (match.group(1).isdigit() and match.group(2).isdigit()) and
       not (match.group(1) == 'operator' and match.group(2) == ';')):
     error(filename, linenum, 'whitespace/operators', 3,
@@ -3399,18 +4154,25 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
   # follows would be part of an identifier, and there should still be
   # a space separating the template type and the identifier.
   #   type<type<type>> alpha
-  match = Search(r'>>[a-zA-Z_]', line)
+  match = _RE_SHIFT_RIGHT_NO_SPACE.search(line)
   if match:
     error(filename, linenum, 'whitespace/operators', 3,
           'Missing spaces around >>')
 
   # There shouldn't be space around unary operators
-  match = Search(r'(!\s|~\s|[\s]--[\s;]|[\s]\+\+[\s;])', line)
+  match = _RE_UNARY_OPERATOR_SPACE.search(line)
   if match:
     error(filename, linenum, 'whitespace/operators', 4,
           'Extra space for operator %s' % match.group(1))
 
 
+_RE_CONTROL_NO_SPACE_BEFORE_PAREN = _LazyRegex(
+    r' (if\(|for\(|while\(|switch\()')
+_RE_CONTROL_PAREN_SPACING = _LazyRegex(
+    r'\b(if|for|while|switch)\s*'
+    r'\(([ ]*)(.).*[^ ]+([ ]*)\)\s*{\s*$')
+
+
 def CheckParenthesisSpacing(filename, clean_lines, linenum, error):
   """Checks for horizontal spacing around parentheses.
 
@@ -3423,7 +4185,7 @@ def CheckParenthesisSpacing(filename, clean_lines, linenum, error):
   line = clean_lines.elided[linenum]
 
   # No spaces after an if, while, switch, or for
-  match = Search(r' (if\(|for\(|while\(|switch\()', line)
+  match = _RE_CONTROL_NO_SPACE_BEFORE_PAREN.search(line)
   if match:
     error(filename, linenum, 'whitespace/parens', 5,
           'Missing space before ( in %s' % match.group(1))
@@ -3433,9 +4195,7 @@ def CheckParenthesisSpacing(filename, clean_lines, linenum, error):
   # there should either be zero or one spaces inside the parens.
   # We don't want: "if ( foo)" or "if ( foo   )".
   # Exception: "for ( ; foo; bar)" and "for (foo; bar; )" are allowed.
-  match = Search(r'\b(if|for|while|switch)\s*'
-                 r'\(([ ]*)(.).*[^ ]+([ ]*)\)\s*{\s*$',
-                 line)
+  match = _RE_CONTROL_PAREN_SPACING.search(line)
   if match:
     if len(match.group(2)) != len(match.group(4)):
       if not (match.group(3) == ';' and
@@ -3449,6 +4209,11 @@ def CheckParenthesisSpacing(filename, clean_lines, linenum, error):
             match.group(1))
 
 
+_RE_COMMA_NO_SPACE = _LazyRegex(r',[^,\s]')
+_RE_OPERATOR_COMMA = _LazyRegex(r'\boperator\s*,\s*\(')
+_RE_SEMICOLON_NO_SPACE = _LazyRegex(r';[^\s};\\)/]')
+
+
 def CheckCommaSpacing(filename, clean_lines, linenum, error):
   """Checks for horizontal spacing near commas and semicolons.
 
@@ -3471,8 +4236,8 @@ def CheckCommaSpacing(filename, clean_lines, linenum, error):
   # verify that lines contain missing whitespaces, second pass on raw
   # lines to confirm that those missing whitespaces are not due to
   # elided comments.
-  if (Search(r',[^,\s]', ReplaceAll(r'\boperator\s*,\s*\(', 'F(', line)) and
-      Search(r',[^,\s]', raw[linenum])):
+  if (_RE_COMMA_NO_SPACE.search(_RE_OPERATOR_COMMA.sub('F(', line)) and
+      _RE_COMMA_NO_SPACE.search(raw[linenum])):
     error(filename, linenum, 'whitespace/comma', 3,
           'Missing space after ,')
 
@@ -3480,7 +4245,7 @@ def CheckCommaSpacing(filename, clean_lines, linenum, error):
   # except for few corner cases
   # TODO(unknown): clarify if 'if (1) { return 1;}' is requires one more
   # space after ;
-  if Search(r';[^\s};\\)/]', line):
+  if _RE_SEMICOLON_NO_SPACE.search(line):
     error(filename, linenum, 'whitespace/semicolon', 3,
           'Missing space after ;')
 
@@ -3548,6 +4313,13 @@ def _IsType(clean_lines, nesting_state, expr):
   return False
 
 
+_RE_OPEN_BRACE_NO_SPACE = _LazyRegex(r'^(.*[^ ({>]){')
+_RE_ELSE_NO_SPACE = _LazyRegex(r'}else')
+_RE_EMPTY_STATEMENT_AFTER_COLON = _LazyRegex(r':\s*;\s*$')
+_RE_EMPTY_STATEMENT = _LazyRegex(r'^\s*;\s*$')
+_RE_SPACE_BEFORE_SEMICOLON = _LazyRegex(r'\s+;\s*$')
+
+
 def CheckBracesSpacing(filename, clean_lines, linenum, nesting_state, error):
   """Checks for horizontal spacing near commas.
 
@@ -3567,7 +4339,7 @@ def CheckBracesSpacing(filename, clean_lines, linenum, nesting_state, error):
   # And since you should never have braces at the beginning of a line,
   # this is an easy test.  Except that braces used for initialization don't
   # follow the same rule; we often don't want spaces before those.
-  match = Match(r'^(.*[^ ({>]){', line)
+  match = _RE_OPEN_BRACE_NO_SPACE.match(line)
 
   if match:
     # Try a bit harder to check for brace initialization.  This
@@ -3616,21 +4388,21 @@ def CheckBracesSpacing(filename, clean_lines, linenum, nesting_state, error):
             'Missing space before {')
 
   # Make sure '} else {' has spaces.
-  if Search(r'}else', line):
+  if _RE_ELSE_NO_SPACE.search(line):
     error(filename, linenum, 'whitespace/braces', 5,
           'Missing space before else')
 
   # You shouldn't have a space before a semicolon at the end of the line.
   # There's a special case for "for" since the style guide allows space before
   # the semicolon there.
-  if Search(r':\s*;\s*$', line):
+  if _RE_EMPTY_STATEMENT_AFTER_COLON.search(line):
     error(filename, linenum, 'whitespace/semicolon', 5,
           'Semicolon defining empty statement. Use {} instead.')
-  elif Search(r'^\s*;\s*$', line):
+  elif _RE_EMPTY_STATEMENT.search(line):
     error(filename, linenum, 'whitespace/semicolon', 5,
           'Line contains only semicolon. If this should be an empty statement, '
           'use {} instead.')
-  elif (Search(r'\s+;\s*$', line) and
+  elif (_RE_SPACE_BEFORE_SEMICOLON.search(line) and
         not Search(r'\bfor\b', line)):
     error(filename, linenum, 'whitespace/semicolon', 5,
           'Extra space before last semicolon. If this should be an empty '
@@ -3733,6 +4505,17 @@ def GetPreviousNonBlankLine(clean_lines, linenum):
   return ('', -1)
 
 
+_RE_LONE_OPEN_BRACE = _LazyRegex(r'\s*{\s*$')
+_RE_LEADING_ELSE = _LazyRegex(r'\s*else\b\s*(?:if\b|\{|$)')
+_RE_ELSE_IF = _LazyRegex(r'else if\s*\(')
+_RE_ELSE_WITHOUT_OPEN_BRACE = _LazyRegex(r'}\s*else[^{]*$')
+_RE_ELSE_WITHOUT_CLOSE_BRACE = _LazyRegex(r'[^}]*else\s*{')
+_RE_ELSE_WITH_BODY = _LazyRegex(r'\belse [^\s{]')
+_RE_ELSE_IF_WORD = _LazyRegex(r'\belse if\b')
+_RE_DO_WITH_BODY = _LazyRegex(r'\s*do [^\s{]')
+_RE_IF_OR_ELSE = _LazyRegex(r'\b(if\s*\(|else\b)')
+
+
 def CheckBraces(filename, clean_lines, linenum, error):
   """Looks for misplaced braces (e.g. at the end of line).
 
@@ -3745,7 +4528,7 @@ def CheckBraces(filename, clean_lines, linenum, error):
 
   line = clean_lines.elided[linenum]        # get rid of comments and strings
 
-  if Match(r'\s*{\s*$', line):
+  if _RE_LONE_OPEN_BRACE.match(line):
     # We allow an open brace to start a line in the case where someone is using
     # braces in a block to explicitly create a new scope, which is commonly used
     # to control the lifetime of stack-allocated variables.  Braces are also
@@ -3763,7 +4546,7 @@ def CheckBraces(filename, clean_lines, linenum, error):
             '{ should almost always be at the end of the previous line')
 
   # An else clause should be on the same line as the preceding closing brace.
-  if Match(r'\s*else\b\s*(?:if\b|\{|$)', line):
+  if _RE_LEADING_ELSE.match(line):
     prevline = GetPreviousNonBlankLine(clean_lines, linenum)[0]
     if Match(r'\s*}\s*$', prevline):
       error(filename, linenum, 'whitespace/newline', 4,
@@ -3771,7 +4554,7 @@ def CheckBraces(filename, clean_lines, linenum, error):
 
   # If braces come on one side of an else, they should be on both.
   # However, we have to worry about "else if" that spans multiple lines!
-  if Search(r'else if\s*\(', line):       # could be multi-line if
+  if _RE_ELSE_IF.search(line):       # could be multi-line if
     brace_on_left = bool(Search(r'}\s*else if\s*\(', line))
     # find the ( after the if
     pos = line.find('else if')
@@ -3782,17 +4565,18 @@ def CheckBraces(filename, clean_lines, linenum, error):
       if brace_on_left != brace_on_right:    # must be brace after if
         error(filename, linenum, 'readability/braces', 5,
               'If an else has a brace on one side, it should have it on both')
-  elif Search(r'}\s*else[^{]*$', line) or Match(r'[^}]*else\s*{', line):
+  elif (_RE_ELSE_WITHOUT_OPEN_BRACE.search(line) or
+        _RE_ELSE_WITHOUT_CLOSE_BRACE.match(line)):
     error(filename, linenum, 'readability/braces', 5,
           'If an else has a brace on one side, it should have it on both')
 
   # Likewise, an else should never have the else clause on the same line
-  if Search(r'\belse [^\s{]', line) and not Search(r'\belse if\b', line):
+  if _RE_ELSE_WITH_BODY.search(line) and not _RE_ELSE_IF_WORD.search(line):
     error(filename, linenum, 'whitespace/newline', 4,
           'Else clause should never be on same line as else (use 2 lines)')
 
   # In the same way, a do/while should never be on one line
-  if Match(r'\s*do [^\s{]', line):
+  if _RE_DO_WITH_BODY.match(line):
     error(filename, linenum, 'whitespace/newline', 4,
           'do/while clauses should not be on a single line')
 
@@ -3803,7 +4587,7 @@ def CheckBraces(filename, clean_lines, linenum, error):
   # its line, and the line after that should have an indent level equal to or
   # lower than the if. We also check for ambiguous if/else nesting without
   # braces.
-  if_else_match = Search(r'\b(if\s*\(|else\b)', line)
+  if_else_match = _RE_IF_OR_ELSE.search(line)
   if if_else_match and not Match(r'\s*#', line):
     if_indent = GetIndentLevel(line)
     endline, endlinenum, endpos = line, linenum, if_else_match.end()
@@ -3852,6 +4636,12 @@ def CheckBraces(filename, clean_lines, linenum, error):
                   'If/else bodies with multiple statements require braces')
 
 
+_RE_CLOSE_PAREN_OPEN_BRACE = _LazyRegex(r'^(.*\)\s*)\{')
+_RE_ELSE_OR_CONST_OPEN_BRACE = _LazyRegex(r'^(.*(?:else|\)\s*const)\s*)\{')
+_RE_STATEMENT_END = _LazyRegex(r'[;{}]\s*$')
+_RE_LEADING_OPEN_BRACE = _LazyRegex(r'^(\s*)\{')
+
+
 def CheckTrailingSemicolon(filename, clean_lines, linenum, error):
   """Looks for redundant trailing semicolon.
 
@@ -3908,7 +4698,7 @@ def CheckTrailingSemicolon(filename, clean_lines, linenum, error):
   #    to namespaces.  For now we do not warn for this case.
   #
   # Try matching case 1 first.
-  match = Match(r'^(.*\)\s*)\{', line)
+  match = _RE_CLOSE_PAREN_OPEN_BRACE.match(line)
   if match:
     # Matched closing parenthesis (case 1).  Check the token before the
     # matching opening parenthesis, and don't warn if it looks like a
@@ -3961,7 +4751,7 @@ def CheckTrailingSemicolon(filename, clean_lines, linenum, error):
 
   else:
     # Try matching cases 2-3.
-    match = Match(r'^(.*(?:else|\)\s*const)\s*)\{', line)
+    match = _RE_ELSE_OR_CONST_OPEN_BRACE.match(line)
     if not match:
       # Try matching cases 4-6.  These are always matched on separate lines.
       #
@@ -3971,9 +4761,15 @@ def CheckTrailingSemicolon(filename, clean_lines, linenum, error):
       #   if (cond) {
       #     // blank line
       #   }
-      prevline = GetPreviousNonBlankLine(clean_lines, linenum)[0]
-      if prevline and Search(r'[;{}]\s*$', prevline):
-        match = Match(r'^(\s*)\{', line)
+      #
+      # The previous line is only looked up for lines that start with a
+      # brace: looking it up for every line would scan back over each run of
+      # blank lines once per line of the run.
+      match = _RE_LEADING_OPEN_BRACE.match(line)
+      if match:
+        prevline = GetPreviousNonBlankLine(clean_lines, linenum)[0]
+        if not (prevline and _RE_STATEMENT_END.search(prevline)):
+          match = None
 
   # Check matching closing brace
   if match:
@@ -3999,6 +4795,9 @@ def CheckTrailingSemicolon(filename, clean_lines, linenum, error):
             "You don't need a ; after a }")
 
 
+_RE_LOOP_OR_IF = _LazyRegex(r'\s*(for|while|if)\s*\(')
+
+
 def CheckEmptyBlockBody(filename, clean_lines, linenum, error):
   """Look for empty loop/conditional body with only a single semicolon.
 
@@ -4016,7 +4815,7 @@ def CheckEmptyBlockBody(filename, clean_lines, linenum, error):
   # We also check "if" blocks here, since an empty conditional block
   # is likely an error.
   line = clean_lines.elided[linenum]
-  matched = Match(r'\s*(for|while|if)\s*\(', line)
+  matched = _RE_LOOP_OR_IF.match(line)
   if matched:
     # Find the end of the conditional expression.
     (end_line, end_linenum, end_pos) = CloseExpression(
@@ -4244,6 +5043,9 @@ def CheckCheck(filename, clean_lines, linenum, error):
               check_macro, operator))
 
 
+_RE_PREPROCESSOR_LINE = _LazyRegex(r'^\s*#')
+
+
 def CheckAltTokens(filename, clean_lines, linenum, error):
   """Check alternative keywords being used in boolean expressions.
 
@@ -4256,7 +5058,7 @@ def CheckAltTokens(filename, clean_lines, linenum, error):
   line = clean_lines.elided[linenum]
 
   # Avoid preprocessor lines
-  if Match(r'^\s*#', line):
+  if _RE_PREPROCESSOR_LINE.match(line):
     return
 
   # Last ditch effort to avoid multi-line comments.  This will not help
@@ -4276,6 +5078,36 @@ def CheckAltTokens(filename, clean_lines, linenum, error):
               _ALT_TOKEN_REPLACEMENT[match.group(1)], match.group(1)))
 
 
+# Matches any character outside of the ASCII range.
+_RE_NON_ASCII = _LazyRegex(r'[^\x00-\x7f]')
+
+# Narrow Python 2 builds store characters outside of the Basic Multilingual
+# Plane as surrogate pairs, and only one column should be counted per pair.
+# Issue 337
+# https://mail.python.org/pipermail/python-list/2012-August/628809.html
+_IS_NARROW_UNICODE_BUILD = sys.maxunicode < 0x10000
+
+# {unicode, int}: the column width of every non-ASCII character seen so far.
+# This is filled in lazily by GetLineWidth, so each distinct character is
+# only looked up in unicodedata once per run.
+_unicode_char_widths = {}
+
+
+def _LookupUnicodeCharWidth(uc):
+  """Computes and caches the column width of a single character."""
+  if unicodedata.east_asian_width(uc) in ('W', 'F'):
+    width = 2
+  elif unicodedata.combining(uc):
+    width = 0
+  elif _IS_NARROW_UNICODE_BUILD and 0xDC00 <= ord(uc) <= 0xDFFF:
+    # Low surrogate, the high surrogate of the pair was already counted.
+    width = 0
+  else:
+    width = 1
+  _unicode_char_widths[uc] = width
+  return width
+
+
 def GetLineWidth(line):
   """Determines the width of the line in column positions.
 
@@ -4286,28 +5118,25 @@ def GetLineWidth(line):
     The width of the line in column positions, accounting for Unicode
     combining characters and wide characters.
   """
-  if isinstance(line, unicode):
+  if isinstance(line, unicode) and _RE_NON_ASCII.search(line):
+    widths = _unicode_char_widths
     width = 0
     for uc in unicodedata.normalize('NFC', line):
-      if unicodedata.east_asian_width(uc) in ('W', 'F'):
-        width += 2
-      elif not unicodedata.combining(uc):
-        # Issue 337
-        # https://mail.python.org/pipermail/python-list/2012-August/628809.html
-        if (sys.version_info.major, sys.version_info.minor) <= (3, 2):
-          # https://github.com/python/cpython/blob/2.7/Include/unicodeobject.h#L81
-          is_wide_build = sysconfig.get_config_var("Py_UNICODE_SIZE") >= 4
-          # https://github.com/python/cpython/blob/2.7/Objects/unicodeobject.c#L564
-          is_low_surrogate = 0xDC00 <= ord(uc) <= 0xDFFF
-          if not is_wide_build and is_low_surrogate:
-            width -= 1
-          
-        width += 1
+      if uc in widths:
+        width += widths[uc]
+      else:
+        width += _LookupUnicodeCharWidth(uc)
     return width
   else:
     return len(line)
 
 
+_RE_CONTINUED_EXPRESSION = _LazyRegex(r'[",=><] *$')
+_RE_COMMENTED_URL = _LazyRegex(r'^\s*//.*http(s?)://\S*$')
+_RE_COMMENT_SINGLE_WORD = _LazyRegex(r'^\s*//\s*[^\s]*$')
+_RE_ID_KEYWORD = _LazyRegex(r'^// \$Id:.*#[0-9]+ \$$')
+
+
 def CheckStyle(filename, clean_lines, linenum, file_extension, nesting_state,
                error):
   """Checks rules from the 'C++ style rules' section of cppguide.html.
@@ -4360,7 +5189,7 @@ def CheckStyle(filename, clean_lines, linenum, file_extension, nesting_state,
   # We also don't check for lines that look like continuation lines
   # (of lines ending in double quotes, commas, equals, or angle brackets)
   # because the rules for how to indent those are non-trivial.
-  if (not Search(r'[",=><] *$', prev) and
+  if (not _RE_CONTINUED_EXPRESSION.search(prev) and
       (initial_spaces == 1 or initial_spaces == 3) and
       not Match(scope_or_label_pattern, cleansed_line) and
       not (clean_lines.raw_lines[linenum] != line and
@@ -4390,9 +5219,9 @@ def CheckStyle(filename, clean_lines, linenum, file_extension, nesting_state,
   # The "$Id:...$" comment may also get very long without it being the
   # developers fault.
   if (not line.startswith('#include') and not is_header_guard and
-      not Match(r'^\s*//.*http(s?)://\S*$', line) and
-      not Match(r'^\s*//\s*[^\s]*$', line) and
-      not Match(r'^// \$Id:.*#[0-9]+ \$$', line)):
+      not _RE_COMMENTED_URL.match(line) and
+      not _RE_COMMENT_SINGLE_WORD.match(line) and
+      not _RE_ID_KEYWORD.match(line)):
     line_width = GetLineWidth(line)
     if line_width > _line_length:
       error(filename, linenum, 'whitespace/line_length', 2,
@@ -4569,7 +5398,7 @@ def CheckIncludeLine(filename, clean_lines, linenum, include_state, error):
       error(filename, linenum, 'build/include', 4,
             'Do not include .cc files from other packages')
     elif not _THIRD_PARTY_HEADERS_PATTERN.match(include):
-      include_state.include_list[-1].append((include, linenum))
+      include_state.AddInclude(include, linenum)
 
       # We want to ensure that headers appear in the right order:
       # 1) for foo.cc, foo.h  (preferred location)
@@ -4673,15 +5502,56 @@ _RE_PATTERN_REF_PARAM = re.compile(
     r'(' + _RE_PATTERN_TYPE + r'(?:\s*(?:\bconst\b|[*]))*\s*'
     r'&\s*' + _RE_PATTERN_IDENT + r')\s*(?:=[^,()]+)?[,)]')
 # A call-by-const-reference parameter either ends with 'const& identifier'
-# or looks like 'const type& identifier' when 'type' is atomic.
+# or looks like 'const type& identifier' when 'type' is atomic.  (A '\s*'
+# after the '.*' would match nothing more, and made long runs of spaces
+# take cubic time.)
 _RE_PATTERN_CONST_REF_PARAM = (
-    r'(?:.*\s*\bconst\s*&\s*' + _RE_PATTERN_IDENT +
+    r'(?:.*\bconst\s*&\s*' + _RE_PATTERN_IDENT +
     r'|const\s+' + _RE_PATTERN_TYPE + r'\s*&\s*' + _RE_PATTERN_IDENT + r')')
 # Stream types.
 _RE_PATTERN_REF_STREAM_PARAM = (
     r'(?:.*stream\s*&\s*' + _RE_PATTERN_IDENT + r')')
 
 
+_RE_PREPROCESSOR_CONDITIONAL = _LazyRegex(
+    r'^\s*#\s*(if|ifdef|ifndef|elif|else|endif)\b')
+_RE_SHORT_PORT = _LazyRegex(r'\bshort port\b')
+_RE_SHORT_OR_LONG_TYPE = _LazyRegex(r'\b(short|long(?! +double)|long long)\b')
+_RE_UNARY_OPERATOR_AMPERSAND = _LazyRegex(r'\boperator\s*&\s*\(\s*\)')
+_RE_IF_AFTER_CLOSE_BRACE = _LazyRegex(r'\}\s*if\s*\(')
+_RE_MEMSET = _LazyRegex(r'memset\s*\(([^,]*),\s*([^,]*),\s*0\s*\)')
+_RE_USING_NAMESPACE = _LazyRegex(r'\busing namespace\b')
+_RE_VARIABLE_LENGTH_ARRAY = _LazyRegex(r'\s*(.+::)?(\w+) [a-z]\w*\[(.+)];')
+
+
+def UpdateIncludeSection(filename, clean_lines, linenum, include_state,
+                         error):
+  """Checks an #include line, or starts a new section of includes.
+
+  Args:
+    filename: The name of the current file.
+    clean_lines: A CleansedLines instance containing the file.
+    linenum: The number of the line to check.
+    include_state: An _IncludeState instance in which the headers are inserted.
+    error: The function to call with any errors found.
+
+  Returns:
+    True if the line is an #include line.
+  """
+  line = clean_lines.elided[linenum]
+  match = _RE_PATTERN_INCLUDE.search(line)
+  if match:
+    CheckIncludeLine(filename, clean_lines, linenum, include_state, error)
+    return True
+
+  # Reset include state across preprocessor directives.  This is meant
+  # to silence warnings for conditional includes.
+  match = _RE_PREPROCESSOR_CONDITIONAL.match(line)
+  if match:
+    include_state.ResetSection(match.group(1))
+  return False
+
+
 def CheckLanguage(filename, clean_lines, linenum, file_extension,
                   include_state, nesting_state, error):
   """Checks rules from the 'C++ language rules' section of cppguide.html.
@@ -4705,17 +5575,10 @@ def CheckLanguage(filename, clean_lines, linenum, file_extension,
   if not line:
     return
 
-  match = _RE_PATTERN_INCLUDE.search(line)
-  if match:
-    CheckIncludeLine(filename, clean_lines, linenum, include_state, error)
+  if UpdateIncludeSection(filename, clean_lines, linenum, include_state,
+                          error):
     return
 
-  # Reset include state across preprocessor directives.  This is meant
-  # to silence warnings for conditional includes.
-  match = Match(r'^\s*#\s*(if|ifdef|ifndef|elif|else|endif)\b', line)
-  if match:
-    include_state.ResetSection(match.group(1))
-
   # Make Windows paths like Unix.
   fullname = os.path.abspath(filename).replace('\\', '/')
 
@@ -4734,12 +5597,12 @@ def CheckLanguage(filename, clean_lines, linenum, file_extension,
 
   # Check if people are using the verboten C basic types.  The only exception
   # we regularly allow is "unsigned short port" for port.
-  if Search(r'\bshort port\b', line):
+  if _RE_SHORT_PORT.search(line):
     if not Search(r'\bunsigned short port\b', line):
       error(filename, linenum, 'runtime/int', 4,
             'Use "unsigned short" for ports, not "short"')
   else:
-    match = Search(r'\b(short|long(?! +double)|long long)\b', line)
+    match = _RE_SHORT_OR_LONG_TYPE.search(line)
     if match:
       error(filename, linenum, 'runtime/int', 4,
             'Use int16/int64/etc, rather than the C type %s' % match.group(1))
@@ -4750,13 +5613,13 @@ def CheckLanguage(filename, clean_lines, linenum, file_extension,
   #   int operator&(const X& x) { return 42; }  // unary operator&
   # The trick is it's hard to tell apart from binary operator&:
   #   class Y { int operator&(const Y& x) { return 23; } }; // binary operator&
-  if Search(r'\boperator\s*&\s*\(\s*\)', line):
+  if _RE_UNARY_OPERATOR_AMPERSAND.search(line):
     error(filename, linenum, 'runtime/operator', 4,
           'Unary operator& is dangerous.  Do not use it.')
 
   # Check for suspicious usage of "if" like
   # } if (a == b) {
-  if Search(r'\}\s*if\s*\(', line):
+  if _RE_IF_AFTER_CLOSE_BRACE.search(line):
     error(filename, linenum, 'readability/braces', 4,
           'Did you mean "else if"? If not, start a new line for "if".')
 
@@ -4778,19 +5641,19 @@ def CheckLanguage(filename, clean_lines, linenum, file_extension,
             % (function_name, match.group(1)))
 
   # Check for potential memset bugs like memset(buf, sizeof(buf), 0).
-  match = Search(r'memset\s*\(([^,]*),\s*([^,]*),\s*0\s*\)', line)
+  match = _RE_MEMSET.search(line)
   if match and not Match(r"^''|-?[0-9]+|0x[0-9A-Fa-f]$", match.group(2)):
     error(filename, linenum, 'runtime/memset', 4,
           'Did you mean "memset(%s, 0, %s)"?'
           % (match.group(1), match.group(2)))
 
-  if Search(r'\busing namespace\b', line):
+  if _RE_USING_NAMESPACE.search(line):
     error(filename, linenum, 'build/namespaces', 5,
           'Do not use namespace using-directives.  '
           'Use using-declarations instead.')
 
   # Detect variable-length arrays.
-  match = Match(r'\s*(.+::)?(\w+) [a-z]\w*\[(.+)];', line)
+  match = _RE_VARIABLE_LENGTH_ARRAY.match(line)
   if (match and match.group(2) != 'return' and match.group(2) != 'delete' and
       match.group(3).find(']') == -1):
     # Split the size using space and arithmetic operators as delimiters.
@@ -4840,6 +5703,15 @@ def CheckLanguage(filename, clean_lines, linenum, file_extension,
           ' for more information.')
 
 
+_RE_STATEMENT_START = _LazyRegex(r'[;({]')
+_RE_STRING_DECLARATION = _LazyRegex(
+    r'((?:|static +)(?:|const +))(?::*std::)?string( +const)? +'
+    r'([a-zA-Z0-9_:]+)\b(.*)')
+_RE_SELF_INIT = _LazyRegex(r'\b([A-Za-z0-9_]*_)\(\1\)')
+_RE_SELF_INIT_CHECK_NOTNULL = _LazyRegex(
+    r'\b([A-Za-z0-9_]*_)\(CHECK_NOTNULL\(\1\)\)')
+
+
 def CheckGlobalStatic(filename, clean_lines, linenum, error):
   """Check for unsafe global or static objects.
 
@@ -4852,7 +5724,8 @@ def CheckGlobalStatic(filename, clean_lines, linenum, error):
   line = clean_lines.elided[linenum]
 
   # Match two lines at a time to support multiline declarations
-  if linenum + 1 < clean_lines.NumLines() and not Search(r'[;({]', line):
+  if (linenum + 1 < clean_lines.NumLines() and
+      not _RE_STATEMENT_START.search(line)):
     line += clean_lines.elided[linenum + 1].strip()
 
   # Check for people declaring static/global STL strings at the top level.
@@ -4861,10 +5734,7 @@ def CheckGlobalStatic(filename, clean_lines, linenum, error):
   # also because globals can be destroyed when some threads are still running.
   # TODO(unknown): Generalize this to also find static unique_ptr instances.
   # TODO(unknown): File bugs for clang-tidy to find these.
-  match = Match(
-      r'((?:|static +)(?:|const +))(?::*std::)?string( +const)? +'
-      r'([a-zA-Z0-9_:]+)\b(.*)',
-      line)
+  match = _RE_STRING_DECLARATION.match(line)
 
   # Remove false positives:
   # - String pointers (as opposed to values).
@@ -4895,12 +5765,17 @@ def CheckGlobalStatic(filename, clean_lines, linenum, error):
       error(filename, linenum, 'runtime/string', 4,
             'Static/global string variables are not permitted.')
 
-  if (Search(r'\b([A-Za-z0-9_]*_)\(\1\)', line) or
-      Search(r'\b([A-Za-z0-9_]*_)\(CHECK_NOTNULL\(\1\)\)', line)):
+  if (_RE_SELF_INIT.search(line) or
+      _RE_SELF_INIT_CHECK_NOTNULL.search(line)):
     error(filename, linenum, 'runtime/init', 4,
           'You seem to be initializing a member variable with itself.')
 
 
+_RE_SNPRINTF = _LazyRegex(r'snprintf\s*\(([^,]*),\s*([0-9]*)\s*,')
+_RE_SPRINTF = _LazyRegex(r'\bsprintf\s*\(')
+_RE_STRCPY_OR_STRCAT = _LazyRegex(r'\b(strcpy|strcat)\s*\(')
+
+
 def CheckPrintf(filename, clean_lines, linenum, error):
   """Check for printf related issues.
 
@@ -4913,7 +5788,7 @@ def CheckPrintf(filename, clean_lines, linenum, error):
   line = clean_lines.elided[linenum]
 
   # When snprintf is used, the second argument shouldn't be a literal.
-  match = Search(r'snprintf\s*\(([^,]*),\s*([0-9]*)\s*,', line)
+  match = _RE_SNPRINTF.search(line)
   if match and match.group(2) != '0':
     # If 2nd arg is zero, snprintf is used to calculate size.
     error(filename, linenum, 'runtime/printf', 3,
@@ -4921,10 +5796,10 @@ def CheckPrintf(filename, clean_lines, linenum, error):
           'to snprintf.' % (match.group(1), match.group(2)))
 
   # Check if some verboten C functions are being used.
-  if Search(r'\bsprintf\s*\(', line):
+  if _RE_SPRINTF.search(line):
     error(filename, linenum, 'runtime/printf', 5,
           'Never use sprintf. Use snprintf instead.')
-  match = Search(r'\b(strcpy|strcat)\s*\(', line)
+  match = _RE_STRCPY_OR_STRCAT.search(line)
   if match:
     error(filename, linenum, 'runtime/printf', 4,
           'Almost always, snprintf is better than %s' % match.group(1))
@@ -5149,6 +6024,19 @@ def CheckForNonConstReference(filename, clean_lines, linenum,
             ReplaceAll(' *<', '<', parameter))
 
 
+_RE_CONVERSION_FUNCTION_CAST = _LazyRegex(
+    r'(\bnew\s+(?:const\s+)?|\S<\s*(?:const\s+)?)?\b'
+    r'(int|float|double|bool|char|int32|uint32|int64|uint64)'
+    r'(\([^)].*)')
+_RE_C_STYLE_STATIC_CAST = _LazyRegex(
+    r'\((int|float|double|bool|char|u?int(16|32|64))\)')
+_RE_C_STYLE_CONST_CAST = _LazyRegex(r'\((char\s?\*+\s?)\)\s*"')
+_RE_C_STYLE_REINTERPRET_CAST = _LazyRegex(r'\((\w+\s?\*+\s?)\)')
+_RE_ADDRESS_OF_CAST = _LazyRegex(
+    r'(?:[^\w]&\(([^)*][^)]*)\)[\w(])|'
+    r'(?:[^\w]&(static|dynamic|down|reinterpret)_cast\b)')
+
+
 def CheckCasts(filename, clean_lines, linenum, error):
   """Various cast related checks.
 
@@ -5164,10 +6052,7 @@ def CheckCasts(filename, clean_lines, linenum, error):
   # I just try to capture the most common basic types, though there are more.
   # Parameterless conversion functions, such as bool(), are allowed as they are
   # probably a member operator declaration or default constructor.
-  match = Search(
-      r'(\bnew\s+(?:const\s+)?|\S<\s*(?:const\s+)?)?\b'
-      r'(int|float|double|bool|char|int32|uint32|int64|uint64)'
-      r'(\([^)].*)', line)
+  match = _RE_CONVERSION_FUNCTION_CAST.search(line)
   expecting_function = ExpectingFunctionArgs(clean_lines, linenum)
   if match and not expecting_function:
     matched_type = match.group(2)
@@ -5211,19 +6096,19 @@ def CheckCasts(filename, clean_lines, linenum, error):
 
   if not expecting_function:
     CheckCStyleCast(filename, clean_lines, linenum, 'static_cast',
-                    r'\((int|float|double|bool|char|u?int(16|32|64))\)', error)
+                    _RE_C_STYLE_STATIC_CAST, error)
 
   # This doesn't catch all cases. Consider (const char * const)"hello".
   #
   # (char *) "foo" should always be a const_cast (reinterpret_cast won't
   # compile).
   if CheckCStyleCast(filename, clean_lines, linenum, 'const_cast',
-                     r'\((char\s?\*+\s?)\)\s*"', error):
+                     _RE_C_STYLE_CONST_CAST, error):
     pass
   else:
     # Check pointer casts for other than string constants
     CheckCStyleCast(filename, clean_lines, linenum, 'reinterpret_cast',
-                    r'\((\w+\s?\*+\s?)\)', error)
+                    _RE_C_STYLE_REINTERPRET_CAST, error)
 
   # In addition, we look for people taking the address of a cast.  This
   # is dangerous -- casts can assign to temporaries, so the pointer doesn't
@@ -5236,9 +6121,7 @@ def CheckCasts(filename, clean_lines, linenum, error):
   #
   # This is not a cast:
   #   reference_type&(int* function_param);
-  match = Search(
-      r'(?:[^\w]&\(([^)*][^)]*)\)[\w(])|'
-      r'(?:[^\w]&(static|dynamic|down|reinterpret)_cast\b)', line)
+  match = _RE_ADDRESS_OF_CAST.search(line)
   if match:
     # Try a better error message when the & is bound to something
     # dereferenced by the casted pointer, as opposed to the casted
@@ -5277,7 +6160,7 @@ def CheckCStyleCast(filename, clean_lines, linenum, cast_type, pattern, error):
     linenum: The number of the line to check.
     cast_type: The string for the C++ cast to recommend.  This is either
       reinterpret_cast, static_cast, or const_cast, depending.
-    pattern: The regular expression used to find C-style casts.
+    pattern: The _LazyRegex used to find C-style casts.
     error: The function to call with any errors found.
 
   Returns:
@@ -5285,7 +6168,7 @@ def CheckCStyleCast(filename, clean_lines, linenum, cast_type, pattern, error):
     False otherwise.
   """
   line = clean_lines.elided[linenum]
-  match = Search(pattern, line)
+  match = pattern.search(line)
   if not match:
     return False
 
@@ -5321,6 +6204,13 @@ def CheckCStyleCast(filename, clean_lines, linenum, cast_type, pattern, error):
   return True
 
 
+_RE_MOCK_METHOD = _LazyRegex(r'^\s*MOCK_(CONST_)?METHOD\d+(_T)?\(')
+_RE_MOCK_METHOD_CONTINUED = _LazyRegex(
+    r'^\s*MOCK_(?:CONST_)?METHOD\d+(?:_T)?\((?:\S+,)?\s*$')
+_RE_MOCK_METHOD_OPEN = _LazyRegex(r'^\s*MOCK_(?:CONST_)?METHOD\d+(?:_T)?\(\s*$')
+_RE_STD_FUNCTION_OPEN = _LazyRegex(r'\bstd::m?function\s*\<\s*$')
+
+
 def ExpectingFunctionArgs(clean_lines, linenum):
   """Checks whether where function type arguments are expected.
 
@@ -5333,14 +6223,11 @@ def ExpectingFunctionArgs(clean_lines, linenum):
     of function types.
   """
   line = clean_lines.elided[linenum]
-  return (Match(r'^\s*MOCK_(CONST_)?METHOD\d+(_T)?\(', line) or
+  return (_RE_MOCK_METHOD.match(line) or
           (linenum >= 2 and
-           (Match(r'^\s*MOCK_(?:CONST_)?METHOD\d+(?:_T)?\((?:\S+,)?\s*$',
-                  clean_lines.elided[linenum - 1]) or
-            Match(r'^\s*MOCK_(?:CONST_)?METHOD\d+(?:_T)?\(\s*$',
-                  clean_lines.elided[linenum - 2]) or
-            Search(r'\bstd::m?function\s*\<\s*$',
-                   clean_lines.elided[linenum - 1]))))
+           (_RE_MOCK_METHOD_CONTINUED.match(clean_lines.elided[linenum - 1]) or
+            _RE_MOCK_METHOD_OPEN.match(clean_lines.elided[linenum - 2]) or
+            _RE_STD_FUNCTION_OPEN.search(clean_lines.elided[linenum - 1]))))
 
 
 _HEADERS_CONTAINING_TEMPLATES = (
@@ -5495,57 +6382,72 @@ def UpdateIncludeState(filename, include_dict, io=codecs):
   return True
 
 
-def CheckForIncludeWhatYouUse(filename, clean_lines, include_state, error,
-                              io=codecs):
-  """Reports for missing stl includes.
-
-  This function will output warnings to make sure you are including the headers
-  necessary for the stl containers and functions that you use. We only give one
-  reason to include a header. For example, if you use both equal_to<> and
-  less<> in a .h file, only one (the latter in the file) of these will be
-  reported as a reason to include the <functional>.
+def UpdateRequiredHeaders(line, linenum, required):
+  """Records the STL headers that a line needs, for CheckForIncludeWhatYouUse.
 
   Args:
-    filename: The name of the current file.
-    clean_lines: A CleansedLines instance containing the file.
-    include_state: An _IncludeState instance.
-    error: The function to call with any errors found.
-    io: The IO factory to use to read the header file. Provided for unittest
-        injection.
+    line: The elided line.
+    linenum: The number of the line.
+    required: A map of header name to the line number and template entity of
+              its last use, which is updated.
   """
-  required = {}  # A map of header name to linenumber and the template entity.
-                 # Example of required: { '<functional>': (1219, 'less<>') }
+  if not line or line[0] == '#':
+    return
 
-  for linenum in xrange(clean_lines.NumLines()):
-    line = clean_lines.elided[linenum]
-    if not line or line[0] == '#':
-      continue
+  # String is special -- it is a non-templatized type in STL.
+  matched = _RE_PATTERN_STRING.search(line)
+  if matched:
+    # Don't warn about strings in non-STL namespaces:
+    # (We check only the first match per line; good enough.)
+    prefix = line[:matched.start()]
+    if prefix.endswith('std::') or not prefix.endswith('::'):
+      required['<string>'] = (linenum, 'string')
+
+  for pattern, template, header in _re_pattern_headers_maybe_templates:
+    if pattern.search(line):
+      required[header] = (linenum, template)
+
+  # The following function is just a speed up, no semantics are changed.
+  if not '<' in line:  # Reduces the cpu time usage by skipping lines.
+    return
 
-    # String is special -- it is a non-templatized type in STL.
-    matched = _RE_PATTERN_STRING.search(line)
+  for pattern, template, header in _re_pattern_templates:
+    matched = pattern.search(line)
     if matched:
-      # Don't warn about strings in non-STL namespaces:
+      # Don't warn about IWYU in non-STL namespaces:
       # (We check only the first match per line; good enough.)
       prefix = line[:matched.start()]
       if prefix.endswith('std::') or not prefix.endswith('::'):
-        required['<string>'] = (linenum, 'string')
-
-    for pattern, template, header in _re_pattern_headers_maybe_templates:
-      if pattern.search(line):
         required[header] = (linenum, template)
 
-    # The following function is just a speed up, no semantics are changed.
-    if not '<' in line:  # Reduces the cpu time usage by skipping lines.
-      continue
 
-    for pattern, template, header in _re_pattern_templates:
-      matched = pattern.search(line)
-      if matched:
-        # Don't warn about IWYU in non-STL namespaces:
-        # (We check only the first match per line; good enough.)
-        prefix = line[:matched.start()]
-        if prefix.endswith('std::') or not prefix.endswith('::'):
-          required[header] = (linenum, template)
+def CheckForIncludeWhatYouUse(filename, clean_lines, include_state, error,
+                              io=codecs, required=None):
+  """Reports for missing stl includes.
+
+  This function will output warnings to make sure you are including the headers
+  necessary for the stl containers and functions that you use. We only give one
+  reason to include a header. For example, if you use both equal_to<> and
+  less<> in a .h file, only one (the latter in the file) of these will be
+  reported as a reason to include the <functional>.
+
+  Args:
+    filename: The name of the current file.
+    clean_lines: A CleansedLines instance containing the file.
+    include_state: An _IncludeState instance.
+    error: The function to call with any errors found.
+    io: The IO factory to use to read the header file. Provided for unittest
+        injection.
+    required: A map of header name to line number and template entity, as
+              built by calling UpdateRequiredHeaders on every line, for
+              callers that have done so already.  If None, the lines of
+              clean_lines are scanned.
+  """
+  if required is None:
+    required = {}  # A map of header name to linenumber and the template entity.
+                   # Example of required: { '<functional>': (1219, 'less<>') }
+    for linenum in xrange(clean_lines.NumLines()):
+      UpdateRequiredHeaders(clean_lines.elided[linenum], linenum, required)
 
   # The policy is that if you #include something in foo.h you don't need to
   # include it again in foo.cc. Here, we will look at possible includes.
@@ -5574,7 +6476,8 @@ def CheckForIncludeWhatYouUse(filename, clean_lines, include_state, error,
   for header in header_keys:
     (same_module, common_path) = FilesBelongToSameModule(abs_filename, header)
     fullpath = common_path + header
-    if same_module and UpdateIncludeState(fullpath, include_dict, io):
+    if (same_module and _cpplint_state.filesystem_lookups and
+        UpdateIncludeState(fullpath, include_dict, io)):
       header_found = True
 
   # If we can't find the header file for a .cc, assume it's because we don't
@@ -5618,6 +6521,9 @@ def CheckMakePairUsesDeduction(filename, clean_lines, linenum, error):
           ' OR use pair directly OR if appropriate, construct a pair directly')
 
 
+_RE_VIRTUAL = _LazyRegex(r'^(.*)(\bvirtual\b)(.*)$')
+
+
 def CheckRedundantVirtual(filename, clean_lines, linenum, error):
   """Check if line contains a redundant "virtual" function-specifier.
 
@@ -5629,7 +6535,7 @@ def CheckRedundantVirtual(filename, clean_lines, linenum, error):
   """
   # Look for "virtual" on current line.
   line = clean_lines.elided[linenum]
-  virtual = Match(r'^(.*)(\bvirtual\b)(.*)$', line)
+  virtual = _RE_VIRTUAL.match(line)
   if not virtual: return
 
   # Ignore "virtual" keywords that are near access-specifiers.  These
@@ -5682,6 +6588,10 @@ def CheckRedundantVirtual(filename, clean_lines, linenum, error):
       break
 
 
+_RE_OVERRIDE = _LazyRegex(r'\boverride\b')
+_RE_FINAL = _LazyRegex(r'\bfinal\b')
+
+
 def CheckRedundantOverrideOrFinal(filename, clean_lines, linenum, error):
   """Check if line contains a redundant "override" or "final" virt-specifier.
 
@@ -5705,7 +6615,7 @@ def CheckRedundantOverrideOrFinal(filename, clean_lines, linenum, error):
       return
 
   # Check that at most one of "override" or "final" is present, not both
-  if Search(r'\boverride\b', fragment) and Search(r'\bfinal\b', fragment):
+  if _RE_OVERRIDE.search(fragment) and _RE_FINAL.search(fragment):
     error(filename, linenum, 'readability/inheritance', 4,
           ('"override" is redundant since function is '
            'already declared as "final"'))
@@ -5821,6 +6731,38 @@ def ProcessLine(filename, file_extension, clean_lines, line,
   for check_fn in extra_check_functions:
     check_fn(filename, clean_lines, line, error)
 
+
+def TrackLine(filename, clean_lines, line, include_state, function_state,
+              nesting_state, error):
+  """Processes a line that is not checked, for the lines after it.
+
+  Only does what ProcessLine does that the checks of other lines depend on:
+  parsing NOLINT comments, and following the nesting, the function lengths
+  and the includes.
+
+  Args:
+    filename: Filename of the file that is being processed.
+    clean_lines: A CleansedLines instance containing the file.
+    line: Number of line being processed.
+    include_state: An _IncludeState instance in which the headers are inserted.
+    function_state: A _FunctionState instance which counts function lines, etc.
+    nesting_state: A NestingState instance which maintains information about
+                   the current stack of nested blocks being parsed.
+    error: A callable to which errors are reported, which takes 4 arguments:
+           filename, line number, error level, and message
+  """
+  ParseNolintSuppressions(filename, clean_lines.raw_lines[line], line, error)
+  nesting_state.Update(filename, clean_lines, line, error)
+  if nesting_state.InAsmBlock(): return
+  CheckForFunctionLengths(filename, clean_lines, line, function_state, error)
+  if clean_lines.elided[line]:
+    UpdateIncludeSection(filename, clean_lines, line, include_state, error)
+
+_RE_INCLUDED_HEADER = _LazyRegex(r'\s*#\s*include\s+[<"]([^<"]+)[">]')
+_RE_PREPROCESSOR_DIRECTIVE = _LazyRegex(r'\s*#')
+_RE_DEFINE_DIRECTIVE = _LazyRegex(r'\s*#\s*define\b')
+
+
 def FlagCxx11Features(filename, clean_lines, linenum, error):
   """Flag those c++11 features that we only allow in certain places.
 
@@ -5832,7 +6774,7 @@ def FlagCxx11Features(filename, clean_lines, linenum, error):
   """
   line = clean_lines.elided[linenum]
 
-  include = Match(r'\s*#\s*include\s+[<"]([^<"]+)[">]', line)
+  include = _RE_INCLUDED_HEADER.match(line)
 
   # Flag unapproved C++ TR1 headers.
   if include and include.group(1).startswith('tr1/'):
@@ -5856,7 +6798,9 @@ def FlagCxx11Features(filename, clean_lines, linenum, error):
 
   # The only place where we need to worry about C++11 keywords and library
   # features in preprocessor directives is in macro definitions.
-  if Match(r'\s*#', line) and not Match(r'\s*#\s*define\b', line): return
+  if (_RE_PREPROCESSOR_DIRECTIVE.match(line) and
+      not _RE_DEFINE_DIRECTIVE.match(line)):
+    return
 
   # These are classes and free functions.  The classes are always
   # mentioned as std::*, but we only catch the free functions if
@@ -5892,8 +6836,84 @@ def FlagCxx14Features(filename, clean_lines, linenum, error):
           ('<%s> is an unapproved C++14 header.') % include.group(1))
 
 
+# ProcessFileData adds these lines around the lines of the file.
+_FIRST_MARKER_LINE = '// marker so line numbers and indices both start at 1'
+_LAST_MARKER_LINE = '// marker so line numbers end in a known way'
+
+
+def CheckLongLine(filename, linenum, line, error):
+  """Checks a line that is too long for the full set of checks.
+
+  Minified or generated code can put hundreds of kilobytes on one line, and
+  some regexps of the other checks backtrack in time quadratic in the length
+  of a line.  Such a line only gets the NOLINT, tab, trailing whitespace and
+  line length checks, which take linear time, and an error says so.
+
+  Args:
+    filename: The name of the current file.
+    linenum: The number of the line to check.
+    line: The raw line, longer than _long_line_threshold.
+    error: The function to call with any errors found.
+
+  Returns:
+    The short line that the other checks get instead: "/*" if line starts
+    a multi-line comment, "/**/" if it ends one, and an empty line otherwise.
+  """
+  ParseNolintSuppressions(filename, line, linenum, error)
+  error(filename, linenum, 'readability/long_line', 5,
+        'Line has %d characters, more than --long_line_threshold=%d; only '
+        'its NOLINT, tab, whitespace and length were checked' %
+        (len(line), _long_line_threshold))
+  _CheckRawLine(filename, linenum, line, error)
+
+  if _IsMultiLineCommentStart(line):
+    return '/*'
+  if line.strip().endswith('*/'):
+    return '/**/'
+  return ''
+
+
+def _CheckRawLine(filename, linenum, line, error):
+  """Checks a raw line for tabs, trailing whitespace and its length.
+
+  These checks take time linear in the length of the line, and need nothing
+  but the line, so CheckLongLine and ProcessGeneratedFileData use them.
+  Unlike CheckStyle, only #include lines may be longer than --linelength.
+
+  Args:
+    filename: The name of the current file.
+    linenum: The number of the line to check.
+    line: The raw line.
+    error: The function to call with any errors found.
+  """
+  if line.find('\t') != -1:
+    error(filename, linenum, 'whitespace/tab', 1,
+          'Tab found; better to use spaces')
+  if line and line[-1].isspace():
+    error(filename, linenum, 'whitespace/end_of_line', 4,
+          'Line ends in whitespace.  Consider deleting these extra spaces.')
+  if not line.startswith('#include') and GetLineWidth(line) > _line_length:
+    error(filename, linenum, 'whitespace/line_length', 2,
+          'Lines should be <= %i characters long' % _line_length)
+
+
+def _ShortenLongLines(filename, lines, error):
+  """Yields lines, with CheckLongLine's stand-in for each one too long.
+
+  Args:
+    filename: The name of the current file.
+    lines: An iterable of the lines of the file, without marker lines.
+    error: The function to call with any errors found.
+  """
+  for (linenum, line) in enumerate(lines, 1):
+    if _long_line_threshold and len(line) > _long_line_threshold:
+      line = CheckLongLine(filename, linenum, line, error)
+    yield line
+
+
 def ProcessFileData(filename, file_extension, lines, error,
-                    extra_check_functions=[]):
+                    extra_check_functions=[], check_bad_characters=True,
+                    lines_to_check=None):
   """Performs lint checks and reports any errors to the given error function.
 
   Args:
@@ -5901,14 +6921,30 @@ def ProcessFileData(filename, file_extension, lines, error,
     file_extension: The extension (dot not included) of the file.
     lines: An array of strings, each representing a line of the file, with the
            last element being empty if the file is terminated with a newline.
+           May also be a _LazyLines or a _SourceLineStream, as ReadSourceFile
+           returns for very large files.
     error: A callable to which errors are reported, which takes 4 arguments:
            filename, line number, error level, and message
     extra_check_functions: An array of additional check functions that will be
                            run on each source line. Each function takes 4
                            arguments: filename, clean_lines, line, error
+    check_bad_characters: False if the caller already knows that the lines
+                          contain no U+FFFD or NUL characters, as
+                          ReadSourceFile does, so CheckForBadCharacters can be
+                          skipped.
+    lines_to_check: When a set, only the lines with these numbers get the
+                    per-line checks, and the others only go through
+                    TrackLine.  The checks of the whole file are kept.
   """
-  lines = (['// marker so line numbers and indices both start at 1'] + lines +
-           ['// marker so line numbers end in a known way'])
+  if isinstance(lines, _SourceLineStream):
+    ProcessFileStream(filename, file_extension, lines, error,
+                      extra_check_functions, check_bad_characters)
+    return
+
+  if isinstance(lines, _LazyLines):
+    lines = lines.Surround(_FIRST_MARKER_LINE, _LAST_MARKER_LINE)
+  else:
+    lines = [_FIRST_MARKER_LINE] + lines + [_LAST_MARKER_LINE]
 
   include_state = _IncludeState()
   function_state = _FunctionState()
@@ -5916,6 +6952,16 @@ def ProcessFileData(filename, file_extension, lines, error,
 
   ResetNolintSuppressions()
 
+  # Lines that are too long are replaced by short stand-ins, and put back
+  # for the checks of raw lines at the end.
+  long_lines = {}
+  if _long_line_threshold:
+    for linenum in xrange(1, len(lines) - 1):
+      line = lines[linenum]
+      if len(line) > _long_line_threshold:
+        long_lines[linenum] = line
+        lines[linenum] = CheckLongLine(filename, linenum, line, error)
+
   CheckForCopyright(filename, lines, error)
   ProcessGlobalSuppresions(lines)
   RemoveMultiLineComments(filename, lines, error)
@@ -5925,6 +6971,10 @@ def ProcessFileData(filename, file_extension, lines, error,
     CheckForHeaderGuard(filename, clean_lines, error)
 
   for line in xrange(clean_lines.NumLines()):
+    if lines_to_check is not None and line not in lines_to_check:
+      TrackLine(filename, clean_lines, line, include_state, function_state,
+                nesting_state, error)
+      continue
     ProcessLine(filename, file_extension, clean_lines, line,
                 include_state, function_state, nesting_state, error,
                 extra_check_functions)
@@ -5937,230 +6987,2500 @@ def ProcessFileData(filename, file_extension, lines, error,
   if _IsSourceExtension(file_extension):
     CheckHeaderFileIncluded(filename, include_state, error)
 
+  for (linenum, line) in long_lines.items():
+    lines[linenum] = line
+
   # We check here rather than inside ProcessLine so that we see raw
   # lines rather than "cleaned" lines.
-  CheckForBadCharacters(filename, lines, error)
+  if check_bad_characters:
+    CheckForBadCharacters(filename, lines, error)
 
   CheckForNewlineAtEOF(filename, lines, error)
 
-def ProcessConfigOverrides(filename):
-  """ Loads the configuration files and processes the config overrides.
 
-  Args:
-    filename: The name of the file being processed by the linter.
+def ProcessFileStream(filename, file_extension, lines, error,
+                      extra_check_functions=[], check_bad_characters=True):
+  """Lints a file like ProcessFileData, but without holding it in memory.
 
-  Returns:
-    False if the current |filename| should not be processed further.
+  The file is read twice.  The first pass finds what needs the whole file:
+  the copyright line, global suppressions and unterminated multi-line
+  comments.  The second pass runs the per-line checks over a
+  _StreamingCleansedLines, so only the lines near the one being checked and
+  the NestingState are kept.  This degrades some checks:
+
+  - Lines more than _STREAM_CONTEXT_LINES away from the line being checked
+    read as empty.  Checks that match brackets or look for the previous or
+    next statement across lines (through CloseExpression,
+    ReverseCloseExpression or GetPreviousNonBlankLine, e.g. CheckBraces,
+    CheckTrailingSemicolon, CheckEmptyBlockBody, CheckSpacing and
+    CheckCStyleCast) may miss or misreport constructs that span more lines.
+  - The header guard check is skipped, since it needs the start and the end
+    of the file at once.
+
+  Args:
+    filename: Filename of the file that is being processed.
+    file_extension: The extension (dot not included) of the file.
+    lines: A _SourceLineStream.
+    error: A callable to which errors are reported, which takes 4 arguments:
+           filename, line number, error level, and message
+    extra_check_functions: An array of additional check functions that will be
+                           run on each source line. Each function takes 4
+                           arguments: filename, clean_lines, line, error
+    check_bad_characters: False if the caller already knows that the lines
+                          contain no U+FFFD or NUL characters, in which case
+                          the file is not read a third time to find them.
   """
+  num_lines = len(lines) + 2
 
-  abs_filename = os.path.abspath(filename)
-  cfg_filters = []
-  keep_looking = True
-  while keep_looking:
-    abs_path, base_name = os.path.split(abs_filename)
-    if not base_name:
-      break  # Reached the root directory.
+  include_state = _IncludeState()
+  function_state = _FunctionState()
+  nesting_state = NestingState()
 
-    cfg_file = os.path.join(abs_path, "CPPLINT.cfg")
-    abs_filename = abs_path
-    if not os.path.isfile(cfg_file):
-      continue
+  ResetNolintSuppressions()
 
-    try:
-      with open(cfg_file) as file_handle:
-        for line in file_handle:
-          line, _, _ = line.partition('#')  # Remove comments.
-          if not line.strip():
-            continue
-
-          name, _, val = line.partition('=')
-          name = name.strip()
-          val = val.strip()
-          if name == 'set noparent':
-            keep_looking = False
-          elif name == 'filter':
-            cfg_filters.append(val)
-          elif name == 'exclude_files':
-            # When matching exclude_files pattern, use the base_name of
-            # the current file name or the directory name we are processing.
-            # For example, if we are checking for lint errors in /foo/bar/baz.cc
-            # and we found the .cfg file at /foo/CPPLINT.cfg, then the config
-            # file's "exclude_files" filter is meant to be checked against "bar"
-            # and not "baz" nor "bar/baz.cc".
-            if base_name:
-              pattern = re.compile(val)
-              if pattern.match(base_name):
-                if _cpplint_state.quiet:
-                  # Suppress "Ignoring file" warning when using --quiet.
-                  return False
-                sys.stderr.write('Ignoring "%s": file excluded by "%s". '
-                                 'File path component "%s" matches '
-                                 'pattern "%s"\n' %
-                                 (filename, cfg_file, base_name, val))
-                return False
-          elif name == 'linelength':
-            global _line_length
-            try:
-                _line_length = int(val)
-            except ValueError:
-                sys.stderr.write('Line length must be numeric.')
-          elif name == 'root':
-            global _root
-            # root directories are specified relative to CPPLINT.cfg dir.
-            _root = os.path.join(os.path.dirname(cfg_file), val)
-          elif name == 'headers':
-            ProcessHppHeadersOption(val)
-          else:
-            sys.stderr.write(
-                'Invalid configuration option (%s) in file %s\n' %
-                (name, cfg_file))
+  first_lines = [_FIRST_MARKER_LINE]
+  comment_start = None
+  for linenum, line in enumerate(lines, 1):
+    if linenum <= 10:
+      first_lines.append(line)
+    ProcessGlobalSuppresions([line])
+    if comment_start is None and _IsMultiLineCommentStart(line):
+      comment_start = linenum
+    if comment_start is not None and line.strip().endswith('*/'):
+      comment_start = None
+
+  CheckForCopyright(filename, first_lines, error)
+  if comment_start is not None:
+    error(filename, comment_start + 1, 'readability/multiline_comment', 5,
+          'Could not find end of multi-line comment')
+
+  clean_lines = _StreamingCleansedLines(
+      itertools.chain([_FIRST_MARKER_LINE],
+                      _ShortenLongLines(filename, lines, error),
+                      [_LAST_MARKER_LINE]),
+      num_lines, comment_start)
+  required = {}
+  for line in xrange(num_lines):
+    clean_lines.Seek(line)
+    ProcessLine(filename, file_extension, clean_lines, line,
+                include_state, function_state, nesting_state, error,
+                extra_check_functions)
+    FlagCxx11Features(filename, clean_lines, line, error)
+    UpdateRequiredHeaders(clean_lines.elided[line], line, required)
+  nesting_state.CheckCompletedBlocks(filename, error)
 
-    except IOError:
-      sys.stderr.write(
-          "Skipping config file '%s': Can't open for reading\n" % cfg_file)
-      keep_looking = False
+  CheckForIncludeWhatYouUse(filename, clean_lines, include_state, error,
+                            required=required)
 
-  # Apply all the accumulated filters in reverse order (top-level directory
-  # config options having the least priority).
-  for filter in reversed(cfg_filters):
-     _AddFilters(filter)
+  # Check that the .cc file has included its header if it exists.
+  if _IsSourceExtension(file_extension):
+    CheckHeaderFileIncluded(filename, include_state, error)
 
-  return True
+  if check_bad_characters:
+    CheckForBadCharacters(
+        filename,
+        itertools.chain([_FIRST_MARKER_LINE], lines, [_LAST_MARKER_LINE]),
+        error)
 
+  CheckForNewlineAtEOF(filename, clean_lines.raw_lines, error)
 
-def ProcessFile(filename, vlevel, extra_check_functions=[]):
-  """Does google-lint on a single file.
+# IncrementalLinter saves the state of the per-line checks every this many
+# lines, so that it can resume checking shortly before an edit.
+_CHECKPOINT_INTERVAL = 50
 
-  Args:
-    filename: The name of the file to parse.
+# The attributes of the blocks on a NestingState that hold line numbers.
+_LINE_NUMBER_ATTRIBUTES = ('starting_linenum', 'last_line')
 
-    vlevel: The level of errors to report.  Every error of confidence
-    >= verbose_level will be reported.  0 is a good default.
 
-    extra_check_functions: An array of additional check functions that will be
-                           run on each source line. Each function takes 4
-                           arguments: filename, clean_lines, line, error
+def _RecordErrors(errors):
+  """Returns an error function that appends the errors to a list.
+
+  Whether a NOLINT comment suppresses an error is decided when the error is
+  reported, as Error() does, and saved with it.
   """
+  def RecordError(filename, linenum, category, confidence, message):
+    errors.append((filename, linenum, category, confidence, message,
+                   IsErrorSuppressedByNolint(category, linenum)))
+  return RecordError
 
-  _SetVerboseLevel(vlevel)
-  _BackupFilters()
-  old_errors = _cpplint_state.error_count
 
-  if not ProcessConfigOverrides(filename):
-    _RestoreFilters()
-    return
+def _CheckStateKey(value, map_line):
+  """Returns a comparable copy of the state of the per-line checks.
 
-  lf_lines = []
-  crlf_lines = []
-  try:
-    # Support the UNIX convention of using "-" for stdin.  Note that
-    # we are not opening the file with universal newline support
-    # (which codecs doesn't support anyway), so the resulting lines do
-    # contain trailing '\r' characters if we are reading a file that
-    # has CRLF endings.
-    # If after the split a trailing '\r' is present, it is removed
-    # below.
-    if filename == '-':
-      lines = codecs.StreamReaderWriter(sys.stdin,
-                                        codecs.getreader('utf8'),
-                                        codecs.getwriter('utf8'),
-                                        'replace').read().split('\n')
-    else:
-      lines = codecs.open(filename, 'r', 'utf8', 'replace').read().split('\n')
-
-    # Remove trailing '\r'.
-    # The -1 accounts for the extra trailing blank line we get from split()
-    for linenum in range(len(lines) - 1):
-      if lines[linenum].endswith('\r'):
-        lines[linenum] = lines[linenum].rstrip('\r')
-        crlf_lines.append(linenum + 1)
-      else:
-        lf_lines.append(linenum + 1)
+  Args:
+    value: A NestingState, _IncludeState or _FunctionState, or a tuple or
+           list of them or of their parts.
+    map_line: The function to pass each line number in value through.
 
-  except IOError:
-    sys.stderr.write(
-        "Skipping input '%s': Can't open for reading\n" % filename)
-    _RestoreFilters()
+  Returns:
+    Nested tuples of the values in value.
+  """
+  if isinstance(value, _IncludeState):
+    return ('_IncludeState', value._section, value._last_header,
+            tuple(tuple((header, map_line(linenum))
+                        for (header, linenum) in section)
+                  for section in value.include_list),
+            tuple(sorted((header, map_line(linenum))
+                         for (header, linenum) in value._header_lines.items())))
+  if isinstance(value, (list, tuple)):
+    return tuple(_CheckStateKey(item, map_line) for item in value)
+  if hasattr(value, '__dict__'):
+    return (value.__class__.__name__,) + tuple(
+        (name, map_line(item) if name in _LINE_NUMBER_ATTRIBUTES
+         else _CheckStateKey(item, map_line))
+        for (name, item) in sorted(vars(value).items()))
+  return value
+
+
+# The message of the per-line checks that holds a line number.
+_RE_ALREADY_INCLUDED_MESSAGE = _LazyRegex(
+    r'^(".*" already included at .*:)(\d+)$')
+
+
+def _RemapMessageLine(message, map_line):
+  """Passes the line number in an error message through map_line."""
+  match = _RE_ALREADY_INCLUDED_MESSAGE.match(message)
+  if not match:
+    return message
+  return match.group(1) + str(map_line(int(match.group(2))))
+
+
+def _RemapCheckStateLines(value, map_line, seen):
+  """Passes the line numbers in the state of the per-line checks through
+  map_line, in place.
+
+  Args:
+    value: As for _CheckStateKey.
+    map_line: The function to pass each line number in value through.
+    seen: The ids of the objects already remapped, since a block can be both
+          on the stack and the previous_stack_top of a NestingState.
+  """
+  if id(value) in seen:
     return
+  seen.add(id(value))
+  if isinstance(value, _IncludeState):
+    value.include_list = [[(header, map_line(linenum))
+                           for (header, linenum) in section]
+                          for section in value.include_list]
+    value._header_lines = dict(
+        (header, map_line(linenum))
+        for (header, linenum) in value._header_lines.items())
+  elif isinstance(value, (list, tuple)):
+    for item in value:
+      _RemapCheckStateLines(item, map_line, seen)
+  elif hasattr(value, '__dict__'):
+    for (name, item) in vars(value).items():
+      if name in _LINE_NUMBER_ATTRIBUTES:
+        setattr(value, name, map_line(item))
+      else:
+        _RemapCheckStateLines(item, map_line, seen)
 
-  # Note, if no dot is found, this will give the entire filename as the ext.
-  file_extension = filename[filename.rfind('.') + 1:]
 
-  # When reading from stdin, the extension is unknown, so no cpplint tests
-  # should rely on the extension.
-  if filename != '-' and file_extension not in _valid_extensions:
-    sys.stderr.write('Ignoring %s; not a valid file name '
-                     '(%s)\n' % (filename, ', '.join(_valid_extensions)))
-  else:
-    ProcessFileData(filename, file_extension, lines, Error,
-                    extra_check_functions)
+class _ReadSpanLines(list):
+  """A list of lines that widens a span to take in the indexes read from it.
 
-    # If end-of-line sequences are a mix of LF and CR-LF, issue
-    # warnings on the lines with CR.
-    #
-    # Don't issue any warnings if all lines are uniformly LF or CR-LF,
-    # since critique can handle these just fine, and the style guide
-    # doesn't dictate a particular end of line sequence.
-    #
-    # We can't depend on os.linesep to determine what the desired
-    # end-of-line sequence should be, since that will return the
-    # server-side end-of-line sequence.
-    if lf_lines and crlf_lines:
-      # Warn on every line with CR.  An alternative approach might be to
-      # check whether the file is mostly CRLF or just LF, and warn on the
-      # minority, we bias toward LF here since most tools prefer LF.
-      for linenum in crlf_lines:
-        Error(filename, linenum, 'whitespace/newline', 1,
-              'Unexpected \\r (^M) found; better to use only \\n')
+  IncrementalLinter runs the per-line checks on these, to learn which lines
+  the checks of each line depend on.  span is a list [first, last] that is
+  shared by the arrays of a CleansedLines.
+  """
 
-  # Suppress printing anything if --quiet was passed unless the error
-  # count has increased after processing this file.
-  if not _cpplint_state.quiet or old_errors != _cpplint_state.error_count:
-    sys.stdout.write('Done processing %s\n' % filename)
-  _RestoreFilters()
+  def __init__(self, lines, span):
+    list.__init__(self, lines)
+    self.span = span
+
+  def _Read(self, first, last):
+    span = self.span
+    if first < span[0]:
+      span[0] = first
+    if last > span[1]:
+      span[1] = last
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      (first, stop, _) = index.indices(len(self))
+      if first < stop:
+        self._Read(first, stop - 1)
+    else:
+      if index < 0:
+        index += len(self)
+      span = self.span
+      if index < span[0]:
+        span[0] = index
+      elif index > span[1]:
+        span[1] = index
+    return list.__getitem__(self, index)
+
+  def __getslice__(self, first, stop):  # Python 2
+    return self.__getitem__(slice(first, stop))
+
+  def __iter__(self):
+    if self:
+      self._Read(0, len(self) - 1)
+    return list.__iter__(self)
+
+
+def _CommonPrefixLength(pairs):
+  """Returns the length of the longest common prefix of each pair of lists."""
+  low = 0
+  high = min(min(len(old), len(new)) for (old, new) in pairs)
+  # Slices are compared in C, so a binary search beats a loop in Python.
+  while low < high:
+    middle = (low + high + 1) // 2
+    if all(old[:middle] == new[:middle] for (old, new) in pairs):
+      low = middle
+    else:
+      high = middle - 1
+  return low
+
+
+def _CommonSuffixLength(pairs, limit):
+  """Returns the length, at most limit, of the longest common suffix of each
+  pair of lists."""
+  low = 0
+  high = limit
+  while low < high:
+    middle = (low + high + 1) // 2
+    if all(old[len(old) - middle:] == new[len(new) - middle:]
+           for (old, new) in pairs):
+      low = middle
+    else:
+      high = middle - 1
+  return low
 
 
-def PrintUsage(message):
-  """Prints a brief usage string and exits, optionally with an error message.
+class _KeyOrderDict(dict):
+  """A dict that remembers the order in which its keys were first set."""
 
-  Args:
-    message: The optional error message.
+  def __init__(self):
+    dict.__init__(self)
+    self.key_order = []
+
+  def __setitem__(self, key, value):
+    if key not in self:
+      self.key_order.append(key)
+    dict.__setitem__(self, key, value)
+
+
+class _MemoizedCleansedLines(CleansedLines):
+  """A CleansedLines that reuses the cleansing of lines seen before.
+
+  The line without comments and the elided line only depend on the line
+  without raw strings, so they are looked up in memo by it.  The memo
+  attribute holds the lines of this file only, for the next version.
   """
-  sys.stderr.write(_USAGE)
-  if message:
-    sys.exit('\nFATAL ERROR: ' + message)
-  else:
-    sys.exit(1)
 
+  def __init__(self, lines, memo, has_raw_strings=True):
+    """Cleanses the lines.
 
-def PrintCategories():
-  """Prints a list of all the error-categories used by error messages.
+    Args:
+      lines: The raw lines.
+      memo: The memo attribute of the CleansedLines of the last version.
+      has_raw_strings: False if no line can start a raw string, so that
+                       CleanseRawStrings would return the lines unchanged.
+    """
+    # pylint: disable=super-init-not-called
+    self.raw_lines = lines
+    self.num_lines = len(lines)
+    if has_raw_strings:
+      self.lines_without_raw_strings = CleanseRawStrings(lines)
+    else:
+      self.lines_without_raw_strings = list(lines)
+    cleansed = list(map(memo.get, self.lines_without_raw_strings))
+    for (linenum, pair) in enumerate(cleansed):
+      if pair is None:
+        cleansed[linenum] = (self._CleanseCommentsAt(linenum),
+                             self._ElideAt(linenum))
+    self.lines = [pair[0] for pair in cleansed]
+    self.elided = [pair[1] for pair in cleansed]
+    self.memo = dict(zip(self.lines_without_raw_strings, cleansed))
+
+
+class _LintedVersion(object):
+  """What IncrementalLinter kept of the last version of a file it linted."""
+
+  def __init__(self, settings, arrays, line_errors, line_spans, checkpoints,
+               final_state):
+    # The module settings that the per-line checks depend on.
+    self.settings = settings
+    # The raw, raw-string-free, comment-free and elided lines that the
+    # per-line checks saw.
+    self.arrays = arrays
+    # The errors reported while checking each line.
+    self.line_errors = line_errors
+    # The first and last index of the lines read while checking each line.
+    self.line_spans = line_spans
+    # The state of the per-line checks before some lines, by line number.
+    self.checkpoints = checkpoints
+    self.checkpoint_lines = sorted(checkpoints)
+    # The state of the per-line checks after the last line.
+    self.final_state = final_state
+
+
+class LintCancelled(Exception):
+  """Indicates that IncrementalLinter.Update() was cancelled."""
+  pass
 
-  These are the categories used to filter messages via --filter.
+
+class IncrementalLinter(object):
+  """Lints successive versions of a file, checking again only what changed.
+
+  Update() lints a version of the file like ProcessFileData does, reporting
+  the same errors in the same order.  While checking the lines one by one it
+  saves the state of the per-line checks, that is the NestingState,
+  _IncludeState and _FunctionState, every _CHECKPOINT_INTERVAL lines, and
+  the span of lines that the checks of each line read.  The next Update()
+  finds the lines that changed and resumes from the last checkpoint before
+  them that no line before it read past, and whose line numbers, such as
+  the end of a class, do not point into the edit.  Once past the edit, at a
+  checkpoint where the state matches the one saved at the same place in the
+  previous version, line numbers shifted, it takes the errors of the lines
+  from the previous version up to the next line that read back into the
+  edit, and resumes from the checkpoint before that line.  NOLINT
+  suppressions are parsed again from the lines that are not checked again.
+
+  The checks of whole files, such as the copyright, header guard and
+  include-what-you-use checks, run on every version, but the cleansing of
+  lines and the search for the headers that each line needs are reused for
+  unchanged lines.  A change to the flags that the per-line checks depend
+  on makes the next Update() check all lines again.
   """
-  sys.stderr.write(''.join('  %s\n' % cat for cat in _ERROR_CATEGORIES))
-  sys.exit(0)
 
+  def __init__(self, filename, file_extension, extra_check_functions=[],
+               checkpoint_interval=_CHECKPOINT_INTERVAL):
+    """Starts linting a file.
 
-def ParseArguments(args):
-  """Parses the command line arguments.
+    Args:
+      filename: Filename of the file that is being processed.
+      file_extension: The extension (dot not included) of the file.
+      extra_check_functions: As for ProcessFileData.
+      checkpoint_interval: How many lines apart the checkpoints are.
+    """
+    self.filename = filename
+    self.file_extension = file_extension
+    self.extra_check_functions = extra_check_functions
+    self.checkpoint_interval = checkpoint_interval
+    # The number of lines that the last Update() ran the per-line checks on.
+    self.lines_checked = 0
+    self._version = None
+    self._cleansed_memo = {}
+    self._required_memo = {}
+
+  def Update(self, lines, error, cancelled=None):
+    """Lints a version of the file.
 
-  This may set the output format and verbosity level as side-effects.
+    Args:
+      lines: The lines of the file, as a list of strings, with the last
+             element being empty if the file is terminated with a newline.
+      error: A callable to which errors are reported, which takes 4
+             arguments: filename, line number, error level, and message
+      cancelled: A function without arguments that returns True once the
+                 errors are no longer wanted, which is asked at each
+                 checkpoint.
+
+    Raises:
+      LintCancelled: cancelled returned True.  No error was reported, and
+                     the next Update() is compared with the last version
+                     that was not cancelled.
+    """
+    filename = self.filename
+    lines = [_FIRST_MARKER_LINE] + list(lines) + [_LAST_MARKER_LINE]
+    errors_before = []
+    errors_after = []
+
+    ResetNolintSuppressions()
+    record = _RecordErrors(errors_before)
+    long_lines = {}
+    if _long_line_threshold:
+      for linenum in xrange(1, len(lines) - 1):
+        line = lines[linenum]
+        if len(line) > _long_line_threshold:
+          long_lines[linenum] = line
+          lines[linenum] = CheckLongLine(filename, linenum, line, record)
+
+    # The passes over the whole file are skipped when the file has none of
+    # the text they look for.
+    text = '\n'.join(lines)
+    CheckForCopyright(filename, lines, record)
+    if ('LINT_C_FILE' in text or 'LINT_KERNEL_FILE' in text or
+        'filetype=c' in text):
+      ProcessGlobalSuppresions(lines)
+    if '/*' in text:
+      RemoveMultiLineComments(filename, lines, record)
+    clean_lines = _MemoizedCleansedLines(lines, self._cleansed_memo,
+                                         'R"' in text)
+    self._cleansed_memo = clean_lines.memo
+
+    if IsHeaderExtension(self.file_extension):
+      CheckForHeaderGuard(filename, clean_lines, record)
+
+    (line_errors, line_spans, checkpoints, final_state, arrays, settings) = (
+        self._CheckLines(clean_lines, cancelled))
+    (nesting_state, include_state, function_state) = copy.deepcopy(
+        final_state)
+
+    record = _RecordErrors(errors_after)
+    nesting_state.CheckCompletedBlocks(filename, record)
+    CheckForIncludeWhatYouUse(filename, clean_lines, include_state, record,
+                              required=self._RequiredHeaders(clean_lines))
+    if _IsSourceExtension(self.file_extension):
+      CheckHeaderFileIncluded(filename, include_state, record)
+
+    for (linenum, line) in long_lines.items():
+      lines[linenum] = line
+    CheckForBadCharacters(filename, lines, record)
+    CheckForNewlineAtEOF(filename, lines, record)
+
+    self._version = _LintedVersion(settings, arrays, line_errors, line_spans,
+                                   checkpoints, final_state)
+
+    # The errors were recorded with whether NOLINT suppressed them then, so
+    # they are reported with no suppressions in place.
+    suppressions = (dict(_error_suppressions),
+                    dict(_global_error_suppressions))
+    ResetNolintSuppressions()
+    try:
+      for errors in itertools.chain([errors_before], line_errors,
+                                    [errors_after]):
+        for (filename, linenum, category, confidence, message,
+             suppressed) in errors:
+          if not suppressed:
+            error(filename, linenum, category, confidence, message)
+    finally:
+      _error_suppressions.update(suppressions[0])
+      _global_error_suppressions.update(suppressions[1])
+
+  def _CheckLines(self, clean_lines, cancelled):
+    """Runs the per-line checks where the lines changed.
+
+    Args:
+      clean_lines: The CleansedLines of the new version.
+      cancelled: As for Update().
+
+    Returns:
+      The line_errors, line_spans, checkpoints and final_state of the new
+      version, the arrays of lines it was compared by and the settings it was
+      checked with.
+    """
+    filename = self.filename
+    num_lines = clean_lines.NumLines()
+    arrays = (list(clean_lines.raw_lines),
+              clean_lines.lines_without_raw_strings, clean_lines.lines,
+              clean_lines.elided)
+    settings = (_VerboseLevel(), _line_length, _long_line_threshold,
+                sorted(_hpp_headers), _root,
+                sorted(_global_error_suppressions))
+    previous = self._version
+    if previous and previous.settings != settings:
+      previous = None
+
+    start = 0
+    line_errors = []
+    line_spans = []
+    checkpoints = {}
+    state = (NestingState(), _IncludeState(), _FunctionState())
+    if previous:
+      pairs = list(zip(previous.arrays, arrays))
+      edit_start = _CommonPrefixLength(pairs)
+      common_suffix = _CommonSuffixLength(
+          pairs, min(len(previous.arrays[0]), num_lines) - edit_start)
+      old_num_lines = len(previous.arrays[0])
+      old_edit_end = old_num_lines - common_suffix
+      edit_end = num_lines - common_suffix
+      delta = edit_end - old_edit_end
+
+      def IsBeforeEdit(linenum):
+        if linenum >= edit_start:
+          raise ValueError
+        return linenum
+
+      # The lines from the first one that read into the edit on are checked
+      # again.
+      resume_before = edit_start
+      for (linenum, (_, last)) in enumerate(previous.line_spans[:edit_start]):
+        if last >= edit_start:
+          resume_before = linenum
+          break
+      for start in reversed(previous.checkpoint_lines):
+        if start <= resume_before:
+          try:
+            _CheckStateKey(previous.checkpoints[start], IsBeforeEdit)
+            break
+          except ValueError:
+            pass  # A block that started before ends after the edit.
+      else:
+        start = 0
+      line_errors = previous.line_errors[:start]
+      line_spans = previous.line_spans[:start]
+      checkpoints = dict((linenum, previous.checkpoints[linenum])
+                         for linenum in previous.checkpoint_lines
+                         if linenum < start)
+      state = copy.deepcopy(previous.checkpoints[start])
+
+      # The lines after the edit that read into it or before it.
+      read_back = [linenum for linenum in xrange(old_edit_end, old_num_lines)
+                   if previous.line_spans[linenum][0] < old_edit_end]
+
+      def MapToNew(linenum):
+        if linenum < edit_start:
+          return linenum
+        if linenum >= old_edit_end:
+          return linenum + delta
+        return None  # Inside the edit: matches no state of the new version.
+
+      def Shift(linenum):
+        if linenum >= old_edit_end:
+          return linenum + delta
+        return linenum
+
+    raw_lines = clean_lines.raw_lines
+    for linenum in xrange(start):
+      if 'NOLINT' in raw_lines[linenum]:
+        ParseNolintSuppressions(filename, raw_lines[linenum], linenum,
+                                lambda *args: None)
+
+    # The checks run on copies of the arrays that record the lines read.
+    span = [0, 0]
+    reading_lines = copy.copy(clean_lines)
+    for name in ('raw_lines', 'lines_without_raw_strings', 'lines', 'elided'):
+      setattr(reading_lines, name,
+              _ReadSpanLines(getattr(clean_lines, name), span))
+
+    self.lines_checked = 0
+    final_state = None
+    line = start
+    while line < num_lines:
+      if (previous and line >= edit_end and
+          line - delta in previous.checkpoints and
+          _CheckStateKey(previous.checkpoints[line - delta], MapToNew) ==
+          _CheckStateKey(state, lambda linenum: linenum)):
+        # The lines up to the next one that read back into the edit are
+        # checked as in the previous version.
+        old_line = line - delta
+        index = bisect.bisect_left(read_back, old_line)
+        old_resume = (read_back[index] if index < len(read_back)
+                      else old_num_lines)
+        index = bisect.bisect_right(previous.checkpoint_lines, old_resume)
+        if old_resume < old_num_lines:
+          old_resume = previous.checkpoint_lines[index - 1]
+        if old_resume > old_line:
+          if delta:
+            # The previous version is changed in place from here on.
+            self._version = None
+          for linenum in previous.checkpoint_lines[
+              bisect.bisect_left(previous.checkpoint_lines, old_line):index]:
+            checkpoint = previous.checkpoints[linenum]
+            if delta:
+              _RemapCheckStateLines(checkpoint, Shift, set())
+            checkpoints[linenum + delta] = checkpoint
+          for errors in previous.line_errors[old_line:old_resume]:
+            if errors and delta:
+              errors = [(error_filename, Shift(linenum), category, confidence,
+                         _RemapMessageLine(message, Shift), suppressed)
+                        for (error_filename, linenum, category, confidence,
+                             message, suppressed) in errors]
+            line_errors.append(errors)
+          if delta:
+            line_spans.extend(
+                (first + delta, last + delta)
+                for (first, last) in previous.line_spans[old_line:old_resume])
+          else:
+            line_spans.extend(previous.line_spans[old_line:old_resume])
+          for linenum in xrange(line, old_resume + delta):
+            if 'NOLINT' in raw_lines[linenum]:
+              ParseNolintSuppressions(filename, raw_lines[linenum], linenum,
+                                      lambda *args: None)
+          line = old_resume + delta
+          if old_resume == old_num_lines:
+            final_state = previous.final_state
+            if delta:
+              _RemapCheckStateLines(final_state, Shift, set())
+            break
+          state = copy.deepcopy(checkpoints[line])
+          continue
+
+      if line == start or line % self.checkpoint_interval == 0:
+        if cancelled and cancelled():
+          raise LintCancelled()
+        checkpoints[line] = copy.deepcopy(state)
+      (nesting_state, include_state, function_state) = state
+      errors = []
+      record = _RecordErrors(errors)
+      span[0] = span[1] = line
+      ProcessLine(filename, self.file_extension, reading_lines, line,
+                  include_state, function_state, nesting_state, record,
+                  self.extra_check_functions)
+      FlagCxx11Features(filename, reading_lines, line, record)
+      line_errors.append(errors)
+      line_spans.append(tuple(span))
+      self.lines_checked += 1
+      line += 1
+    else:
+      final_state = copy.deepcopy(state)
+
+    return (line_errors, line_spans, checkpoints, final_state, arrays,
+            settings)
+
+  def _RequiredHeaders(self, clean_lines):
+    """Returns the headers the lines need, as UpdateRequiredHeaders finds.
+
+    The headers each line needs are looked up by its elided text, and set
+    in the order UpdateRequiredHeaders sets them, so that the result
+    iterates in the same order.
+    """
+    memo = {}
+    required = {}
+    for (linenum, line) in enumerate(clean_lines.elided):
+      found = memo.get(line)
+      if found is None:
+        found = self._required_memo.get(line)
+        if found is None:
+          headers = _KeyOrderDict()
+          UpdateRequiredHeaders(line, linenum, headers)
+          found = tuple((header, headers[header][1])
+                        for header in headers.key_order)
+        memo[line] = found
+      for (header, template) in found:
+        required[header] = (linenum, template)
+    self._required_memo = memo
+    return required
+
+
+# The options of the CPPLINT.cfg files read so far, by path, as
+# ((mtime, size), options).  An entry is read again once the file changes, so
+# that a long-running process such as --daemon sees edits to the files.
+_config_file_cache = {}
+
+
+def _ReadConfigFile(cfg_file):
+  """Returns the options of a CPPLINT.cfg file, reading it if it changed.
 
   Args:
-    args: The command line arguments:
+    cfg_file: The path of the CPPLINT.cfg file.
 
   Returns:
-    The list of filenames to lint.
+    A list of (name, value) pairs, in the order of the file, without comments
+    and blank lines.
+
+  Raises:
+    IOError or OSError: The file could not be read.
   """
-  try:
-    (opts, filenames) = getopt.getopt(args, '', ['help', 'output=', 'verbose=',
-                                                 'counting=',
-                                                 'filter=',
-                                                 'root=',
+  file_stat = os.stat(cfg_file)
+  version = (file_stat.st_mtime, file_stat.st_size)
+  cached = _config_file_cache.get(cfg_file)
+  if cached and cached[0] == version:
+    return cached[1]
+
+  options = []
+  with open(cfg_file) as file_handle:
+    for line in file_handle:
+      line, _, _ = line.partition('#')  # Remove comments.
+      if not line.strip():
+        continue
+
+      name, _, val = line.partition('=')
+      options.append((name.strip(), val.strip()))
+  _config_file_cache[cfg_file] = (version, options)
+  if _cpplint_state.metrics:
+    _cpplint_state.metrics.config_files += 1
+  return options
+
+
+def _IsExcludedByConfig(filename, config_files):
+  """Checks the exclude_files options of the CPPLINT.cfg files of a file.
+
+  Like ProcessConfigOverrides, but without applying the other options.
+
+  Args:
+    filename: The name of the file.
+    config_files: A dict to keep the options of the CPPLINT.cfg file of each
+                  directory in, None where there is none, across calls.
+
+  Returns:
+    True if an exclude_files option matches the file.
+  """
+  abs_filename = os.path.abspath(filename)
+  keep_looking = True
+  while keep_looking:
+    abs_path, base_name = os.path.split(abs_filename)
+    if not base_name:
+      break  # Reached the root directory.
+    abs_filename = abs_path
+    if abs_path not in config_files:
+      cfg_file = os.path.join(abs_path, 'CPPLINT.cfg')
+      try:
+        config_files[abs_path] = (_ReadConfigFile(cfg_file)
+                                  if os.path.isfile(cfg_file) else None)
+      except (IOError, OSError):
+        config_files[abs_path] = []
+    if config_files[abs_path] is None:
+      continue
+    for name, val in config_files[abs_path]:
+      if name == 'set noparent':
+        keep_looking = False
+      elif name == 'exclude_files' and re.match(val, base_name):
+        return True
+  return False
+
+
+def ProcessConfigOverrides(filename, stderr=None):
+  """ Loads the configuration files and processes the config overrides.
+
+  Args:
+    filename: The name of the file being processed by the linter.
+    stderr: Where to write the problems found in the configuration files;
+            sys.stderr by default.
+
+  Returns:
+    False if the current |filename| should not be processed further.
+  """
+  if stderr is None:
+    stderr = sys.stderr
+
+  abs_filename = os.path.abspath(filename)
+  cfg_filters = []
+  cfg_generated_files = None
+  cfg_generated_file_markers = []
+  keep_looking = True
+  while keep_looking:
+    abs_path, base_name = os.path.split(abs_filename)
+    if not base_name:
+      break  # Reached the root directory.
+
+    cfg_file = os.path.join(abs_path, "CPPLINT.cfg")
+    abs_filename = abs_path
+    if not os.path.isfile(cfg_file):
+      continue
+
+    try:
+      options = _ReadConfigFile(cfg_file)
+    except (IOError, OSError):
+      stderr.write(
+          "Skipping config file '%s': Can't open for reading\n" % cfg_file)
+      break
+
+    for name, val in options:
+      if name == 'set noparent':
+        keep_looking = False
+      elif name == 'filter':
+        cfg_filters.append(val)
+      elif name == 'exclude_files':
+        # When matching exclude_files pattern, use the base_name of
+        # the current file name or the directory name we are processing.
+        # For example, if we are checking for lint errors in /foo/bar/baz.cc
+        # and we found the .cfg file at /foo/CPPLINT.cfg, then the config
+        # file's "exclude_files" filter is meant to be checked against "bar"
+        # and not "baz" nor "bar/baz.cc".
+        if base_name:
+          pattern = re.compile(val)
+          if pattern.match(base_name):
+            if _cpplint_state.quiet:
+              # Suppress "Ignoring file" warning when using --quiet.
+              return False
+            stderr.write('Ignoring "%s": file excluded by "%s". '
+                         'File path component "%s" matches '
+                         'pattern "%s"\n' %
+                         (filename, cfg_file, base_name, val))
+            return False
+      elif name == 'linelength':
+        global _line_length
+        try:
+            _line_length = int(val)
+        except ValueError:
+            stderr.write('Line length must be numeric.')
+      elif name == 'root':
+        global _root
+        # root directories are specified relative to CPPLINT.cfg dir.
+        _root = os.path.join(os.path.dirname(cfg_file), val)
+      elif name == 'headers':
+        ProcessHppHeadersOption(val)
+      elif name == 'generated_files':
+        # The configuration closest to the file wins.
+        if val not in _GENERATED_FILE_POLICIES:
+          stderr.write('generated_files must be one of %s.\n' %
+                       ', '.join(_GENERATED_FILE_POLICIES))
+        elif cfg_generated_files is None:
+          cfg_generated_files = val
+      elif name == 'generated_marker':
+        cfg_generated_file_markers.append(val)
+      else:
+        stderr.write(
+            'Invalid configuration option (%s) in file %s\n' %
+            (name, cfg_file))
+
+  # Apply all the accumulated filters in reverse order (top-level directory
+  # config options having the least priority).
+  for filter in reversed(cfg_filters):
+     _AddFilters(filter)
+
+  _cpplint_state.generated_files = cfg_generated_files or _generated_files
+  _cpplint_state.generated_file_markers = (list(_GENERATED_FILE_MARKERS) +
+                                           cfg_generated_file_markers)
+
+  return True
+
+
+# Matches the carriage returns in front of a line feed.  They are removed from
+# the raw bytes so that CR-LF files are checked like LF files.
+_RE_PATTERN_CR_BEFORE_LF = re.compile(b'\r+\n')
+
+
+# The array typecode used for line offsets.  Python 2 has no 'Q', but its
+# 'L' is 64 bits wide on the LP64 platforms where huge files are mapped.
+try:
+  array.array('Q')
+  _LINE_OFFSET_TYPECODE = 'Q'
+except ValueError:
+  _LINE_OFFSET_TYPECODE = 'L'
+
+# How many bytes of a mapped file are decoded at a time to validate it.
+_DECODE_CHUNK_SIZE = 1024 * 1024
+
+
+class _SourceFile(object):
+  """The decoded lines of a file, and what was learned while reading it.
+
+  Attributes:
+    lines: An array of unicode strings, each representing a line of the file
+           without its line terminator, with the last element being empty if
+           the file is terminated with a newline.  For a memory-mapped file
+           this is a _LazyLines that decodes each line when it is needed, and
+           for a streamed file a _SourceLineStream.
+    mixed_crlf_lines: The 1-based numbers of the lines that ended in CR-LF
+                      when the file also has lines that end in a bare LF.
+                      Empty if all line endings are the same.  For a
+                      streamed file this is an iterator.
+    has_bad_characters: False if the file was valid UTF-8 without any NUL
+                        bytes or U+FFFD characters, True otherwise.
+    size: The number of bytes in the file.
+  """
+
+  def __init__(self, lines, mixed_crlf_lines, has_bad_characters, size,
+               mapping=None):
+    self.lines = lines
+    self.mixed_crlf_lines = mixed_crlf_lines
+    self.has_bad_characters = has_bad_characters
+    self.size = size
+    self._mapping = mapping
+
+  def Close(self):
+    """Releases the memory mapping, if any.  The lines can't be used after."""
+    if self._mapping is not None:
+      self._mapping.close()
+      self._mapping = None
+
+
+def _ScanChunks(chunks):
+  """Counts the line endings of a file and checks that it is clean UTF-8.
+
+  Args:
+    chunks: An iterable of the consecutive byte strings that make up a file.
+
+  Returns:
+    A tuple of the number of LFs, the number of those that follow a CR, and
+    whether the file has NUL bytes, invalid UTF-8 or U+FFFD characters.
+  """
+  decoder = codecs.getincrementaldecoder('utf8')()
+  newline_count = 0
+  crlf_count = 0
+  has_bad_characters = False
+  last_byte = b''
+  for chunk in chunks:
+    newline_count += chunk.count(b'\n')
+    crlf_count += chunk.count(b'\r\n')
+    if last_byte == b'\r' and chunk[:1] == b'\n':
+      crlf_count += 1
+    last_byte = chunk[-1:]
+    if not has_bad_characters:
+      try:
+        has_bad_characters = (b'\0' in chunk or
+                              u'\ufffd' in decoder.decode(chunk))
+      except UnicodeDecodeError:
+        has_bad_characters = True
+  if not has_bad_characters:
+    try:
+      decoder.decode(b'', True)
+    except UnicodeDecodeError:
+      has_bad_characters = True
+  return (newline_count, crlf_count, has_bad_characters)
+
+
+def _MapSourceFile(file_handle):
+  """Memory-maps a file and indexes its lines without decoding them.
+
+  The only per-line state that is kept is the offset of each line in an
+  array, so memory use is about 8 bytes per line however long the lines are.
+  The file is validated as UTF-8 in fixed-size chunks.
+
+  Args:
+    file_handle: A non-empty file opened for reading in binary mode.
+
+  Returns:
+    A _SourceFile whose lines are a _LazyLines.
+  """
+  data = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+  size = len(data)
+
+  # offsets[i] is where line i starts; one past the end of the file is added
+  # so that line i always ends one byte before offsets[i + 1].
+  offsets = array.array(_LINE_OFFSET_TYPECODE, [0])
+  pos = data.find(b'\n')
+  while pos >= 0:
+    offsets.append(pos + 1)
+    pos = data.find(b'\n', pos + 1)
+  offsets.append(size + 1)
+  last_linenum = len(offsets) - 2
+
+  (_, crlf_count, has_bad_characters) = _ScanChunks(
+      data[start:start + _DECODE_CHUNK_SIZE]
+      for start in xrange(0, size, _DECODE_CHUNK_SIZE))
+
+  # See ReadSourceFile for why only a mix of LF and CR-LF is reported.
+  mixed_crlf_lines = []
+  if 0 < crlf_count < last_linenum:
+    for linenum in xrange(1, last_linenum + 1):
+      end = offsets[linenum] - 1
+      if data[end - 1:end] == b'\r':
+        mixed_crlf_lines.append(linenum)
+
+  def ReadLine(linenum):
+    line = data[offsets[linenum]:offsets[linenum + 1] - 1]
+    if linenum < last_linenum:
+      line = line.rstrip(b'\r')
+    return line.decode('utf8', 'replace')
+
+  return _SourceFile(_LazyLines(last_linenum + 1, ReadLine), mixed_crlf_lines,
+                     has_bad_characters, size, data)
+
+
+class _SourceLineStream(object):
+  """The lines of a file, read from disk again each time they are iterated.
+
+  Iterating yields the same lines that ReadSourceFile would return in a list,
+  but only one line is in memory at a time.  See ProcessFileStream.
+  """
+
+  def __init__(self, filename, num_lines):
+    self.filename = filename
+    self._num_lines = num_lines
+
+  def __len__(self):
+    return self._num_lines
+
+  def __iter__(self):
+    with open(self.filename, 'rb') as file_handle:
+      line = b''
+      for line in file_handle:
+        if line.endswith(b'\n'):
+          yield line[:-1].rstrip(b'\r').decode('utf8', 'replace')
+      if line.endswith(b'\n'):
+        line = b''
+      yield line.decode('utf8', 'replace')
+
+  def IterCrlfLines(self):
+    """Yields the 1-based numbers of the lines that end in CR-LF."""
+    with open(self.filename, 'rb') as file_handle:
+      for linenum, line in enumerate(file_handle):
+        if line.endswith(b'\r\n'):
+          yield linenum + 1
+
+
+def _StreamSourceFile(file_handle):
+  """Scans a file for the facts ReadSourceFile returns, without keeping it.
+
+  Args:
+    file_handle: A file opened for reading in binary mode.
+
+  Returns:
+    A _SourceFile whose lines are a _SourceLineStream, and whose
+    mixed_crlf_lines are produced by reading the file again.
+  """
+  (newline_count, crlf_count, has_bad_characters) = _ScanChunks(
+      iter(lambda: file_handle.read(_DECODE_CHUNK_SIZE), b''))
+  lines = _SourceLineStream(file_handle.name, newline_count + 1)
+  # See ReadSourceFile for why only a mix of LF and CR-LF is reported.
+  mixed_crlf_lines = []
+  if 0 < crlf_count < newline_count:
+    mixed_crlf_lines = lines.IterCrlfLines()
+  return _SourceFile(lines, mixed_crlf_lines, has_bad_characters,
+                     file_handle.tell())
+
+
+def ReadSourceFile(filename):
+  """Reads and decodes a file, scanning its bytes in bulk.
+
+  The file is read with a single call and decoded as strict UTF-8, falling
+  back to replacing invalid sequences with U+FFFD.  Line endings, NUL bytes
+  and invalid sequences are found with bulk operations on the raw bytes, so
+  no per-line Python work is needed for the common case of a clean file with
+  uniform line endings.  Files of at least _mmap_threshold bytes are
+  memory-mapped instead, see _MapSourceFile, and files of at least
+  _stream_threshold bytes are streamed, see _StreamSourceFile.  Callers
+  should Close() the result when they are done with its lines.
+
+  Args:
+    filename: The name of the file to read, or "-" for stdin.  If it is in
+              _cpplint_state.file_contents, those bytes are read instead.
+
+  Returns:
+    A _SourceFile.
+
+  Raises:
+    IOError: The file could not be read.
+  """
+  if filename in _cpplint_state.file_contents:
+    raw = _cpplint_state.file_contents[filename]
+  # Support the UNIX convention of using "-" for stdin.
+  elif filename == '-':
+    raw = getattr(sys.stdin, 'buffer', sys.stdin).read()
+  else:
+    with open(filename, 'rb') as file_handle:
+      size = os.fstat(file_handle.fileno()).st_size
+      if _stream_threshold and size >= _stream_threshold:
+        return _StreamSourceFile(file_handle)
+      if size and size >= _mmap_threshold:
+        return _MapSourceFile(file_handle)
+      raw = file_handle.read()
+  size = len(raw)
+
+  # Don't issue any warnings if all lines are uniformly LF or CR-LF, since
+  # critique can handle these just fine, and the style guide doesn't dictate
+  # a particular end of line sequence.  We can't depend on os.linesep to
+  # determine what the desired end-of-line sequence should be, since that
+  # will return the server-side end-of-line sequence.
+  mixed_crlf_lines = []
+  crlf_count = raw.count(b'\r\n')
+  if crlf_count:
+    if crlf_count < raw.count(b'\n'):
+      linenum = 1
+      last = 0
+      pos = raw.find(b'\r\n')
+      while pos >= 0:
+        linenum += raw.count(b'\n', last, pos)
+        mixed_crlf_lines.append(linenum)
+        last = pos
+        pos = raw.find(b'\r\n', pos + 2)
+    # CR and LF never occur inside a multi-byte UTF-8 sequence, so they can
+    # be removed before decoding.
+    if b'\r\r\n' in raw:
+      raw = _RE_PATTERN_CR_BEFORE_LF.sub(b'\n', raw)
+    else:
+      raw = raw.replace(b'\r\n', b'\n')
+
+  try:
+    text = raw.decode('utf8')
+    has_bad_characters = u'\ufffd' in text
+  except UnicodeDecodeError:
+    text = raw.decode('utf8', 'replace')
+    has_bad_characters = True
+  has_bad_characters = has_bad_characters or b'\0' in raw
+
+  return _SourceFile(text.split(u'\n'), mixed_crlf_lines, has_bad_characters,
+                     size)
+
+
+# Module-level functions with these names are profiled as checks.
+_RE_CHECK_FUNCTION_NAME = re.compile(r'^(?:Check|Flag)[A-Z]\w*$')
+
+# These are profiled as setup phases rather than checks.
+_PROFILED_PHASES = ('ReadSourceFile', 'RemoveMultiLineComments',
+                    'CleansedLines', 'NestingState.Update',
+                    'CheckForIncludeWhatYouUse')
+
+# Wall-clock time in seconds, as precise as is available.
+_ProfileTimer = getattr(time, 'perf_counter', time.time)
+
+
+class _Instrumentation(object):
+  """Base class of the optional recorders that wrap functions of the module.
+
+  Subclasses install their wrappers in Enable() with _Wrap(), and Disable()
+  puts the original functions back.  Nothing is wrapped until Enable() is
+  called, so a run without the corresponding flag pays nothing.
+  """
+
+  def __init__(self):
+    self._originals = []
+
+  def _Wrap(self, owner, attribute, make_wrapper):
+    """Replaces a function of a module or class with a wrapper.
+
+    Args:
+      owner: The module or class.
+      attribute: The name of the function in owner.
+      make_wrapper: A function that takes the original function and returns
+                    the wrapper.
+    """
+    # Read through __dict__ so that methods are wrapped as plain functions.
+    original = vars(owner)[attribute]
+    self._originals.append((owner, attribute, original))
+    wrapper = make_wrapper(original)
+    wrapper.__name__ = original.__name__
+    wrapper.__doc__ = original.__doc__
+    setattr(owner, attribute, wrapper)
+
+  def Disable(self):
+    """Removes the wrappers."""
+    while self._originals:
+      (owner, attribute, original) = self._originals.pop()
+      setattr(owner, attribute, original)
+
+
+class _CheckProfile(_Instrumentation):
+  """Records where the time of a run goes, per check and per setup phase.
+
+  Enable() replaces the check functions and phases of the module with
+  wrappers that record into this profile, so nothing is recorded, or spent,
+  unless profiling was asked for.  For each name, stats holds the number of
+  calls, the total seconds including nested checks, the seconds spent in the
+  function itself, and the errors it emitted itself.  Profiles of separate
+  runs, such as parallel workers, are combined with Merge().
+  """
+
+  def __init__(self):
+    _Instrumentation.__init__(self)
+    self.stats = {}
+    self._active = []  # A [stats, seconds in nested calls] per running call.
+
+  def Enable(self):
+    """Installs the recording wrappers."""
+    module = sys.modules[__name__]
+    names = [name for name in dir(module)
+             if _RE_CHECK_FUNCTION_NAME.match(name)]
+    for name in names + ['ReadSourceFile', 'RemoveMultiLineComments']:
+      self._Install(module, name, name)
+    self._Install(CleansedLines, '__init__', 'CleansedLines')
+    self._Install(NestingState, 'Update', 'NestingState.Update')
+
+    def MakeProfiledProcessFileData(process_file_data):
+      def ProfiledProcessFileData(filename, file_extension, lines, error,
+                                  *args, **kwargs):
+        return process_file_data(filename, file_extension, lines,
+                                 self._CountErrors(error), *args, **kwargs)
+      return ProfiledProcessFileData
+    self._Wrap(module, 'ProcessFileData', MakeProfiledProcessFileData)
+
+  def _Install(self, owner, attribute, name):
+    self._Wrap(owner, attribute,
+               lambda function: self._MakeProfiled(function, name))
+
+  def _MakeProfiled(self, function, name):
+    stats = self.stats.setdefault(name, [0, 0.0, 0.0, 0])
+    active = self._active
+
+    def Profiled(*args, **kwargs):
+      frame = [stats, 0.0]
+      active.append(frame)
+      start = _ProfileTimer()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        elapsed = _ProfileTimer() - start
+        active.pop()
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed - frame[1]
+        if active:
+          active[-1][1] += elapsed
+
+    return Profiled
+
+  def _CountErrors(self, error):
+    """Wraps an error function to count errors against the running check."""
+    active = self._active
+
+    def CountedError(filename, linenum, category, confidence, message):
+      if active:
+        active[-1][0][3] += 1
+      error(filename, linenum, category, confidence, message)
+
+    return CountedError
+
+  def Merge(self, stats):
+    """Adds the stats of another profile, e.g. from a parallel worker.
+
+    Args:
+      stats: The stats member of the other profile.  It may have been
+             through a JSON round trip.
+    """
+    for name, other in stats.items():
+      mine = self.stats.setdefault(name, [0, 0.0, 0.0, 0])
+      for i in xrange(len(mine)):
+        mine[i] += other[i]
+
+  def PrintReport(self):
+    """Prints the stats, most expensive first, to stderr."""
+    sections = (('Check', [name for name in self.stats
+                           if name not in _PROFILED_PHASES]),
+                ('Setup phase', [name for name in _PROFILED_PHASES
+                                 if name in self.stats]))
+    for (title, names) in sections:
+      sys.stderr.write('%-40s %9s %9s %9s %7s\n' %
+                       (title, 'Calls', 'Self s', 'Total s', 'Errors'))
+      names.sort(key=lambda name: (-self.stats[name][2], name))
+      for name in names:
+        (calls, total, own, errors) = self.stats[name]
+        if not calls:
+          continue
+        sys.stderr.write('%-40s %9d %9.3f %9.3f %7d\n' %
+                         (name, calls, own, total, errors))
+
+
+# A regexp call that takes this long on a single line suggests catastrophic
+# backtracking.
+_SLOW_REGEX_SECONDS = 0.01
+
+# How much of the slowest input of each pattern is kept by _RegexStats.
+_REGEX_STATS_INPUT_LENGTH = 200
+
+
+class _RegexStats(_Instrumentation):
+  """Records the calls, hits and time of each regexp pattern.
+
+  Enable() replaces Match, Search and ReplaceAll with recording versions and
+  makes every _LazyRegex bind recording wrappers, so nothing is recorded, or
+  spent, unless --regex_stats was given.  For each pattern, stats holds the
+  number of calls, the number of calls that matched (or, for substitutions,
+  changed the string), the total seconds, the seconds of the slowest call
+  and the start of the string it was given.
+  """
+
+  def __init__(self):
+    _Instrumentation.__init__(self)
+    self.stats = {}
+
+  def Enable(self):
+    """Installs the recording wrappers."""
+    module = sys.modules[__name__]
+
+    def Compiled(pattern):
+      if pattern not in _regexp_compile_cache:
+        _regexp_compile_cache[pattern] = sre_compile.compile(pattern)
+      return _regexp_compile_cache[pattern]
+
+    def RecordedMatch(pattern, s):
+      return self.Call(pattern, Compiled(pattern).match, s)
+
+    def RecordedSearch(pattern, s):
+      return self.Call(pattern, Compiled(pattern).search, s)
+
+    def RecordedReplaceAll(pattern, rep, s):
+      return self.Call(pattern, Compiled(pattern).sub, rep, s)
+
+    self._Wrap(module, 'Match', lambda original: RecordedMatch)
+    self._Wrap(module, 'Search', lambda original: RecordedSearch)
+    self._Wrap(module, 'ReplaceAll', lambda original: RecordedReplaceAll)
+    _LazyRegex.Reset()
+
+  def Disable(self):
+    """Removes the recording wrappers."""
+    _Instrumentation.Disable(self)
+    _LazyRegex.Reset()
+
+  def Wrap(self, pattern, method):
+    """Returns a version of a method of a compiled pattern that records."""
+    return lambda *args: self.Call(pattern, method, *args)
+
+  def Call(self, pattern, method, *args):
+    """Calls a method of a compiled pattern and records the call.
+
+    Args:
+      pattern: The pattern the method belongs to.
+      method: The match, search or sub method of the compiled pattern.
+      *args: The arguments for the method.  The last one is the string.
+
+    Returns:
+      What the method returned.
+    """
+    start = _ProfileTimer()
+    result = method(*args)
+    elapsed = _ProfileTimer() - start
+    stats = self.stats.get(pattern)
+    if stats is None:
+      stats = self.stats[pattern] = [0, 0, 0.0, 0.0, '']
+    stats[0] += 1
+    if result is not None and result != args[-1]:
+      stats[1] += 1
+    stats[2] += elapsed
+    if elapsed > stats[3]:
+      stats[3] = elapsed
+      stats[4] = args[-1][:_REGEX_STATS_INPUT_LENGTH]
+    return result
+
+  def Merge(self, stats):
+    """Adds the stats of another run, e.g. from a parallel worker.
+
+    Args:
+      stats: The stats member of the other _RegexStats.  It may have been
+             through a JSON round trip.
+    """
+    for pattern, other in stats.items():
+      mine = self.stats.setdefault(pattern, [0, 0, 0.0, 0.0, ''])
+      mine[0] += other[0]
+      mine[1] += other[1]
+      mine[2] += other[2]
+      if other[3] > mine[3]:
+        mine[3] = other[3]
+        mine[4] = other[4]
+
+  def WriteJson(self, path):
+    """Writes the stats, most expensive pattern first, as JSON to a file."""
+    patterns = []
+    for pattern, stats in self.stats.items():
+      (calls, hits, seconds, worst_seconds, worst_input) = stats
+      patterns.append({'pattern': pattern,
+                       'calls': calls,
+                       'hits': hits,
+                       'seconds': seconds,
+                       'worst_seconds': worst_seconds,
+                       'worst_input': worst_input,
+                       'suspect_backtracking':
+                           worst_seconds >= _SLOW_REGEX_SECONDS})
+    patterns.sort(key=lambda entry: (-entry['seconds'], entry['pattern']))
+    with open(path, 'w') as output:
+      json.dump({'slow_call_seconds': _SLOW_REGEX_SECONDS,
+                 'patterns': patterns}, output, indent=2,
+                separators=(',', ': '), sort_keys=True)
+
+
+class _SlowReport(_Instrumentation):
+  """Records the slowest files and the slowest lines of a run.
+
+  Enable() wraps ProcessFile and ProcessLine with timers.  files and lines
+  are heaps of at most limit (seconds, filename) and
+  (seconds, filename, line number) tuples, so memory use does not grow with
+  the number of files.  The time of a line is that of its ProcessLine call.
+  """
+
+  def __init__(self, limit):
+    _Instrumentation.__init__(self)
+    self.limit = limit
+    self.files = []
+    self.lines = []
+
+  def Enable(self):
+    """Installs the timing wrappers."""
+    module = sys.modules[__name__]
+
+    def MakeTimedProcessFile(process_file):
+      def TimedProcessFile(filename, *args, **kwargs):
+        start = _ProfileTimer()
+        try:
+          return process_file(filename, *args, **kwargs)
+        finally:
+          self.Add(self.files, (_ProfileTimer() - start, filename))
+      return TimedProcessFile
+
+    def MakeTimedProcessLine(process_line):
+      def TimedProcessLine(filename, file_extension, clean_lines, line,
+                           *args, **kwargs):
+        start = _ProfileTimer()
+        try:
+          return process_line(filename, file_extension, clean_lines, line,
+                              *args, **kwargs)
+        finally:
+          self.Add(self.lines, (_ProfileTimer() - start, filename, line))
+      return TimedProcessLine
+
+    self._Wrap(module, 'ProcessFile', MakeTimedProcessFile)
+    self._Wrap(module, 'ProcessLine', MakeTimedProcessLine)
+
+  def Add(self, heap, entry):
+    """Adds an entry to files or lines, dropping the fastest if full."""
+    if len(heap) < self.limit:
+      heapq.heappush(heap, entry)
+    elif self.limit:
+      heapq.heappushpop(heap, entry)
+
+  def PrintReport(self):
+    """Prints the slowest files and lines, slowest first, to stderr."""
+    sys.stderr.write('Slowest files:\n')
+    for (seconds, filename) in sorted(self.files, reverse=True):
+      sys.stderr.write('%10.3fs  %s\n' % (seconds, filename))
+    sys.stderr.write('Slowest lines:\n')
+    for (seconds, filename, linenum) in sorted(self.lines, reverse=True):
+      sys.stderr.write('%10.3fs  %s:%d\n' % (seconds, filename, linenum))
+
+
+_SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+# The functions whose stacks _SpeedscopeProfile records, besides the checks.
+_SPEEDSCOPE_FRAMES = ('ProcessFile', 'ProcessFileData', 'ProcessLine',
+                      'ReadSourceFile', 'RemoveMultiLineComments')
+
+
+class _SpeedscopeProfile(_Instrumentation):
+  """Records a flame graph of the checks run on each linted file.
+
+  Enable() wraps the functions that _CheckProfile records, plus those in
+  _SPEEDSCOPE_FRAMES.  For each linted file, files holds a
+  (filename, weights) pair, where weights maps each stack of function names,
+  outermost first, to the seconds spent in its innermost function itself.
+  A new file starts whenever ProcessFile or ProcessFileData is entered
+  outside of any other recorded call.  Write() writes the files in the
+  speedscope format, as one sampled profile each.
+  """
+
+  def __init__(self):
+    _Instrumentation.__init__(self)
+    self.files = []
+    self._names = []   # The names of the running calls, outermost first.
+    self._nested = []  # The seconds spent in nested calls of each of them.
+    self._weights = None
+
+  def Enable(self):
+    """Installs the recording wrappers."""
+    module = sys.modules[__name__]
+    names = [name for name in dir(module)
+             if _RE_CHECK_FUNCTION_NAME.match(name)]
+    for name in names + list(_SPEEDSCOPE_FRAMES):
+      self._Install(module, name, name)
+    self._Install(CleansedLines, '__init__', 'CleansedLines')
+    self._Install(NestingState, 'Update', 'NestingState.Update')
+
+  def _Install(self, owner, attribute, name):
+    self._Wrap(owner, attribute,
+               lambda function: self._MakeRecorded(function, name))
+
+  def _MakeRecorded(self, function, name):
+    starts_file = name in ('ProcessFile', 'ProcessFileData')
+    names = self._names
+    nested = self._nested
+
+    def Recorded(*args, **kwargs):
+      if not names:
+        if not starts_file:
+          return function(*args, **kwargs)
+        # The first argument of both is the name of the linted file.
+        self._weights = {}
+        self.files.append((args[0], self._weights))
+      names.append(name)
+      nested.append(0.0)
+      start = _ProfileTimer()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        elapsed = _ProfileTimer() - start
+        stack = tuple(names)
+        names.pop()
+        own = elapsed - nested.pop()
+        self._weights[stack] = self._weights.get(stack, 0.0) + own
+        if nested:
+          nested[-1] += elapsed
+
+    return Recorded
+
+  def Write(self, path):
+    """Writes the files as a speedscope JSON file, see www.speedscope.app."""
+    frames = []
+    frame_indexes = {}
+    profiles = []
+    for (filename, weights) in self.files:
+      samples = []
+      sample_weights = []
+      for stack in sorted(weights):
+        for name in stack:
+          if name not in frame_indexes:
+            frame_indexes[name] = len(frames)
+            frames.append({'name': name})
+        samples.append([frame_indexes[name] for name in stack])
+        sample_weights.append(weights[stack])
+      profiles.append({'type': 'sampled',
+                       'name': filename,
+                       'unit': 'seconds',
+                       'startValue': 0,
+                       'endValue': sum(sample_weights),
+                       'samples': samples,
+                       'weights': sample_weights})
+    with open(path, 'w') as output:
+      json.dump({'$schema': _SPEEDSCOPE_SCHEMA,
+                 'exporter': 'cpplint',
+                 'name': 'cpplint',
+                 'shared': {'frames': frames},
+                 'profiles': profiles}, output, sort_keys=True)
+
+
+class _PstatsProfile(object):
+  """Runs cProfile over the rest of the run and dumps it for pstats.
+
+  Nothing is wrapped: cProfile sees each check as a function of its own.
+  The pstats format has no place for the linted file, so the calls of all
+  files are added together; use a _SpeedscopeProfile to tell files apart.
+  """
+
+  def __init__(self):
+    self.profiler = cProfile.Profile()
+
+  def Enable(self):
+    """Starts profiling."""
+    self.profiler.enable()
+
+  def Disable(self):
+    """Stops profiling."""
+    self.profiler.disable()
+
+  def Write(self, path):
+    """Stops profiling and dumps the stats to a file."""
+    self.Disable()
+    self.profiler.dump_stats(path)
+
+
+def _EscapeMetricLabel(value):
+  """Escapes a label value for the OpenMetrics text format."""
+  return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _RunMetrics(_Instrumentation):
+  """Counts what a run read and did, for --metrics.
+
+  Enable() wraps ReadSourceFile, ProcessFileData, ProcessConfigOverrides,
+  the regexp helpers and _CppLintState.IncrementErrorCount, so nothing is
+  counted unless --metrics was given.  Errors are counted by their full
+  category whatever the --counting style, and only once they pass the
+  filters.  The regexp cache is _regexp_compile_cache, looked up by Match,
+  Search, ReplaceAll and the first use of each _LazyRegex.
+  """
+
+  def __init__(self):
+    _Instrumentation.__init__(self)
+    self.files = 0
+    self.lines = 0
+    self.bytes_read = 0
+    self.config_files = 0
+    self.cache_hits = 0
+    self.cache_misses = 0
+    self.errors_by_category = {}
+    self._start_wall = _ProfileTimer()
+    self._start_cpu = sum(os.times()[:2])
+
+  def Enable(self):
+    """Installs the counting wrappers."""
+    module = sys.modules[__name__]
+
+    def MakeCountedReadSourceFile(read_source_file):
+      def CountedReadSourceFile(filename):
+        source = read_source_file(filename)
+        self.bytes_read += source.size
+        return source
+      return CountedReadSourceFile
+
+    def MakeCountedProcessFileData(process_file_data):
+      def CountedProcessFileData(filename, file_extension, lines, error,
+                                 *args, **kwargs):
+        self.files += 1
+        self.lines += len(lines)
+        return process_file_data(filename, file_extension, lines, error,
+                                 *args, **kwargs)
+      return CountedProcessFileData
+
+    def MakeCountedIncrementErrorCount(increment_error_count):
+      def CountedIncrementErrorCount(state, category):
+        self.errors_by_category[category] = (
+            self.errors_by_category.get(category, 0) + 1)
+        return increment_error_count(state, category)
+      return CountedIncrementErrorCount
+
+    def CountLookup(pattern):
+      if pattern in _regexp_compile_cache:
+        self.cache_hits += 1
+      else:
+        self.cache_misses += 1
+
+    def MakeCountedMatchOrSearch(match_or_search):
+      def CountedMatchOrSearch(pattern, s):
+        CountLookup(pattern)
+        return match_or_search(pattern, s)
+      return CountedMatchOrSearch
+
+    def MakeCountedReplaceAll(replace_all):
+      def CountedReplaceAll(pattern, rep, s):
+        CountLookup(pattern)
+        return replace_all(pattern, rep, s)
+      return CountedReplaceAll
+
+    def MakeCountedCompile(compile_lazy_regex):
+      def CountedCompile(lazy_regex):
+        CountLookup(lazy_regex.pattern)
+        return compile_lazy_regex(lazy_regex)
+      return CountedCompile
+
+    self._Wrap(module, 'ReadSourceFile', MakeCountedReadSourceFile)
+    self._Wrap(module, 'ProcessFileData', MakeCountedProcessFileData)
+    self._Wrap(_CppLintState, 'IncrementErrorCount',
+               MakeCountedIncrementErrorCount)
+    self._Wrap(module, 'Match', MakeCountedMatchOrSearch)
+    self._Wrap(module, 'Search', MakeCountedMatchOrSearch)
+    self._Wrap(module, 'ReplaceAll', MakeCountedReplaceAll)
+    self._Wrap(_LazyRegex, '_Compile', MakeCountedCompile)
+
+  def Write(self, path):
+    """Writes the metrics to a file in the OpenMetrics text format."""
+    wall_seconds = _ProfileTimer() - self._start_wall
+    cpu_seconds = sum(os.times()[:2]) - self._start_cpu
+    families = [
+        ('cpplint_files', 'counter', 'Files linted.', [('', self.files)]),
+        ('cpplint_lines', 'counter',
+         'Lines linted, including the empty one after a final newline.',
+         [('', self.lines)]),
+        ('cpplint_read_bytes', 'counter', 'Bytes of source files read.',
+         [('', self.bytes_read)]),
+        ('cpplint_config_files', 'counter', 'CPPLINT.cfg files parsed.',
+         [('', self.config_files)]),
+        ('cpplint_regexp_cache_hits', 'counter',
+         'Regexp lookups that found an already compiled pattern.',
+         [('', self.cache_hits)]),
+        ('cpplint_regexp_cache_misses', 'counter',
+         'Regexp lookups that compiled the pattern.',
+         [('', self.cache_misses)]),
+        ('cpplint_errors', 'counter', 'Errors reported, by category.',
+         [('{category="%s"}' % _EscapeMetricLabel(category), count)
+          for (category, count) in sorted(self.errors_by_category.items())]),
+        ('cpplint_wall_seconds', 'gauge', 'Wall-clock time of the run.',
+         [('', wall_seconds)]),
+        ('cpplint_cpu_seconds', 'gauge', 'User and system CPU time of the run.',
+         [('', cpu_seconds)]),
+        ]
+    with open(path, 'w') as output:
+      for (name, metric_type, help_text, samples) in families:
+        output.write('# TYPE %s %s\n' % (name, metric_type))
+        if name.endswith('_seconds'):
+          output.write('# UNIT %s seconds\n' % name)
+        output.write('# HELP %s %s\n' % (name, help_text))
+        suffix = '_total' if metric_type == 'counter' else ''
+        for (labels, value) in samples:
+          output.write('%s%s%s %r\n' % (name, suffix, labels, value))
+      output.write('# EOF\n')
+
+
+def FindGeneratedFileMarker(lines, markers):
+  """Looks for the markers of a generated file at the start of a file.
+
+  Args:
+    lines: The lines of the file, as ReadSourceFile returns them.
+    markers: The strings that mark a generated file.
+
+  Returns:
+    The first of markers that occurs in the first _GENERATED_FILE_HEAD_SIZE
+    characters of the file, or None.
+  """
+  head = []
+  size = 0
+  for line in lines:
+    head.append(line)
+    size += len(line) + 1
+    if size >= _GENERATED_FILE_HEAD_SIZE:
+      break
+  head = '\n'.join(head)[:_GENERATED_FILE_HEAD_SIZE]
+  for marker in markers:
+    if marker in head:
+      return marker
+  return None
+
+
+def ProcessGeneratedFileData(filename, lines, error,
+                             check_bad_characters=True):
+  """Runs the reduced set of checks on a generated file.
+
+  Generated code follows the style of its generator rather than the style
+  guide, so only the raw lines are checked, in one pass of linear time: for
+  invalid UTF-8 and NUL bytes, which point to a corrupt output, and for
+  tabs, trailing whitespace and their length, see _CheckRawLine.  NOLINT
+  comments are honored.  ProcessFile also reports mixed line endings.
+
+  Args:
+    filename: Filename of the file that is being processed.
+    lines: The lines of the file, as ReadSourceFile returns them.
+    error: A callable to which errors are reported, which takes 4 arguments:
+           filename, line number, error level, and message
+    check_bad_characters: False if the caller already knows that the lines
+                          contain no U+FFFD or NUL characters.
+  """
+  ResetNolintSuppressions()
+  lines = _CheckGeneratedLines(filename, lines, error)
+  if check_bad_characters:
+    CheckForBadCharacters(
+        filename, itertools.chain([_FIRST_MARKER_LINE], lines), error)
+  else:
+    collections.deque(lines, maxlen=0)
+
+
+def _CheckGeneratedLines(filename, lines, error):
+  """Yields lines, once their NOLINT comments and raw text are checked.
+
+  Args:
+    filename: The name of the current file.
+    lines: An iterable of the lines of the file, without marker lines.
+    error: The function to call with any errors found.
+  """
+  for (linenum, line) in enumerate(lines, 1):
+    ParseNolintSuppressions(filename, line, linenum, error)
+    _CheckRawLine(filename, linenum, line, error)
+    yield line
+
+
+# How many lines around a line changed by the --diff get the per-line checks,
+# for the errors they report on a line other than their own.
+_DIFF_CONTEXT_LINES = 3
+
+_RE_DIFF_HUNK = _LazyRegex(r'@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+# A name git quotes like a C string, and its escapes: those of a character,
+# and runs of octal escapes of the bytes of one or more characters.
+_RE_C_QUOTED = _LazyRegex(r'"((?:[^"\\]|\\.)*)"')
+_RE_C_ESCAPE = _LazyRegex(r'\\([abtnvfr"\\]|[0-7]{3}(?:\\[0-7]{3})*)')
+_C_ESCAPES = {'a': '\a', 'b': '\b', 't': '\t', 'n': '\n', 'v': '\v',
+              'f': '\f', 'r': '\r', '"': '"', '\\': '\\'}
+
+
+def _UnquoteCString(match):
+  """Returns what a match of _RE_C_ESCAPE stands for."""
+  escape = match.group(1)
+  if escape in _C_ESCAPES:
+    return _C_ESCAPES[escape]
+  data = bytearray(int(code, 8) for code in escape.split('\\'))
+  if bytes is str:  # Python 2
+    return str(data)
+  return data.decode('utf8', 'replace')
+
+
+def _DiffFileName(header):
+  """Returns the name of a file in a "---" or "+++" line of a diff.
+
+  git quotes names with a double quote, a backslash or a control character
+  in them like C strings, even with core.quotepath=off.
+
+  Args:
+    header: The line without its "--- " or "+++ ".  Anything after a tab,
+            such as the time of a file in the output of diff -u, is ignored.
+  """
+  match = _RE_C_QUOTED.match(header)
+  if match:
+    return _RE_C_ESCAPE.sub(_UnquoteCString, match.group(1))
+  return header.split('\t')[0]
+
+
+def ParseUnifiedDiff(lines):
+  """Finds the lines a unified diff adds or changes.
+
+  Args:
+    lines: The lines of the diff.  The names of the files are unquoted, see
+           _DiffFileName, and lose the "b/" prefix git gives them.
+
+  Returns:
+    A dict from the name of each file the diff adds lines to, to the set of
+    the numbers of those lines, counting from 1.  The set of a file the diff
+    creates also holds 0, the line of the errors about the whole file.
+  """
+  changed_lines = {}
+  added = set()
+  new_file = False
+  (old_left, new_left, linenum) = (0, 0, 0)
+  for line in lines:
+    if old_left > 0 or new_left > 0:
+      if line.startswith('+'):
+        added.add(linenum)
+        linenum += 1
+        new_left -= 1
+      elif line.startswith('-'):
+        old_left -= 1
+      elif not line.startswith('\\'):  # Not "\ No newline at end of file".
+        linenum += 1
+        old_left -= 1
+        new_left -= 1
+      continue
+    match = _RE_DIFF_HUNK.match(line)
+    if match:
+      old_left = int(match.group(1) or '1')
+      linenum = int(match.group(2))
+      new_left = int(match.group(3) or '1')
+    elif line.startswith('--- '):
+      new_file = _DiffFileName(line[4:]) == '/dev/null'
+    elif line.startswith('+++ '):
+      name = _DiffFileName(line[4:])
+      if name.startswith('b/'):
+        name = name[2:]
+      added = changed_lines.setdefault(name, set())
+      if new_file:
+        added.add(0)
+  return dict((name, added) for (name, added) in changed_lines.items()
+              if added - set([0]))
+
+
+def _RunGit(args, what):
+  """Returns the output of git run with args, or exits with its error.
+
+  Args:
+    args: The arguments of git.
+    what: What git does, for the error message.
+  """
+  try:
+    process = subprocess.Popen(['git', '-c', 'core.quotepath=off'] + args,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+  except OSError as e:
+    sys.exit('Cannot run git: %s' % e)
+  (output, message) = process.communicate()
+  if process.returncode:
+    sys.exit('git %s failed: %s' % (what, message.strip()))
+  if not isinstance(output, str):  # Python 3
+    output = output.decode('utf8', 'replace')
+  return output
+
+
+def _CheckWorkTree(what):
+  """Exits like _RunGit if the current directory is not in a git work tree.
+
+  Outside of one, git diff falls back to comparing two paths and fails with
+  its whole usage instead of saying so.
+
+  Args:
+    what: What git was going to do, for the error message.
+  """
+  if _RunGit(['rev-parse', '--is-inside-work-tree'], what).strip() != 'true':
+    sys.exit('git %s failed: not in a work tree' % what)
+
+
+def _ReadDiff(rev, staged):
+  """Returns the lines of the diff --diff=rev asks for.
+
+  Args:
+    rev: The revision to compare with, or "-" to read the diff from stdin.
+    staged: Whether to compare the index with rev instead of the working
+            tree, for --staged.
+  """
+  if rev == '-':
+    diff = getattr(sys.stdin, 'buffer', sys.stdin).read()
+    if not isinstance(diff, str):  # Python 3
+      diff = diff.decode('utf8', 'replace')
+  else:
+    diff = _RunGit(['diff', '--no-color', '--no-ext-diff', '--relative',
+                    '--src-prefix=a/', '--dst-prefix=b/', '-U0'] +
+                   (['--cached'] if staged else []) + [rev, '--'],
+                   'diff %s' % rev)
+  return diff.split('\n')
+
+
+# How many bytes of the list of files git ls-files writes are read at once.
+_FILE_LIST_CHUNK = 65536
+
+
+def _SplitStream(read, separator):
+  """Yields the items of a stream of separated items as they arrive.
+
+  Args:
+    read: A function that takes a number of bytes and returns up to that
+          many bytes of the stream, and no bytes at its end.
+    separator: The byte string between items.  An empty item is skipped.
+  """
+  pending = b''
+  while True:
+    chunk = read(_FILE_LIST_CHUNK)
+    if not chunk:
+      break
+    items = (pending + chunk).split(separator)
+    pending = items.pop()
+    for item in items:
+      if item:
+        yield item
+  if pending:
+    yield pending
+
+
+def _ReadFileList(stream, close):
+  """Yields the names of the files listed in a stream, for --files-from.
+
+  The names are separated by NUL characters if the stream has one before
+  its first line feed, and by line feeds otherwise.
+
+  Args:
+    stream: The binary stream to read.
+    close: Whether to close the stream once it has been read.
+  """
+  try:
+    file_descriptor = stream.fileno()
+    read = lambda size: os.read(file_descriptor, size)
+  except (AttributeError, IOError, ValueError):  # Not a file, as in tests.
+    read = stream.read
+  try:
+    first = [b'']
+    while not (b'\0' in first[0] or b'\n' in first[0]):
+      chunk = read(_FILE_LIST_CHUNK)
+      if not chunk:
+        break
+      first[0] += chunk
+    separator = b'\0' if b'\0' in first[0].split(b'\n')[0] else b'\n'
+
+    def ReadAfterFirst(size):
+      return first.pop() if first else read(size)
+
+    for filename in _SplitStream(ReadAfterFirst, separator):
+      if separator == b'\n':
+        filename = filename.rstrip(b'\r')
+      if not isinstance(filename, str):  # Python 3
+        filename = filename.decode('utf8', 'surrogateescape')
+      if filename:
+        yield filename
+  finally:
+    if close:
+      stream.close()
+
+
+def _ExpandResponseFiles(args):
+  """Replaces each argument @path by the lines of the file at path.
+
+  Args:
+    args: The command line arguments.
+
+  Returns:
+    The arguments after the replacement.
+  """
+  expanded = []
+  for arg in args:
+    if not arg.startswith('@') or arg == '@':
+      expanded.append(arg)
+      continue
+    try:
+      with open(arg[1:]) as response_file:
+        expanded.extend(line.rstrip('\r\n') for line in response_file
+                        if line.strip())
+    except (IOError, OSError):
+      PrintUsage('Cannot read the response file %s.' % arg[1:])
+  return expanded
+
+
+def _TrackedFiles(pathspecs):
+  """Returns the files to lint among the ones git tracks, for --files-from-git.
+
+  git is started here and its first file name is read, so that a missing git,
+  a directory outside of a repository or a bad pathspec make cpplint exit
+  before it lints anything: git checks them before it lists any file.  The
+  rest of the names are read as the files are linted.
+
+  Args:
+    pathspecs: The pathspecs of git ls-files, which lists the files under the
+               current directory without any.
+
+  Returns:
+    An iterator over the names of the files.
+  """
+  try:
+    process = subprocess.Popen(['git', 'ls-files', '-z', '--'] + pathspecs,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+  except OSError as e:
+    sys.exit('Cannot run git: %s' % e)
+  names = _SplitStream(
+      lambda size: os.read(process.stdout.fileno(), size), b'\0')
+  first = next(names, None)
+  if first is None:
+    _WaitForLsFiles(process)
+    return iter(())
+  return _FilterTrackedFiles(process, itertools.chain([first], names))
+
+
+def _WaitForLsFiles(process):
+  """Waits for git ls-files to end, and exits with its error if it failed."""
+  process.stdout.close()
+  message = process.stderr.read()
+  process.stderr.close()
+  # git is killed by SIGPIPE when cpplint stops reading early.
+  if process.wait() and process.returncode != -signal.SIGPIPE:
+    sys.exit('git ls-files failed: %s' % message.strip())
+
+
+def _FilterTrackedFiles(process, names):
+  """Yields the files to lint among the names git ls-files lists.
+
+  Args:
+    process: The git ls-files process, waited for at the end.
+    names: The byte strings of the names it lists.
+  """
+  config_files = {}
+  try:
+    for filename in names:
+      if not isinstance(filename, str):  # Python 3
+        filename = filename.decode('utf8', 'surrogateescape')
+      if (filename[filename.rfind('.') + 1:] in _valid_extensions and
+          not _IsExcludedByConfig(filename, config_files)):
+        yield filename
+  finally:
+    _WaitForLsFiles(process)
+
+
+class _StagedFiles(object):
+  """The staged contents of files, for --staged.
+
+  Stands for _cpplint_state.file_contents: ReadSourceFile reads the blobs of
+  the files from the index instead of the files.  One git cat-file --batch
+  process, started at the first read, serves all of them.
+  """
+
+  def __init__(self):
+    # Each changed file is listed as ":old_mode new_mode old_id new_id
+    # status", then its name.
+    fields = _RunGit(['diff', '--cached', '--raw', '-z', '--no-abbrev',
+                      '--no-renames', '--diff-filter=ACM', '--relative'],
+                     'diff --cached').split('\0')
+    self._blob_ids = {}
+    for (header, filename) in zip(fields[0::2], fields[1::2]):
+      (new_mode, blob_id) = header.split()[1::2]
+      # Not symbolic links nor submodules.
+      if new_mode.startswith('100'):
+        self._blob_ids[filename] = blob_id
+    self._process = None
+
+  def __contains__(self, filename):
+    return filename in self._blob_ids
+
+  def __iter__(self):
+    return iter(self._blob_ids)
+
+  def __getitem__(self, filename):
+    """Returns the staged bytes of the file.
+
+    Raises:
+      IOError: git could not read the blob.
+    """
+    if self._process is None:
+      self._process = subprocess.Popen(['git', 'cat-file', '--batch'],
+                                       stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE)
+    self._process.stdin.write((self._blob_ids[filename] + '\n').encode())
+    self._process.stdin.flush()
+    # The header is "id blob size", or "id missing".
+    header = self._process.stdout.readline().split()
+    if len(header) != 3:
+      raise IOError('git cannot read the staged %s' % filename)
+    contents = self._process.stdout.read(int(header[2]))
+    self._process.stdout.read(1)  # The line feed after the contents.
+    return contents
+
+  def Close(self):
+    """Stops the git cat-file process."""
+    if self._process is not None:
+      self._process.stdin.close()
+      self._process.wait()
+      self._process = None
+
+
+def _LinesToCheck(filename):
+  """Returns the lines_to_check of ProcessFileData for the --diff."""
+  if _cpplint_state.changed_lines is None:
+    return None
+  lines_to_check = set()
+  for linenum in _cpplint_state.changed_lines.get(filename, ()):
+    lines_to_check.update(xrange(linenum - _DIFF_CONTEXT_LINES,
+                                 linenum + _DIFF_CONTEXT_LINES + 1))
+  return lines_to_check
+
+
+# What _LintSourceFile returns for a file whose extension is not linted.
+_INVALID_EXTENSION = object()
+
+
+def _LintSourceFile(filename, extra_check_functions):
+  """Reads and lints a file, as ProcessFile does after the CPPLINT.cfg files.
+
+  Prints nothing.  The file is linted with the generated file policy, by
+  the IncrementalLinter in _cpplint_state.incremental_linters, or for the
+  lines changed by --diff, as _cpplint_state asks.
+
+  Args:
+    filename: The name of the file to lint.
+    extra_check_functions: As for ProcessFile.
+
+  Returns:
+    None if the file was linted.  Otherwise _INVALID_EXTENSION if its
+    extension is not linted, or the marker of generated code it was skipped
+    for.
+
+  Raises:
+    IOError: The file could not be read.
+  """
+  source = ReadSourceFile(filename)
+
+  # Note, if no dot is found, this will give the entire filename as the ext.
+  file_extension = filename[filename.rfind('.') + 1:]
+
+  # When reading from stdin, the extension is unknown, so no cpplint tests
+  # should rely on the extension.
+  generated_marker = None
+  if _cpplint_state.generated_files != 'full':
+    generated_marker = FindGeneratedFileMarker(
+        source.lines, _cpplint_state.generated_file_markers)
+
+  if filename != '-' and file_extension not in _valid_extensions:
+    source.Close()
+    return _INVALID_EXTENSION
+  if generated_marker and _cpplint_state.generated_files == 'skip':
+    source.Close()
+    return generated_marker
+
+  try:
+    if generated_marker:
+      ProcessGeneratedFileData(filename, source.lines, Error,
+                               source.has_bad_characters)
+    elif _cpplint_state.incremental_linters is not None:
+      linter = _cpplint_state.incremental_linters.get(filename)
+      if linter is None:
+        linter = IncrementalLinter(filename, file_extension,
+                                   extra_check_functions)
+        _cpplint_state.incremental_linters[filename] = linter
+      linter.Update(source.lines, Error, _cpplint_state.cancelled)
+    else:
+      ProcessFileData(filename, file_extension, source.lines, Error,
+                      extra_check_functions, source.has_bad_characters,
+                      _LinesToCheck(filename))
+  finally:
+    source.Close()
+
+  # If end-of-line sequences are a mix of LF and CR-LF, ReadSourceFile
+  # lists the lines with CR and we warn on every one of them.  An
+  # alternative approach might be to check whether the file is mostly
+  # CRLF or just LF, and warn on the minority, we bias toward LF here
+  # since most tools prefer LF.
+  for linenum in source.mixed_crlf_lines:
+    Error(filename, linenum, 'whitespace/newline', 1,
+          'Unexpected \\r (^M) found; better to use only \\n')
+  return None
+
+
+def ProcessFile(filename, vlevel, extra_check_functions=[]):
+  """Does google-lint on a single file.
+
+  Args:
+    filename: The name of the file to parse.
+
+    vlevel: The level of errors to report.  Every error of confidence
+    >= verbose_level will be reported.  0 is a good default.
+
+    extra_check_functions: An array of additional check functions that will be
+                           run on each source line. Each function takes 4
+                           arguments: filename, clean_lines, line, error
+  """
+
+  _SetVerboseLevel(vlevel)
+  _BackupFilters()
+  old_errors = _cpplint_state.error_count
+
+  if not ProcessConfigOverrides(filename):
+    _RestoreFilters()
+    return
+
+  try:
+    skipped = _LintSourceFile(filename, extra_check_functions)
+  except IOError:
+    sys.stderr.write(
+        "Skipping input '%s': Can't open for reading\n" % filename)
+    _RestoreFilters()
+    return
+
+  if skipped is _INVALID_EXTENSION:
+    sys.stderr.write('Ignoring %s; not a valid file name '
+                     '(%s)\n' % (filename, ', '.join(_valid_extensions)))
+  elif skipped and not _cpplint_state.quiet:
+    sys.stderr.write('Ignoring "%s": generated file (found "%s").\n' %
+                     (filename, skipped))
+
+  # Suppress printing anything if --quiet was passed unless the error
+  # count has increased after processing this file.
+  if not _cpplint_state.quiet or old_errors != _cpplint_state.error_count:
+    sys.stdout.write('Done processing %s\n' % filename)
+  _RestoreFilters()
+
+
+# An error found by LintTexts.
+Finding = collections.namedtuple(
+    'Finding', ['file', 'line', 'category', 'confidence', 'message'])
+
+
+class LintConfig(object):
+  """The settings LintTexts lints with, as the flags of the same names.
+
+  Attributes:
+    verbose: The confidence from which errors are reported, 0 to 5.
+    filters: A string of comma-separated filters, as for --filter.
+    linelength: The allowed line length.
+    extensions: The file extensions to lint, or None for the default ones.
+    headers: The header file extensions, or None for the default ones.
+    root: The directory header guards are relative to, as for --root.
+    generated_files: What to do with generated files: one of 'skip',
+                     'reduced' or 'full'.
+    config_files: Whether the CPPLINT.cfg files around each filename are
+                  read.  Problems in them are not reported.
+    filesystem_lookups: Whether the checks may look around each filename on
+                        disk: for the top of its repository, which header
+                        guards are relative to, for its header and for the
+                        headers it includes.  Without them the findings are
+                        the ones for a file that is not on disk.
+  """
+
+  def __init__(self, verbose=1, filters='', linelength=80, extensions=None,
+               headers=None, root=None, generated_files='full',
+               config_files=False, filesystem_lookups=False):
+    """Checks the settings.
+
+    Raises:
+      ValueError: A filter does not start with '+' or '-', or generated_files
+                  is not a known policy.
+    """
+    _CppLintState().SetFilters(filters)
+    if generated_files not in _GENERATED_FILE_POLICIES:
+      raise ValueError('generated_files must be one of %s' %
+                       ', '.join(_GENERATED_FILE_POLICIES))
+    self.verbose = int(verbose)
+    self.filters = filters
+    self.linelength = int(linelength)
+    self.extensions = extensions
+    self.headers = headers
+    self.root = root
+    self.generated_files = generated_files
+    self.config_files = config_files
+    self.filesystem_lookups = filesystem_lookups
+
+  def _Apply(self):
+    """Sets _cpplint_state and the module globals as the flags would."""
+    global _line_length, _valid_extensions, _hpp_headers, _root
+    global _generated_files
+    _cpplint_state.SetVerboseLevel(self.verbose)
+    _cpplint_state.SetFilters(self.filters)
+    _cpplint_state.SetQuiet(True)
+    _cpplint_state.filesystem_lookups = self.filesystem_lookups
+    _cpplint_state.generated_files = self.generated_files
+    _line_length = self.linelength
+    if self.extensions is not None:
+      _valid_extensions = set(self.extensions)
+    if self.headers is not None:
+      _hpp_headers = set(self.headers)
+      _valid_extensions.update(_hpp_headers)
+    _root = self.root
+    _generated_files = self.generated_files
+
+
+class _DiscardedOutput(object):
+  """Stands for a stream nobody reads."""
+
+  def write(self, text):
+    pass
+
+
+def _LintText(filename, config_files):
+  """Lints the text in _cpplint_state.file_contents for filename.
+
+  Like ProcessFile, but without printing anything.
+  """
+  if (not config_files or
+      ProcessConfigOverrides(filename, _DiscardedOutput())):
+    _LintSourceFile(filename, [])
+
+
+def LintTexts(files, config=None):
+  """Lints source files held in memory and yields the errors found.
+
+  Nothing is printed and, unless config asks for it, nothing is read from
+  disk.  The module is left as it was between files, so the generator can
+  be interleaved with other uses of cpplint.
+
+  Args:
+    files: An iterable of (filename, text) pairs, where text is a unicode
+           string or UTF-8 bytes.  The filename decides the checks as on
+           the command line, through its extension and path.
+    config: A LintConfig; the default one when None.
+
+  Yields:
+    A Finding for each error, file by file in the order of files and in the
+    order found within a file.
+  """
+  if config is None:
+    config = LintConfig()
+  for (filename, text) in files:
+    if not isinstance(text, bytes):
+      text = text.encode('utf8')
+    state = _CppLintState()
+    state.findings = []
+    state.file_contents[filename] = text
+    saved = _SwapState(state)
+    try:
+      config._Apply()
+      _LintText(filename, config.config_files)
+    finally:
+      _RestoreState(saved)
+    for finding in state.findings:
+      yield Finding(*finding)
+
+
+# The errors LintFilesConcurrently found in a file.  error is None, or why
+# the file could not be linted, in which case findings is empty.
+FileFindings = collections.namedtuple('FileFindings',
+                                      ['file', 'findings', 'error'])
+
+# How many files LintFilesConcurrently hands to the pool ahead of the caller
+# by default.
+_MAX_PENDING_FILES = 64
+
+# How long LintFilesConcurrently waits by default for a file handed to the
+# pool before it gives up on it, as it does for a worker that died.
+_FILE_TIMEOUT_SECONDS = 600
+
+# How long LintFilesConcurrently waits for the oldest file at a time before
+# it looks at the others again.
+_POLL_SECONDS = 0.05
+
+
+def _LintFileTask(filename, config):
+  """Reads and lints a file in a worker of LintFilesConcurrently's pool."""
+  try:
+    with open(filename, 'rb') as source:
+      text = source.read()
+  except (IOError, OSError):
+    return FileFindings(filename, [], "Can't open for reading")
+  try:
+    return FileFindings(filename, list(LintTexts([(filename, text)], config)),
+                        None)
+  except Exception:
+    # The pool would drop the exception: apply_async() of Python 2 takes no
+    # error callback.
+    return FileFindings(filename, [], traceback.format_exc())
+
+
+def _TaskFindings(filename, result, timeout):
+  """Returns the FileFindings of a file LintFilesConcurrently handed over.
+
+  Args:
+    filename: The name of the file.
+    result: The AsyncResult of its _LintFileTask, ready unless it timed out.
+    timeout: The seconds it had to finish in.
+  """
+  if not result.ready():
+    return FileFindings(filename, [],
+                        'Not linted within %s seconds' % timeout)
+  try:
+    return result.get()
+  except Exception:
+    # The pool could not hand the task or its result over, as for what
+    # cannot be pickled.
+    return FileFindings(filename, [], traceback.format_exc())
+
+
+def LintFilesConcurrently(filenames, config=None, pool=None,
+                          max_pending=_MAX_PENDING_FILES,
+                          timeout=_FILE_TIMEOUT_SECONDS):
+  """Lints files in a pool of workers and yields their errors as they finish.
+
+  The files are read and linted in the workers, so the caller only waits
+  for the next result.  At most max_pending files are handed to the pool
+  before the caller takes their results, and filenames is consumed no
+  faster than that, so a long run holds a bounded amount of memory.
+
+  Args:
+    filenames: An iterable of the names of the files to lint.
+    config: A LintConfig, as for LintTexts.
+    pool: What lints the files: an object with the apply_async() method of
+          multiprocessing.Pool, such as a multiprocessing.pool.ThreadPool.
+          When None, a multiprocessing.Pool with a process per CPU is
+          started, and terminated once the generator is done.
+    max_pending: How many files may be in the pool at once.
+    timeout: How many seconds a file may take from being handed to the
+             pool, or None to wait for it however long it takes.  A worker
+             that dies loses its file, which only the timeout reports.
+
+  Yields:
+    A FileFindings for each file, in the order the files finish.  The error
+    of a file that could not be linted, or was not linted in time, says why.
+  """
+  own_pool = pool is None
+  if own_pool:
+    pool = multiprocessing.Pool()
+  # The (filename, AsyncResult, deadline) of the files in the pool, oldest
+  # first.
+  pending = []
+  filenames = iter(filenames)
+  try:
+    while True:
+      while filenames is not None and len(pending) < max_pending:
+        filename = next(filenames, None)
+        if filename is None:
+          filenames = None
+        else:
+          pending.append((filename,
+                          pool.apply_async(_LintFileTask, (filename, config)),
+                          None if timeout is None else time.time() + timeout))
+      if not pending:
+        return
+      finished = None
+      while finished is None:
+        now = time.time()
+        for (index, (_, result, deadline)) in enumerate(pending):
+          if result.ready() or (deadline is not None and now >= deadline):
+            finished = index
+            break
+        else:
+          # A wait with a timeout stays interruptible by KeyboardInterrupt.
+          pending[0][1].wait(_POLL_SECONDS)
+      (filename, result, _) = pending.pop(finished)
+      yield _TaskFindings(filename, result, timeout)
+  finally:
+    if own_pool:
+      pool.terminate()
+      pool.join()
+
+
+def PrintUsage(message):
+  """Prints a brief usage string and exits, optionally with an error message.
+
+  Args:
+    message: The optional error message.
+  """
+  sys.stderr.write(_USAGE)
+  if message:
+    sys.exit('\nFATAL ERROR: ' + message)
+  else:
+    sys.exit(1)
+
+
+def PrintCategories():
+  """Prints a list of all the error-categories used by error messages.
+
+  These are the categories used to filter messages via --filter.
+  """
+  sys.stderr.write(''.join('  %s\n' % cat for cat in _ERROR_CATEGORIES))
+  sys.exit(0)
+
+
+def ParseArguments(args):
+  """Parses the command line arguments.
+
+  This may set the output format and verbosity level as side-effects.
+
+  Args:
+    args: The command line arguments:
+
+  Returns:
+    The list of filenames to lint, or with --files-from or
+    --files-from-git an iterator over them, which lists them as it goes.
+  """
+  args = _ExpandResponseFiles(args)
+  try:
+    (opts, filenames) = getopt.getopt(args, '', ['help', 'output=', 'verbose=',
+                                                 'counting=',
+                                                 'filter=',
+                                                 'root=',
                                                  'linelength=',
                                                  'extensions=',
                                                  'headers=',
+                                                 'mmap_threshold=',
+                                                 'stream_threshold=',
+                                                 'long_line_threshold=',
+                                                 'generated_files=',
+                                                 'profile',
+                                                 'regex_stats=',
+                                                 'report-slow=',
+                                                 'profile-output=',
+                                                 'metrics=',
+                                                 'daemon=',
+                                                 'persistent-worker',
+                                                 'lsp',
+                                                 'diff=',
+                                                 'staged',
+                                                 'files-from-git',
+                                                 'files-from=',
                                                  'quiet'])
   except getopt.GetoptError:
     PrintUsage('Invalid arguments.')
@@ -6170,6 +9490,13 @@ def ParseArguments(args):
   filters = ''
   quiet = _Quiet()
   counting_style = ''
+  daemon_socket = None
+  persistent_worker = False
+  lsp = False
+  diff = None
+  staged = False
+  files_from_git = False
+  files_from = None
 
   for (opt, val) in opts:
     if opt == '--help':
@@ -6180,6 +9507,19 @@ def ParseArguments(args):
       output_format = val
     elif opt == '--quiet':
       quiet = True
+    elif opt == '--profile':
+      _cpplint_state.EnableProfile()
+    elif opt == '--regex_stats':
+      _cpplint_state.EnableRegexStats(val)
+    elif opt == '--report-slow':
+      try:
+          _cpplint_state.EnableSlowReport(int(val))
+      except ValueError:
+          PrintUsage('The number of slow files and lines must be digits.')
+    elif opt == '--profile-output':
+      _cpplint_state.EnableProfileOutput(val)
+    elif opt == '--metrics':
+      _cpplint_state.EnableMetrics(val)
     elif opt == '--verbose':
       verbosity = int(val)
     elif opt == '--filter':
@@ -6207,9 +9547,77 @@ def ParseArguments(args):
           PrintUsage('Extensions must be comma separated list.')
     elif opt == '--headers':
       ProcessHppHeadersOption(val)
-
-  if not filenames:
+    elif opt == '--mmap_threshold':
+      global _mmap_threshold
+      try:
+          _mmap_threshold = int(val)
+      except ValueError:
+          PrintUsage('Mmap threshold must be digits.')
+    elif opt == '--stream_threshold':
+      global _stream_threshold
+      try:
+          _stream_threshold = int(val)
+      except ValueError:
+          PrintUsage('Stream threshold must be digits.')
+    elif opt == '--long_line_threshold':
+      global _long_line_threshold
+      try:
+          _long_line_threshold = int(val)
+      except ValueError:
+          PrintUsage('Long line threshold must be digits.')
+    elif opt == '--generated_files':
+      global _generated_files
+      if val not in _GENERATED_FILE_POLICIES:
+        PrintUsage('Generated files must be one of %s.' %
+                   ', '.join(_GENERATED_FILE_POLICIES))
+      _generated_files = val
+    elif opt == '--daemon':
+      daemon_socket = val
+    elif opt == '--persistent-worker':
+      persistent_worker = True
+    elif opt == '--lsp':
+      lsp = True
+    elif opt == '--diff':
+      diff = val
+    elif opt == '--staged':
+      staged = True
+    elif opt == '--files-from-git':
+      files_from_git = True
+    elif opt == '--files-from':
+      files_from = val
+
+  modes = [flag for (flag, given) in (('--daemon', daemon_socket),
+                                      ('--persistent-worker',
+                                       persistent_worker),
+                                      ('--lsp', lsp))
+           if given]
+  if len(modes) > 1:
+    PrintUsage('%s cannot be combined.' % ' and '.join(modes))
+  elif daemon_socket:
+    if filenames:
+      PrintUsage('--daemon takes no files; send them with cpplint_client.py.')
+  elif persistent_worker:
+    if filenames:
+      PrintUsage('--persistent-worker takes no files; send them on stdin.')
+  elif lsp:
+    if filenames:
+      PrintUsage('--lsp takes no files; the editor sends them.')
+  elif files_from_git:
+    if diff or staged:
+      PrintUsage('--files-from-git cannot be combined with --diff or '
+                 '--staged.')
+  elif not filenames and not diff and not staged and not files_from:
     PrintUsage('No files were specified.')
+  if files_from == '-' and (diff == '-' or '-' in filenames):
+    PrintUsage('Only one of --files-from, --diff and the files can be '
+               'stdin.')
+
+  global _daemon_socket
+  global _persistent_worker
+  global _lsp
+  _daemon_socket = daemon_socket
+  _persistent_worker = persistent_worker
+  _lsp = lsp
 
   _SetOutputFormat(output_format)
   _SetQuiet(quiet)
@@ -6217,11 +9625,750 @@ def ParseArguments(args):
   _SetFilters(filters)
   _SetCountingStyle(counting_style)
 
+  if files_from == '-':
+    filenames = itertools.chain(
+        filenames, _ReadFileList(getattr(sys.stdin, 'buffer', sys.stdin),
+                                 False))
+  elif files_from:
+    try:
+      file_list = open(files_from, 'rb')
+    except (IOError, OSError):
+      PrintUsage('Cannot read the list of files %s.' % files_from)
+    filenames = itertools.chain(filenames, _ReadFileList(file_list, True))
+  if files_from and (staged or diff or files_from_git):
+    filenames = list(filenames)
+
+  if staged or diff:
+    if diff and diff != '-':
+      _CheckWorkTree('diff %s' % diff)
+    elif staged:
+      _CheckWorkTree('diff --cached')
+    if staged:
+      staged_files = _StagedFiles()
+      _cpplint_state.file_contents = staged_files
+      names = list(staged_files)
+    if diff:
+      _cpplint_state.changed_lines = ParseUnifiedDiff(_ReadDiff(diff, staged))
+      names = [name for name in _cpplint_state.changed_lines
+               if not staged or name in staged_files]
+    if filenames:
+      given = set(os.path.normpath(filename) for filename in filenames)
+      names = [name for name in names if os.path.normpath(name) in given]
+    filenames = sorted(name for name in names
+                       if name[name.rfind('.') + 1:] in _valid_extensions)
+  elif files_from_git:
+    filenames = _TrackedFiles(filenames)
+
   return filenames
 
 
+def _LintFiles(filenames):
+  """Lints files with the flags set by ParseArguments and prints the reports.
+
+  Args:
+    filenames: The files to lint.
+
+  Returns:
+    The exit status: 1 if errors were found, 0 otherwise.
+  """
+  _cpplint_state.ResetErrorCounts()
+  try:
+    for filename in filenames:
+      ProcessFile(filename, _cpplint_state.verbose_level)
+  finally:
+    if isinstance(_cpplint_state.file_contents, _StagedFiles):
+      _cpplint_state.file_contents.Close()
+  # If --quiet is passed, suppress printing error count unless there are errors.
+  if not _cpplint_state.quiet or _cpplint_state.error_count > 0:
+    _cpplint_state.PrintErrorCounts()
+  if _cpplint_state.profile:
+    _cpplint_state.profile.PrintReport()
+  if _cpplint_state.regex_stats:
+    _cpplint_state.regex_stats.WriteJson(_cpplint_state.regex_stats_path)
+  if _cpplint_state.slow_report:
+    _cpplint_state.slow_report.PrintReport()
+  if _cpplint_state.profile_output:
+    _cpplint_state.profile_output.Write(_cpplint_state.profile_output_path)
+  if _cpplint_state.metrics:
+    _cpplint_state.metrics.Write(_cpplint_state.metrics_path)
+
+  return int(_cpplint_state.error_count > 0)
+
+
+# The module globals that flags, CPPLINT.cfg files and NOLINT comments set.
+# _RunIsolated puts them back after each run.
+_ISOLATED_GLOBALS = ('_root', '_line_length', '_valid_extensions',
+                     '_hpp_headers', '_mmap_threshold', '_stream_threshold',
+                     '_long_line_threshold', '_generated_files',
+                     '_daemon_socket', '_persistent_worker', '_lsp',
+                     '_error_suppressions', '_global_error_suppressions')
+
+
+# Held from _SwapState to _RestoreState, so that threads, such as the ones
+# of a pool given to LintFilesConcurrently, take turns with the module.
+_state_lock = threading.RLock()
+
+
+def _SwapState(state):
+  """Makes state the _CppLintState and saves the module globals.
+
+  Waits for other threads to restore theirs first.
+
+  Args:
+    state: The _CppLintState to use from now on.
+
+  Returns:
+    What _RestoreState needs to put everything back.
+  """
+  global _cpplint_state
+  _state_lock.acquire()
+  try:
+    module_globals = globals()
+    saved = (_cpplint_state, dict((name, copy.copy(module_globals[name]))
+                                  for name in _ISOLATED_GLOBALS))
+  except BaseException:
+    _state_lock.release()
+    raise
+  _cpplint_state = state
+  return saved
+
+
+def _RestoreState(saved):
+  """Puts back the _CppLintState and module globals saved by _SwapState."""
+  global _cpplint_state
+  try:
+    (_cpplint_state, saved_globals) = saved
+    globals().update(saved_globals)
+  finally:
+    _state_lock.release()
+
+
+def _RunIsolated(state, run, cwd, stdin, stdout, stderr):
+  """Calls a function as if it were the main() of a cpplint process of its own.
+
+  For the call, _cpplint_state is replaced by state and the standard streams
+  and working directory by the ones given.  Afterwards they, and the module
+  globals in _ISOLATED_GLOBALS, are put back and the recorders started
+  during the call are stopped, so that nothing leaks into the next run.
+  The caches of the module, such as _regexp_compile_cache,
+  _config_file_cache and _vcs_directory_cache, are kept warm.
+
+  Args:
+    state: The _CppLintState for the run, which the caller can read after.
+    run: A function without arguments that returns the exit status, or
+         calls sys.exit() with it.
+    cwd: The directory to run in.
+    stdin: The file to use as sys.stdin.
+    stdout: The file to use as sys.stdout.
+    stderr: The file to use as sys.stderr.
+
+  Returns:
+    The exit status, as a process would have exited with.
+  """
+  saved_streams = (sys.stdin, sys.stdout, sys.stderr)
+  saved_cwd = os.getcwd()
+
+  saved_state = _SwapState(state)
+  try:
+    (sys.stdin, sys.stdout, sys.stderr) = (stdin, stdout, stderr)
+    os.chdir(cwd)
+    return run()
+  except SystemExit as e:
+    # Like the interpreter, print a message given to sys.exit().
+    if e.code is None:
+      return 0
+    if isinstance(e.code, int):
+      return e.code
+    sys.stderr.write('%s\n' % e.code)
+    return 1
+  except Exception:
+    sys.stderr.write(traceback.format_exc())
+    return 1
+  finally:
+    state.StopRecorders()
+    _RestoreState(saved_state)
+    (sys.stdin, sys.stdout, sys.stderr) = saved_streams
+    os.chdir(saved_cwd)
+
+
+def _EncodeArguments(args):
+  """Returns decoded JSON strings as the arguments main() would get."""
+  if bytes is str:  # Python 2 takes arguments as byte strings.
+    return [arg.encode('utf8') for arg in args]
+  return list(args)
+
+
+def _CheckRequest(request, required=(), strings=(), string_lists=(),
+                  string_objects=()):
+  """Checks the fields of a decoded JSON request before they are used.
+
+  Args:
+    request: The decoded request.
+    required: The names of the fields it must have.
+    strings: The names of the fields that must be strings where present.
+    string_lists: The names of the fields that must be lists of strings.
+    string_objects: The names of the fields that must be objects whose
+                    values are strings.
+
+  Raises:
+    ValueError: The request is not a JSON object, or a field is missing or
+                of another type.
+  """
+  text = type(u'')
+  if not isinstance(request, dict):
+    raise ValueError('A request must be a JSON object.')
+  for name in required:
+    if name not in request:
+      raise ValueError('A request must have "%s".' % name)
+  for name in strings:
+    if name in request and not isinstance(request[name], text):
+      raise ValueError('"%s" must be a string.' % name)
+  for name in string_lists:
+    if name in request and not (
+        isinstance(request[name], list) and
+        all(isinstance(item, text) for item in request[name])):
+      raise ValueError('"%s" must be a list of strings.' % name)
+  for name in string_objects:
+    if name in request and not (
+        isinstance(request[name], dict) and
+        all(isinstance(value, text) for value in request[name].values())):
+      raise ValueError('"%s" must be an object of strings.' % name)
+
+
+# How long _LintDaemon waits for the request of a client that connected.
+_DAEMON_REQUEST_TIMEOUT_SECONDS = 10
+
+
+class _DaemonOutput(object):
+  """Stands for stdout or stderr while _LintDaemon serves a request.
+
+  Each write is sent to the client at once as a JSON line {name: text},
+  where name is "stdout" or "stderr".
+  """
+
+  def __init__(self, writer, name):
+    self._writer = writer
+    self._name = name
+
+  def write(self, text):
+    if isinstance(text, bytes):
+      text = text.decode('utf8', 'replace')
+    self._writer.write(json.dumps({self._name: text}).encode('ascii') + b'\n')
+
+  def flush(self):
+    self._writer.flush()
+
+
+class _LintDaemon(object):
+  """Lints the files of the requests sent to a Unix socket, one at a time.
+
+  A request is a JSON line with the "argv" to run cpplint with and the "cwd"
+  to run it in.  When a file is "-", the bytes to lint are sent as the
+  Latin-1 string "stdin".  The reply is a JSON line {"stdout": text} or
+  {"stderr": text} for each write to those streams, and then
+  {"exit": status}.
+
+  Each request is run by _RunIsolated with a new _CppLintState, so flags
+  and CPPLINT.cfg options do not leak from one request to the next, while
+  the caches of the module are kept warm.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.socket.bind(path)
+    self.socket.listen(5)
+
+  def ServeForever(self):
+    """Serves requests until the process is interrupted."""
+    while True:
+      connection, _ = self.socket.accept()
+      self.Serve(connection)
+
+  def Serve(self, connection):
+    """Answers the request sent on a connection, then closes it.
+
+    A malformed request is answered with its problem on stderr and exit
+    status 1.  Nothing a client sends or fails to send stops the daemon.
+    """
+    # A client that sends nothing is given up on instead of blocking the
+    # clients after it.
+    connection.settimeout(_DAEMON_REQUEST_TIMEOUT_SECONDS)
+    reader = connection.makefile('rb')
+    writer = connection.makefile('wb')
+    try:
+      try:
+        request = json.loads(reader.readline().decode('utf8'))
+        _CheckRequest(request, required=('argv', 'cwd'),
+                      strings=('cwd', 'stdin'), string_lists=('argv',))
+        stdin = request.get('stdin', u'').encode('latin-1')
+      except ValueError as e:
+        _DaemonOutput(writer, 'stderr').write(u'%s\n' % e)
+        status = 1
+      else:
+        status = self._Lint(request, stdin, writer)
+      writer.write(json.dumps({'exit': status}).encode('ascii') + b'\n')
+      writer.flush()
+    except socket.error:
+      pass  # The client went away, or sent nothing in time.
+    except Exception:
+      sys.stderr.write(traceback.format_exc())
+    finally:
+      for stream in (reader, writer, connection):
+        try:
+          stream.close()
+        except socket.error:
+          pass
+
+  def _Lint(self, request, stdin, writer):
+    """Runs cpplint as asked by a request, sending its output to writer.
+
+    Args:
+      request: The decoded request, checked by _CheckRequest.
+      stdin: The bytes of a file named "-".
+      writer: The file to write the JSON lines of the reply to.
+
+    Returns:
+      The exit status of the run.
+    """
+    args = _EncodeArguments(request['argv'])
+    return _RunIsolated(
+        _CppLintState(), lambda: _LintFiles(ParseArguments(args)),
+        request['cwd'], io.BytesIO(stdin),
+        _DaemonOutput(writer, 'stdout'), _DaemonOutput(writer, 'stderr'))
+
+  def Close(self):
+    """Stops listening and removes the socket file."""
+    self.socket.close()
+    try:
+      os.remove(self.path)
+    except OSError:
+      pass
+
+
+def RunDaemon(path):
+  """Serves the requests of cpplint_client.py on a Unix socket until stopped.
+
+  Args:
+    path: The path of the socket.  A socket left behind by a daemon that was
+          killed is replaced.
+  """
+  if not hasattr(socket, 'AF_UNIX'):
+    PrintUsage('--daemon needs Unix sockets, which this platform lacks.')
+  if os.path.exists(path):
+    if not stat.S_ISSOCK(os.stat(path).st_mode):
+      PrintUsage('%s exists and is not a socket.' % path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      probe.connect(path)
+    except socket.error:
+      os.remove(path)
+    else:
+      PrintUsage('A daemon already listens on %s.' % path)
+    finally:
+      probe.close()
+
+  daemon = _LintDaemon(path)
+  # Leave through SystemExit on SIGTERM, so that the socket is removed.
+  signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+  try:
+    daemon.ServeForever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    daemon.Close()
+
+
+class _CapturedOutput(object):
+  """Stands for stdout or stderr while the persistent worker runs a request."""
+
+  def __init__(self):
+    self._parts = []
+
+  def write(self, text):
+    if isinstance(text, bytes):
+      text = text.decode('utf8', 'replace')
+    self._parts.append(text)
+
+  def flush(self):
+    pass
+
+  def getvalue(self):
+    return u''.join(self._parts)
+
+
+def _AnswerWorkerRequest(request):
+  """Lints as asked by a --persistent-worker request.
+
+  Args:
+    request: The decoded request.
+
+  Returns:
+    The response, ready to be encoded as JSON.
+  """
+  start = _ProfileTimer()
+  args = _EncodeArguments(request.get('flags', []) + request.get('files', []))
+  state = _CppLintState()
+  state.findings = []
+  for filename, text in request.get('contents', {}).items():
+    state.file_contents[_EncodeArguments([filename])[0]] = text.encode('utf8')
+  stdout = _CapturedOutput()
+  stderr = _CapturedOutput()
+  status = _RunIsolated(
+      state, lambda: _LintFiles(ParseArguments(args)),
+      request.get('cwd', os.getcwd()), io.BytesIO(), stdout, stderr)
+  return {
+      'id': request.get('id'),
+      'exit': status,
+      'errors': [{'file': filename, 'line': linenum, 'category': category,
+                  'confidence': confidence, 'message': message}
+                 for (filename, linenum, category, confidence, message)
+                 in state.findings],
+      'error_count': state.error_count,
+      'errors_by_category': state.errors_by_category,
+      'stdout': stdout.getvalue(),
+      'stderr': stderr.getvalue(),
+      'seconds': _ProfileTimer() - start,
+  }
+
+
+def RunPersistentWorker(requests, responses):
+  """Answers the JSON requests read from a file, one per line, in order.
+
+  Each request is run by _RunIsolated, see _AnswerWorkerRequest, and its
+  response is written as a JSON line and flushed before the next request is
+  read.  A line that is not a JSON object, or whose fields are not of the
+  types described in the usage, gets a response with exit status 1 and the
+  reason on "stderr".
+
+  Args:
+    requests: The file to read the requests from, until its end.
+    responses: The file to write the responses to.
+  """
+  while True:
+    # readline(), as iterating over a Python 2 file reads ahead and blocks.
+    line = requests.readline()
+    if not line:
+      break
+    if not line.strip():
+      continue
+    request = None
+    try:
+      request = json.loads(line)
+      _CheckRequest(request, strings=('cwd',),
+                    string_lists=('flags', 'files'),
+                    string_objects=('contents',))
+    except ValueError as e:
+      request_id = request.get('id') if isinstance(request, dict) else None
+      response = {'id': request_id, 'exit': 1, 'stderr': u'%s\n' % e}
+    else:
+      response = _AnswerWorkerRequest(request)
+    responses.write(json.dumps(response) + '\n')
+    responses.flush()
+
+
+# How long the language server waits after a change to a document before
+# linting it, so that a burst of keystrokes is linted once.
+_LSP_DEBOUNCE_SECONDS = 0.3
+
+# The LSP DiagnosticSeverity of every cpplint error.
+_LSP_WARNING = 2
+
+# The LSP MessageType of the output of cpplint other than errors.
+_LSP_INFO = 3
+
+
+def _ReadLspMessage(reader):
+  """Reads a message of the Language Server Protocol.
+
+  Args:
+    reader: The file to read from.
+
+  Returns:
+    The decoded JSON-RPC message, or None at the end of the file.
+
+  Raises:
+    ValueError: The message is not valid JSON.
+  """
+  length = None
+  while True:
+    line = reader.readline()
+    if not line:
+      return None
+    line = line.strip()
+    if not line:
+      if length is not None:
+        break
+      continue
+    (name, _, value) = line.partition(b':')
+    if name.strip().lower() == b'content-length':
+      length = int(value)
+  return json.loads(reader.read(length).decode('utf8'))
+
+
+def _FileUriToPath(uri):
+  """Returns the path of a file: URI, or the URI itself for other schemes."""
+  if not uri.startswith('file://'):
+    return uri
+  path = uri[len('file://'):]
+  if bytes is str:  # Python 2 unquotes bytes to bytes.
+    path = unquote(path.encode('utf8')).decode('utf8')
+  else:
+    path = unquote(path)
+  if Match(r'^/[A-Za-z]:', path):
+    path = path[1:]  # file:///C:/a.cc on Windows.
+  return path
+
+
+class _LspDocument(object):
+  """A document open in the editor of the language server."""
+
+  def __init__(self, uri):
+    self.uri = uri
+    self.path = _EncodeArguments([_FileUriToPath(uri)])[0]
+    self.text = u''
+    # The version the editor gave the text.
+    self.version = None
+    # How many times the text was set, and the count it was last linted at.
+    self.revision = 0
+    self.linted_revision = 0
+    # When to lint the text, as a time.time().
+    self.due = 0
+    # See _CppLintState.incremental_linters.
+    self.linters = {}
+
+
+class _LanguageServer(object):
+  """Publishes the errors of the documents open in an editor as diagnostics.
+
+  The main thread reads the messages of the editor and answers its requests.
+  A worker thread lints the documents one at a time: on open at once, and
+  on change once no other change has come for the debounce time.  A lint is
+  abandoned as soon as its document changes again.
+
+  Each lint is run by _RunIsolated with the flags the server was started
+  with, so that CPPLINT.cfg files apply as on the command line while the
+  caches of the module stay warm.  Each document keeps an IncrementalLinter,
+  so that after an edit only the lines near it are checked again.
+  """
+
+  def __init__(self, flags, reader, writer, debounce):
+    self._flags = flags
+    self._reader = reader
+    self._writer = writer
+    self._debounce = debounce
+    self._cwd = os.getcwd()
+    self._documents = {}
+    # Guards the documents and the writer.
+    self._condition = threading.Condition()
+    self._stopping = False
+    self._shutdown = False
+
+  def Serve(self):
+    """Serves the editor until it sends exit or closes the input.
+
+    Returns:
+      The exit status: 0 if the editor asked to shut down first, 1 otherwise.
+    """
+    worker = threading.Thread(target=self._LintDocuments)
+    worker.daemon = True
+    worker.start()
+    try:
+      while True:
+        try:
+          message = _ReadLspMessage(self._reader)
+        except ValueError:
+          self._Send({'id': None,
+                      'error': {'code': -32700, 'message': 'Parse error'}})
+          continue
+        if message is None or (isinstance(message, dict) and
+                               message.get('method') == 'exit'):
+          break
+        if not isinstance(message, dict):
+          self._Send({'id': None,
+                      'error': {'code': -32600, 'message': 'Invalid request'}})
+          continue
+        try:
+          self._Handle(message)
+        except (KeyError, TypeError, AttributeError):
+          if 'id' in message:
+            self._Send({'id': message['id'],
+                        'error': {'code': -32602,
+                                  'message': 'Invalid params'}})
+    finally:
+      with self._condition:
+        self._stopping = True
+        self._condition.notify()
+      worker.join()
+    return 0 if self._shutdown else 1
+
+  def _Handle(self, message):
+    """Acts on a request or notification of the editor."""
+    method = message.get('method')
+    params = message.get('params') or {}
+    if method is None:
+      return  # A response; the server sends no requests.
+    if method == 'initialize':
+      self._Send({'id': message['id'], 'result': {
+          'capabilities': {'textDocumentSync': {'openClose': True,
+                                                'change': 1}},
+          'serverInfo': {'name': 'cpplint'}}})
+    elif method == 'shutdown':
+      self._shutdown = True
+      self._Send({'id': message['id'], 'result': None})
+    elif method == 'textDocument/didOpen':
+      document = params['textDocument']
+      self._SetText(document['uri'], document.get('version'),
+                    document['text'], 0)
+    elif method == 'textDocument/didChange':
+      # The server asks for the whole text on every change.
+      changes = params['contentChanges']
+      if changes:
+        document = params['textDocument']
+        self._SetText(document['uri'], document.get('version'),
+                      changes[-1]['text'], self._debounce)
+    elif method == 'textDocument/didClose':
+      uri = params['textDocument']['uri']
+      with self._condition:
+        if self._documents.pop(uri, None):
+          self._Publish(uri, None, [])
+    elif 'id' in message:
+      self._Send({'id': message['id'],
+                  'error': {'code': -32601,
+                            'message': 'Method not found: %s' % method}})
+
+  def _SetText(self, uri, version, text, delay):
+    """Sets the text of a document and when to lint it."""
+    with self._condition:
+      document = self._documents.get(uri)
+      if document is None:
+        document = self._documents[uri] = _LspDocument(uri)
+      document.text = text
+      document.version = version
+      document.revision += 1
+      document.due = time.time() + delay
+      self._condition.notify()
+
+  def _NextDocument(self):
+    """Waits until a document is due to be linted, with the lock held.
+
+    Returns:
+      The document, or None once the server is stopping.
+    """
+    while not self._stopping:
+      pending = [document for document in self._documents.values()
+                 if document.linted_revision != document.revision]
+      if not pending:
+        self._condition.wait()
+        continue
+      document = min(pending, key=lambda document: document.due)
+      delay = document.due - time.time()
+      if delay <= 0:
+        return document
+      self._condition.wait(delay)
+    return None
+
+  def _LintDocuments(self):
+    """Lints the documents as they become due, until the server stops."""
+    while True:
+      with self._condition:
+        document = self._NextDocument()
+        if document is None:
+          return
+        (revision, text) = (document.revision, document.text)
+      diagnostics = self._Lint(document, revision, text)
+      with self._condition:
+        if (diagnostics is not None and document.revision == revision and
+            self._documents.get(document.uri) is document):
+          document.linted_revision = revision
+          self._Publish(document.uri, document.version, diagnostics)
+
+  def _Lint(self, document, revision, text):
+    """Lints a revision of a document.
+
+    Returns:
+      The diagnostics, or None if the document changed in the meantime.
+    """
+    state = _CppLintState()
+    state.findings = []
+    state.file_contents[document.path] = text.encode('utf8')
+    state.incremental_linters = document.linters
+    state.cancelled = lambda: self._stopping or document.revision != revision
+    stderr = _CapturedOutput()
+
+    def Run():
+      try:
+        return _LintFiles(ParseArguments(self._flags + [document.path]))
+      except LintCancelled:
+        return 1
+
+    _RunIsolated(state, Run, self._cwd, io.BytesIO(), _CapturedOutput(),
+                 stderr)
+    if state.cancelled():
+      return None
+    if stderr.getvalue():
+      self._Send({'method': 'window/logMessage',
+                  'params': {'type': _LSP_INFO, 'message': stderr.getvalue()}})
+    diagnostics = []
+    for (_, linenum, category, confidence, message) in state.findings:
+      line = max(linenum - 1, 0)
+      diagnostics.append({
+          'range': {'start': {'line': line, 'character': 0},
+                    'end': {'line': line + 1, 'character': 0}},
+          'severity': _LSP_WARNING,
+          'source': 'cpplint',
+          'code': category,
+          'message': message,
+          'data': {'confidence': confidence}})
+    return diagnostics
+
+  def _Publish(self, uri, version, diagnostics):
+    """Sends the diagnostics of a document."""
+    params = {'uri': uri, 'diagnostics': diagnostics}
+    if version is not None:
+      params['version'] = version
+    self._Send({'method': 'textDocument/publishDiagnostics',
+                'params': params})
+
+  def _Send(self, message):
+    """Sends a JSON-RPC message to the editor."""
+    message['jsonrpc'] = '2.0'
+    body = json.dumps(message).encode('ascii')
+    with self._condition:
+      self._writer.write(
+          ('Content-Length: %d\r\n\r\n' % len(body)).encode('ascii') + body)
+      self._writer.flush()
+
+
+def RunLanguageServer(flags, reader, writer,
+                      debounce=_LSP_DEBOUNCE_SECONDS):
+  """Serves the Language Server Protocol until the editor exits.
+
+  Args:
+    flags: The command line flags to lint each document with.
+    reader: The file to read the messages of the editor from.
+    writer: The file to write the messages to the editor to.
+    debounce: How many seconds to wait after a change before linting.
+
+  Returns:
+    The exit status.
+  """
+  return _LanguageServer(flags, reader, writer, debounce).Serve()
+
+
 def main():
   filenames = ParseArguments(sys.argv[1:])
+  if _daemon_socket:
+    RunDaemon(_daemon_socket)
+    sys.exit(0)
+  if _persistent_worker:
+    RunPersistentWorker(sys.stdin, sys.stdout)
+    sys.exit(0)
+  if _lsp:
+    sys.exit(RunLanguageServer(
+        [arg for arg in sys.argv[1:] if arg != '--lsp'],
+        getattr(sys.stdin, 'buffer', sys.stdin),
+        getattr(sys.stdout, 'buffer', sys.stdout)))
 
   # Change stderr to write with replacement characters so we don't die
   # if we try to print something containing non-ASCII characters.
@@ -6230,14 +10377,7 @@ def main():
                                          codecs.getwriter('utf8'),
                                          'replace')
 
-  _cpplint_state.ResetErrorCounts()
-  for filename in filenames:
-    ProcessFile(filename, _cpplint_state.verbose_level)
-  # If --quiet is passed, suppress printing error count unless there are errors.
-  if not _cpplint_state.quiet or _cpplint_state.error_count > 0:
-    _cpplint_state.PrintErrorCounts()
-
-  sys.exit(_cpplint_state.error_count > 0)
+  sys.exit(_LintFiles(filenames))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,906 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2009 Google Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmarks cpplint.py over a synthetic C++ corpus.
+
+The corpus is generated from a seed, so two runs with the same seed and
+sizes lint exactly the same sources.  Each size is a set of .cc and .h files
+of a given length made of namespaces, classes, templates, macros, #if
+ladders, raw strings and long comment blocks, with a few style errors mixed
+in so that the error paths run too.  The files are linted in memory with
+ProcessFileData and an error function that discards everything.
+
+With --checks, each per-line check is instead timed alone over the lines of
+a fixed corpus, so that work on one check can be measured without the noise
+of the others.
+
+With --regex_fuzz, each regexp that cpplint uses is instead timed on
+adversarial lines of growing length, to find the ones that backtrack in
+superlinear time.
+
+Usage:
+
+  cpplint_benchmark.py [--seed=#] [--lines=#] [--repeat=#] [--sizes=x,y,...]
+                       [--checks=all|x,y,...] [--regex_fuzz] [--max_length=#]
+                       [--json=file] [--compare=file] [--tolerance=fraction]
+
+  Flags:
+
+    seed=#
+      The seed of the corpus generator.  Defaults to 1.
+
+    lines=#
+      About how many lines each size lints in total.  Defaults to 20000.
+
+    repeat=#
+      How many times each size is linted; the fastest run is reported.
+      Defaults to 3.
+
+    sizes=x,y,...
+      The sizes to run, out of small, medium and large.  Defaults to all.
+
+    checks=all|x,y,...
+      Time the named per-line checks, e.g. CheckSpacing,CheckCasts, or all
+      of them, each alone over the same corpus of medium-sized files,
+      instead of linting the sizes.  Each check is given CleansedLines
+      prepared beforehand and a NestingState updated outside of the timing,
+      and the time per call is reported.
+
+    regex_fuzz
+      Time every regexp of cpplint, including the patterns the checks pass
+      to Match and Search, on lines made of runs of one token, such as
+      spaces, "a::" or "/*", and on random lines, of growing length.  The
+      exponent of the time as a function of the length and the time at the
+      longest length are reported for the input that is slowest for each
+      regexp, slowest regexps first.  --lines is not used.
+
+    max_length=#
+      The length of the longest lines of --regex_fuzz.  They are also run
+      at an eighth, a quarter and half of it.  Defaults to 1000.
+
+    json=file
+      Also write the results as JSON to file, or to stdout if file is "-".
+
+    compare=file
+      Compare the lines per second of each size, the time per call of each
+      check, or the time at the longest length of each regexp that takes a
+      millisecond or more, with those of a file that an earlier run wrote
+      with --json, and exit with status 1 if any got slower by more than the
+      tolerance.
+
+    tolerance=fraction
+      The slowdown that --compare accepts.  Defaults to 0.1, i.e. 10%.
+"""
+
+import getopt
+import inspect
+import json
+import math
+import platform
+import random
+import re
+import sys
+import time
+
+import cpplint
+
+try:
+  import resource
+except ImportError:
+  resource = None  # Not available on Windows.
+
+try:
+  xrange          # Python 2
+except NameError:
+  xrange = range  # Python 3
+
+
+# The sizes of the corpus, as (name, lines per file).
+_SIZES = (('small', 100), ('medium', 1000), ('large', 10000))
+
+_WORDS = ('value', 'count', 'buffer', 'index', 'state', 'result', 'handle',
+          'offset', 'length', 'config', 'entry', 'node', 'name', 'data')
+
+_TYPES = ('int', 'int64', 'double', 'bool', 'std::string', 'size_t',
+          'std::vector<int>', 'const char*')
+
+_Timer = getattr(time, 'perf_counter', time.time)
+
+# What the parameters of a per-line check are bound to when it is timed
+# alone; "line" is the line number unless the check also takes "linenum".
+_CHECK_PARAMETERS = frozenset(['filename', 'file_extension', 'clean_lines',
+                               'linenum', 'line', 'nesting_state',
+                               'include_state', 'function_state', 'error'])
+
+# The lines per file of the corpus the checks are timed on.
+_CHECKS_LINES_PER_FILE = dict(_SIZES)['medium']
+
+# The lines that --regex_fuzz runs each regexp on, as (name, unit); a line
+# of an input repeats its unit, or draws from _FUZZ_MIXED_CHARACTERS if the
+# unit is None.  Runs of one token are what make nested or adjacent
+# quantifiers backtrack.
+_FUZZ_INPUTS = (('identifier', 'a'), ('space', ' '), ('comment', '/*'),
+                ('star', '*'), ('paren', '('), ('angle', '<'),
+                ('comma', 'a, '), ('raw_string', 'R"('), ('slash', '//'),
+                ('quote', '"a\\'), ('scope', 'a::'), ('assign', 'x = '),
+                ('colon', ':'), ('mixed', None))
+
+_FUZZ_MIXED_CHARACTERS = 'ab (){}<>*/&;:,"\'\\=+-!# '
+
+# --regex_fuzz stops growing a line once a regexp takes this many seconds.
+_FUZZ_TIME_LIMIT = 0.05
+
+# --compare leaves out the regexps that take less than this many seconds at
+# the longest length in both runs, since their times are mostly noise.
+_FUZZ_COMPARED_SECONDS = 0.001
+
+# The size of the corpus linted to find the patterns passed to Match,
+# Search and ReplaceAll.
+_FUZZ_CORPUS_LINES = 2000
+
+
+def _Name(rng, capitalize=False):
+  """Returns a made-up identifier of two words."""
+  first, second = rng.choice(_WORDS), rng.choice(_WORDS)
+  if capitalize:
+    return first.capitalize() + second.capitalize()
+  return first + '_' + second
+
+
+def _CommentBlock(rng, indent=''):
+  """Returns a block of line comments or a C-style comment."""
+  num_lines = rng.randint(3, 30)
+  words = [' '.join(rng.choice(_WORDS) for _ in xrange(rng.randint(4, 10)))
+           for _ in xrange(num_lines)]
+  if rng.random() < 0.3:
+    return ([indent + '/*'] + [indent + ' * ' + text for text in words] +
+            [indent + ' */'])
+  return [indent + '// ' + text for text in words]
+
+
+def _Macro(rng):
+  """Returns a function-like macro with continuation lines."""
+  name = _Name(rng).upper()
+  return ['#define %s(x) \\' % name,
+          '  do { \\',
+          '    if ((x) > %d) { \\' % rng.randint(0, 100),
+          '      LOG(ERROR) << "%s " << (x); \\' % name.lower(),
+          '    } \\',
+          '  } while (0)',
+          '']
+
+
+def _IfLadder(body):
+  """Returns an #if/#elif/#else ladder, each branch holding body lines."""
+  lines = []
+  for (i, platform_name) in enumerate(('OS_LINUX', 'OS_WIN', 'OS_MACOSX')):
+    lines.append('%s defined(%s)' % ('#if' if i == 0 else '#elif',
+                                     platform_name))
+    lines.extend(body)
+  lines.append('#else')
+  lines.extend(body)
+  lines.append('#endif  // defined(OS_LINUX)')
+  lines.append('')
+  return lines
+
+
+def _RawString(rng):
+  """Returns a constant initialized from a multi-line raw string."""
+  lines = ['const char k%sText[] = R"delim(' % _Name(rng, True)]
+  for _ in xrange(rng.randint(2, 8)):
+    lines.append('  "%s": %d, // not a comment (' % (rng.choice(_WORDS),
+                                                     rng.randint(0, 9)))
+  lines.append(')delim";')
+  lines.append('')
+  return lines
+
+
+def _Class(rng):
+  """Returns the declaration of a class with a few members."""
+  name = _Name(rng, True)
+  lines = ['class %s : public %sBase {' % (name, name),
+           ' public:',
+           '  explicit %s(int %s);' % (name, _Name(rng)),
+           '  virtual ~%s();' % name,
+           '']
+  for _ in xrange(rng.randint(2, 6)):
+    lines.append('  %s %s(const std::string& %s) const;' %
+                 (rng.choice(_TYPES), _Name(rng, True), _Name(rng)))
+  if rng.random() < 0.2:
+    lines.append('  %s(int x);  // Not explicit.' % name)
+  lines.extend(['',
+                ' private:'])
+  for _ in xrange(rng.randint(1, 4)):
+    lines.append('  %s %s_;' % (rng.choice(_TYPES), _Name(rng)))
+  lines.extend(['',
+                '  DISALLOW_COPY_AND_ASSIGN(%s);' % name,
+                '};',
+                ''])
+  return lines
+
+
+def _Template(rng):
+  """Returns a class template and a function template."""
+  name = _Name(rng, True)
+  return ['template <typename T, int N = %d>' % rng.randint(1, 64),
+          'class %s {' % name,
+          ' public:',
+          '  const T& Get(int i) const { return values_[i % N]; }',
+          '  void Set(int i, const T& value) { values_[i % N] = value; }',
+          '',
+          ' private:',
+          '  T values_[N];',
+          '};',
+          '',
+          'template <typename T>',
+          'std::map<std::string, std::vector<T> > Make%s(' % name,
+          '    const std::vector<std::pair<std::string, T> >& pairs) {',
+          '  std::map<std::string, std::vector<T> > result;',
+          '  for (const auto& pair : pairs) {',
+          '    result[pair.first].push_back(pair.second);',
+          '  }',
+          '  return result;',
+          '}',
+          '']
+
+
+def _Function(rng):
+  """Returns a function definition with loops, branches and casts."""
+  name = _Name(rng, True)
+  arg = _Name(rng)
+  lines = ['int %s(int %s, const std::vector<int>& items) {' % (name, arg),
+           '  int total = 0;',
+           '  for (size_t i = 0; i < items.size(); ++i) {',
+           '    if (items[i] > %s) {' % arg,
+           '      total += static_cast<int>(items[i] * 2);',
+           '    } else if (items[i] == 0) {',
+           '      continue;',
+           '    } else {',
+           '      total -= items[i];',
+           '    }',
+           '  }']
+  roll = rng.random()
+  if roll < 0.1:
+    lines.append('  int x=(int)total;')  # Spacing and a C-style cast.
+  elif roll < 0.2:
+    lines.append('  char buffer[256]; sprintf(buffer, "%d", total);')
+  elif roll < 0.3:
+    lines.append('  if(total) total = 0 ;  ')
+  lines.extend(['  std::string message = StringPrintf("%s: %%d", total);' %
+                name,
+                '  while (total > 1000) total /= 2;',
+                '  return total;',
+                '}',
+                ''])
+  return lines
+
+
+# The pieces a file is made of, with the relative weight of each.
+_PIECES = ((_CommentBlock, 2), (_Macro, 1), (_RawString, 1), (_Class, 3),
+           (_Template, 2), (_Function, 5))
+
+
+def GenerateSource(rng, path, num_lines, is_header):
+  """Generates the lines of a C++ source file.
+
+  Args:
+    rng: The random.Random to draw from.
+    path: The name of the file, which decides its header guard.
+    num_lines: About how many lines to generate; the result may be a few
+               lines longer.
+    is_header: Whether to generate a header, with a header guard, rather than
+               a .cc file.
+
+  Returns:
+    The lines, with the last one empty as if the file ended in a newline.
+  """
+  guard = path.upper().replace('/', '_').replace('.', '_') + '_'
+  lines = ['// Copyright 2014 Google Inc. All Rights Reserved.',
+           '']
+  if is_header:
+    lines.extend(['#ifndef ' + guard,
+                  '#define ' + guard,
+                  ''])
+  else:
+    lines.extend(['#include "%s.h"' % path[:-len('.cc')],
+                  ''])
+  lines.extend(['#include <map>',
+                '#include <string>',
+                '#include <utility>',
+                '#include <vector>',
+                '',
+                '#include "base/logging.h"',
+                '',
+                'namespace %s {' % rng.choice(_WORDS),
+                ''])
+  pieces = [piece for (piece, weight) in _PIECES for _ in xrange(weight)]
+  while len(lines) < num_lines:
+    roll = rng.random()
+    if roll < 0.05:
+      lines.extend(_IfLadder(_Function(rng)))
+    elif roll < 0.1:
+      namespace = rng.choice(_WORDS)
+      lines.extend(['namespace %s {' % namespace, ''] + _Class(rng) +
+                   ['}  // namespace %s' % namespace, ''])
+    else:
+      lines.extend(rng.choice(pieces)(rng))
+  lines.append('}  // namespace')
+  if is_header:
+    lines.extend(['',
+                  '#endif  // ' + guard])
+  lines.append('')
+  return lines
+
+
+def GenerateCorpus(seed, lines_per_file, total_lines):
+  """Generates alternating .cc and .h files of about the same length.
+
+  Args:
+    seed: The seed of the generator.
+    lines_per_file: About how many lines each file has.
+    total_lines: About how many lines all files have together.
+
+  Returns:
+    A list of (path, lines) tuples.
+  """
+  rng = random.Random(seed)
+  corpus = []
+  for i in xrange(max(1, total_lines // lines_per_file)):
+    is_header = i % 2 == 1
+    path = 'bench/file%d.%s' % (i // 2, 'h' if is_header else 'cc')
+    corpus.append((path, GenerateSource(rng, path, lines_per_file,
+                                        is_header)))
+  return corpus
+
+
+def _DiscardError(filename, linenum, category, confidence, message):
+  pass
+
+
+def LintCorpus(corpus):
+  """Lints every file of a corpus and returns the seconds it took."""
+  start = _Timer()
+  for (path, lines) in corpus:
+    cpplint.ProcessFileData(path, path[path.rfind('.') + 1:], lines,
+                            _DiscardError)
+  return _Timer() - start
+
+
+def PeakMemoryKb():
+  """Returns the peak resident memory of the process in KiB, or None."""
+  if resource is None:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == 'darwin':
+    peak //= 1024  # Bytes, not KiB.
+  return peak
+
+
+def RunBenchmark(seed, total_lines, repeat, sizes):
+  """Runs the benchmark of each size.
+
+  Args:
+    seed: The seed of the corpus generator.
+    total_lines: About how many lines each size lints.
+    repeat: How many times each size is linted.
+    sizes: The names of the sizes to run, from _SIZES.
+
+  Returns:
+    The results as a dict that can be saved as JSON.  The peak memory of a
+    size is that of the whole process when the size was done, and sizes run
+    from the smallest up.
+  """
+  results = {'seed': seed,
+             'python': platform.python_version(),
+             'sizes': {}}
+  # Compile the regexps and fill the caches before anything is timed.
+  LintCorpus(GenerateCorpus(seed, _SIZES[0][1], _SIZES[0][1]))
+  for (name, lines_per_file) in _SIZES:
+    if name not in sizes:
+      continue
+    corpus = GenerateCorpus(seed, lines_per_file, total_lines)
+    num_lines = sum(len(lines) for (_, lines) in corpus)
+    seconds = min(LintCorpus(corpus) for _ in xrange(repeat))
+    results['sizes'][name] = {'files': len(corpus),
+                              'lines': num_lines,
+                              'seconds': seconds,
+                              'lines_per_second': num_lines / seconds,
+                              'files_per_second': len(corpus) / seconds,
+                              'peak_memory_kb': PeakMemoryKb()}
+  return results
+
+
+def _ArgumentSpec(function):
+  getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+  return getargspec(function)
+
+
+def FindLineChecks(names=None):
+  """Finds the checks that cpplint runs on each line.
+
+  These are the module-level functions named like checks whose required
+  parameters are all in _CHECK_PARAMETERS and include the line number.
+  Checks that take anything else, such as CheckComment or CheckCStyleCast,
+  are only run by other checks and are timed as part of them; checks of a
+  whole file, such as CheckForHeaderGuard, run once per file and are left
+  out.
+
+  Args:
+    names: The names of the checks to return, or None for all of them.
+
+  Returns:
+    A sorted list of (name, parameter names) tuples.
+
+  Raises:
+    ValueError: One of names is not a per-line check.
+  """
+  checks = {}
+  for name in dir(cpplint):
+    if not cpplint._RE_CHECK_FUNCTION_NAME.match(name):
+      continue
+    spec = _ArgumentSpec(getattr(cpplint, name))
+    parameters = spec.args[:len(spec.args) - len(spec.defaults or ())]
+    if (set(parameters) <= _CHECK_PARAMETERS and
+        ('linenum' in parameters) != ('line' in parameters)):
+      checks[name] = parameters
+  if names is None:
+    names = checks
+  for name in names:
+    if name not in checks:
+      raise ValueError('%s is not a per-line check' % name)
+  return sorted((name, checks[name]) for name in names)
+
+
+def PrepareCorpus(corpus):
+  """Builds the CleansedLines of each file as ProcessFileData does.
+
+  Args:
+    corpus: A list of (path, lines) tuples.
+
+  Returns:
+    A list of (path, file extension, CleansedLines) tuples.
+  """
+  prepared = []
+  for (path, lines) in corpus:
+    lines = ([cpplint._FIRST_MARKER_LINE] + lines +
+             [cpplint._LAST_MARKER_LINE])
+    cpplint.RemoveMultiLineComments(path, lines, _DiscardError)
+    prepared.append((path, path[path.rfind('.') + 1:],
+                     cpplint.CleansedLines(lines)))
+  return prepared
+
+
+def _NoCheck(filename, clean_lines, linenum, error):
+  pass
+
+
+def TimeCheck(function, parameters, prepared):
+  """Times a per-line check alone over every line of a prepared corpus.
+
+  The NestingState is updated for each line outside of the timed calls, and
+  each file gets a new _IncludeState and _FunctionState, so only the check
+  itself changes them.  Lines in assembly blocks are skipped as ProcessLine
+  skips them.
+
+  Args:
+    function: The check.
+    parameters: The names of its parameters, from FindLineChecks.
+    prepared: The corpus, from PrepareCorpus.
+
+  Returns:
+    The number of calls and the seconds they took.
+  """
+  calls = 0
+  seconds = 0.0
+  for (path, file_extension, clean_lines) in prepared:
+    cpplint.ResetNolintSuppressions()
+    values = {'filename': path,
+              'file_extension': file_extension,
+              'clean_lines': clean_lines,
+              'nesting_state': cpplint.NestingState(),
+              'include_state': cpplint._IncludeState(),
+              'function_state': cpplint._FunctionState(),
+              'error': _DiscardError}
+    nesting_state = values['nesting_state']
+    for linenum in xrange(clean_lines.NumLines()):
+      nesting_state.Update(path, clean_lines, linenum, _DiscardError)
+      if nesting_state.InAsmBlock():
+        continue
+      values['linenum'] = values['line'] = linenum
+      args = [values[parameter] for parameter in parameters]
+      start = _Timer()
+      function(*args)
+      seconds += _Timer() - start
+      calls += 1
+  return (calls, seconds)
+
+
+def RunCheckBenchmark(seed, total_lines, repeat, names=None):
+  """Times each per-line check alone over a fixed corpus.
+
+  The cost of timing each call is measured on a check that does nothing and
+  subtracted.
+
+  Args:
+    seed: The seed of the corpus generator.
+    total_lines: About how many lines the corpus has.
+    repeat: How many times each check is timed; the fastest run is kept.
+    names: The names of the checks to time, or None for all of them.
+
+  Returns:
+    The results as a dict that can be saved as JSON.
+  """
+  checks = FindLineChecks(names)
+  prepared = PrepareCorpus(
+      GenerateCorpus(seed, _CHECKS_LINES_PER_FILE, total_lines))
+  # Compile the regexps and fill the caches before anything is timed.
+  for (name, parameters) in checks:
+    TimeCheck(getattr(cpplint, name), parameters, prepared[:1])
+  (calls, overhead) = min(TimeCheck(_NoCheck, ['filename', 'clean_lines',
+                                               'linenum', 'error'], prepared)
+                          for _ in xrange(repeat))
+  overhead_per_call = overhead / calls
+
+  results = {'seed': seed,
+             'python': platform.python_version(),
+             'checks': {}}
+  for (name, parameters) in checks:
+    (calls, seconds) = min(TimeCheck(getattr(cpplint, name), parameters,
+                                     prepared)
+                           for _ in xrange(repeat))
+    seconds = max(0.0, seconds - calls * overhead_per_call)
+    results['checks'][name] = {'calls': calls,
+                               'seconds': seconds,
+                               'microseconds_per_call':
+                                   seconds / calls * 1e6 if calls else 0.0}
+  return results
+
+
+def FitExponent(sizes, seconds):
+  """Returns the k of the least-squares fit of seconds = c * sizes**k."""
+  xs = [math.log(size) for size in sizes]
+  ys = [math.log(max(elapsed, 1e-6)) for elapsed in seconds]
+  mean_x = sum(xs) / len(xs)
+  mean_y = sum(ys) / len(ys)
+  return (sum((x - mean_x) * (y - mean_y) for (x, y) in zip(xs, ys)) /
+          sum((x - mean_x) ** 2 for x in xs))
+
+
+def FindRegexps(seed):
+  """Finds the regexps that cpplint can run on a line.
+
+  These are the _LazyRegex instances, the compiled regexps of the module,
+  alone or in lists and tuples, and the patterns that the checks pass to
+  Match, Search and ReplaceAll while linting a corpus.
+
+  Args:
+    seed: The seed of the generator of the corpus.
+
+  Returns:
+    A dict from each pattern to its compiled regexp.
+  """
+  compiled = {}
+
+  def Add(value):
+    if isinstance(value, cpplint._LazyRegex):
+      compiled.setdefault(value.pattern, re.compile(value.pattern))
+    elif (hasattr(value, 'search') and
+          isinstance(getattr(value, 'pattern', None), str)):
+      compiled.setdefault(value.pattern, value)
+
+  for instance in cpplint._LazyRegex._instances:
+    Add(instance)
+  for name in dir(cpplint):
+    value = getattr(cpplint, name)
+    Add(value)
+    if isinstance(value, (list, tuple)):
+      for item in value:
+        Add(item)
+        if isinstance(item, tuple):
+          for part in item:
+            Add(part)
+
+  regex_stats = cpplint._RegexStats()
+  regex_stats.Enable()
+  try:
+    LintCorpus(GenerateCorpus(seed, _SIZES[0][1], _FUZZ_CORPUS_LINES))
+  finally:
+    regex_stats.Disable()
+  for pattern in regex_stats.stats:
+    compiled.setdefault(pattern, re.compile(pattern))
+  return compiled
+
+
+def FuzzInput(rng, name, length):
+  """Returns a line of a given length of one of _FUZZ_INPUTS.
+
+  Args:
+    rng: The random.Random that the "mixed" input is drawn from.
+    name: The name of the input, from _FUZZ_INPUTS.
+    length: The length of the line.
+  """
+  unit = dict(_FUZZ_INPUTS)[name]
+  if unit is None:
+    return ''.join(rng.choice(_FUZZ_MIXED_CHARACTERS)
+                   for _ in xrange(length))
+  return (unit * (length // len(unit) + 1))[:length]
+
+
+def TimeRegexp(regexp, line, repeat):
+  """Returns the fastest of repeat runs of a search and a match of line."""
+  best = None
+  for _ in xrange(repeat):
+    start = _Timer()
+    regexp.search(line)
+    regexp.match(line)
+    elapsed = _Timer() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def RunRegexFuzz(seed, max_length, repeat):
+  """Times every regexp on adversarial lines of growing length.
+
+  Each regexp is run on each of _FUZZ_INPUTS at max_length / 8, / 4, / 2
+  and max_length characters, and the exponent k of time ~ length**k is
+  fitted.  Once two lengths are timed, a regexp stops growing an input as
+  soon as a run takes longer than _FUZZ_TIME_LIMIT, and its time at
+  max_length is then projected from the fit.  The input with the longest time at
+  max_length is the worst one.
+
+  Args:
+    seed: The seed of the generator of the corpus and the mixed input.
+    max_length: The length of the longest lines.
+    repeat: How many times each line is timed; the fastest run is kept.
+
+  Returns:
+    The results as a dict that can be saved as JSON.
+  """
+  lengths = [max(1, max_length // divisor) for divisor in (8, 4, 2, 1)]
+  rng = random.Random(seed)
+  lines = dict(((name, length), FuzzInput(rng, name, length))
+               for (name, _) in _FUZZ_INPUTS for length in lengths)
+  results = {'seed': seed,
+             'python': platform.python_version(),
+             'max_length': max_length,
+             'regexps': {}}
+  for (pattern, regexp) in sorted(FindRegexps(seed).items()):
+    inputs = {}
+    for (name, _) in _FUZZ_INPUTS:
+      seconds = []
+      for length in lengths:
+        seconds.append(TimeRegexp(regexp, lines[(name, length)], repeat))
+        if len(seconds) > 1 and seconds[-1] > _FUZZ_TIME_LIMIT:
+          break
+      exponent = FitExponent(lengths[:len(seconds)], seconds)
+      inputs[name] = {
+          'lengths': lengths[:len(seconds)],
+          'seconds': seconds,
+          'exponent': exponent,
+          'projected_seconds': seconds[-1] * (
+              float(max_length) / lengths[len(seconds) - 1]) ** exponent}
+    worst = max(inputs, key=lambda name: inputs[name]['projected_seconds'])
+    results['regexps'][pattern] = {
+        'worst_input': worst,
+        'exponent': inputs[worst]['exponent'],
+        'projected_seconds': inputs[worst]['projected_seconds'],
+        'inputs': inputs}
+  return results
+
+
+def _Abbreviate(text, width):
+  """Returns text, cut to width characters with "..." if it is longer."""
+  if len(text) <= width:
+    return text
+  return text[:width - 3] + '...'
+
+
+def PrintResults(results):
+  """Prints the results as a table to stderr."""
+  if 'sizes' in results:
+    sys.stderr.write('%-8s %7s %8s %9s %12s %11s %11s\n' %
+                     ('Size', 'Files', 'Lines', 'Seconds', 'Lines/s',
+                      'Files/s', 'Peak KiB'))
+    for (name, _) in _SIZES:
+      size = results['sizes'].get(name)
+      if size is None:
+        continue
+      sys.stderr.write('%-8s %7d %8d %9.3f %12.0f %11.1f %11s\n' %
+                       (name, size['files'], size['lines'], size['seconds'],
+                        size['lines_per_second'], size['files_per_second'],
+                        size['peak_memory_kb']))
+  if 'checks' in results:
+    checks = results['checks']
+    sys.stderr.write('%-40s %9s %9s %9s\n' %
+                     ('Check', 'Calls', 'Seconds', 'us/call'))
+    for name in sorted(checks, key=lambda name: -checks[name]['seconds']):
+      check = checks[name]
+      sys.stderr.write('%-40s %9d %9.3f %9.2f\n' %
+                       (name, check['calls'], check['seconds'],
+                        check['microseconds_per_call']))
+  if 'regexps' in results:
+    regexps = results['regexps']
+    sys.stderr.write('%-50s %-10s %8s %9s\n' %
+                     ('Regexp', 'Input', 'Exponent', 'Seconds'))
+    for pattern in sorted(regexps,
+                          key=lambda pattern:
+                          -regexps[pattern]['projected_seconds']):
+      regexp = regexps[pattern]
+      sys.stderr.write('%-50s %-10s %8.2f %9.4f\n' %
+                       (_Abbreviate(repr(pattern), 50), regexp['worst_input'],
+                        regexp['exponent'], regexp['projected_seconds']))
+
+
+def CompareResults(results, baseline, tolerance):
+  """Prints how each size, or each check, compares with a baseline.
+
+  Args:
+    results: The results of this run.
+    baseline: The results of an earlier run.
+    tolerance: The fraction by which the speed of a size or check may drop.
+
+  Returns:
+    The names of the sizes and checks that got slower by more than the
+    tolerance.
+  """
+  if baseline.get('seed') != results['seed']:
+    sys.stderr.write('Warning: the baseline used seed %s, not %s.\n' %
+                     (baseline.get('seed'), results['seed']))
+  regressions = []
+  # Each entry is (name, old value, new value, speed ratio, unit).
+  comparisons = []
+  for (name, _) in _SIZES:
+    size = results.get('sizes', {}).get(name)
+    old_size = baseline.get('sizes', {}).get(name)
+    if size is not None and old_size is not None:
+      comparisons.append((name, old_size['lines_per_second'],
+                          size['lines_per_second'],
+                          size['lines_per_second'] /
+                          old_size['lines_per_second'], 'lines/s'))
+  for name in sorted(results.get('checks', {})):
+    check = results['checks'][name]
+    old_check = baseline.get('checks', {}).get(name)
+    if old_check is not None and check['microseconds_per_call']:
+      comparisons.append((name, old_check['microseconds_per_call'],
+                          check['microseconds_per_call'],
+                          old_check['microseconds_per_call'] /
+                          check['microseconds_per_call'], 'us/call'))
+  for pattern in sorted(results.get('regexps', {})):
+    regexp = results['regexps'][pattern]
+    old_regexp = baseline.get('regexps', {}).get(pattern)
+    if (old_regexp is not None and regexp['projected_seconds'] and
+        max(old_regexp['projected_seconds'], regexp['projected_seconds']) >=
+        _FUZZ_COMPARED_SECONDS):
+      comparisons.append((pattern, old_regexp['projected_seconds'] * 1e3,
+                          regexp['projected_seconds'] * 1e3,
+                          old_regexp['projected_seconds'] /
+                          regexp['projected_seconds'], 'ms'))
+  for (name, old_value, value, ratio, unit) in comparisons:
+    verdict = 'ok'
+    if ratio < 1 - tolerance:
+      verdict = 'REGRESSION'
+      regressions.append(name)
+    sys.stderr.write('%-40s %12.2f -> %12.2f %-7s  %+6.1f%%  %s\n' %
+                     (_Abbreviate(name, 40), old_value, value, unit,
+                      (ratio - 1) * 100, verdict))
+  return regressions
+
+
+def PrintUsage(message):
+  """Prints the usage and exits, optionally with an error message."""
+  sys.stderr.write(__doc__)
+  if message:
+    sys.exit('\nFATAL ERROR: ' + message)
+  else:
+    sys.exit(1)
+
+
+def main():
+  try:
+    (opts, args) = getopt.getopt(sys.argv[1:], '',
+                                 ['help', 'seed=', 'lines=', 'repeat=',
+                                  'sizes=', 'checks=', 'regex_fuzz',
+                                  'max_length=', 'json=', 'compare=',
+                                  'tolerance='])
+  except getopt.GetoptError:
+    PrintUsage('Invalid arguments.')
+  if args:
+    PrintUsage('No files are taken; the corpus is generated.')
+
+  seed = 1
+  total_lines = 20000
+  repeat = 3
+  sizes = [name for (name, _) in _SIZES]
+  checks = None
+  regex_fuzz = False
+  max_length = 1000
+  json_path = None
+  compare_path = None
+  tolerance = 0.1
+  for (opt, val) in opts:
+    try:
+      if opt == '--help':
+        PrintUsage(None)
+      elif opt == '--seed':
+        seed = int(val)
+      elif opt == '--lines':
+        total_lines = int(val)
+      elif opt == '--repeat':
+        repeat = max(1, int(val))
+      elif opt == '--sizes':
+        sizes = val.split(',')
+        for name in sizes:
+          if name not in dict(_SIZES):
+            PrintUsage('Unknown size %s.' % name)
+      elif opt == '--checks':
+        checks = val
+      elif opt == '--regex_fuzz':
+        regex_fuzz = True
+      elif opt == '--max_length':
+        max_length = max(8, int(val))
+      elif opt == '--json':
+        json_path = val
+      elif opt == '--compare':
+        compare_path = val
+      elif opt == '--tolerance':
+        tolerance = float(val)
+    except ValueError:
+      PrintUsage('--%s must be a number.' % opt.lstrip('-'))
+
+  if regex_fuzz:
+    results = RunRegexFuzz(seed, max_length, repeat)
+  elif checks is None:
+    results = RunBenchmark(seed, total_lines, repeat, sizes)
+  else:
+    try:
+      results = RunCheckBenchmark(seed, total_lines, repeat,
+                                  None if checks == 'all'
+                                  else checks.split(','))
+    except ValueError as e:
+      PrintUsage(str(e))
+  PrintResults(results)
+  if json_path == '-':
+    json.dump(results, sys.stdout, indent=2, separators=(',', ': '),
+              sort_keys=True)
+    sys.stdout.write('\n')
+  elif json_path:
+    with open(json_path, 'w') as output:
+      json.dump(results, output, indent=2, separators=(',', ': '),
+                sort_keys=True)
+  if compare_path:
+    with open(compare_path) as baseline_file:
+      baseline = json.load(baseline_file)
+    if CompareResults(results, baseline, tolerance):
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2009 Google Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Forwards a run of cpplint.py to a daemon started with --daemon.
+
+Usage: cpplint_client.py --daemon=socket [cpplint.py flags] <file> [file] ...
+
+The arguments and the current directory are sent to the daemon listening
+on socket, and its output and exit code are those cpplint.py would have
+given.  This file does not import cpplint.py, so starting it is cheap.  When
+no daemon listens on socket, cpplint.py is run in a child process instead.
+"""
+
+import codecs
+import json
+import os
+import socket
+import subprocess
+import sys
+
+
+_USAGE = """
+Syntax: cpplint_client.py --daemon=socket [cpplint.py flags] <file> [file] ...
+
+  Sends a run of cpplint.py to the daemon started with
+  cpplint.py --daemon=socket.  See cpplint.py --help for the flags.
+"""
+
+_CPPLINT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'cpplint.py')
+
+
+def ReadsStdin(args):
+  """Returns whether cpplint.py run with args reads its standard input.
+
+  It does for the file "-", for --files-from=- and for --diff=-, also when
+  their "-" is a separate argument.
+  """
+  return any(arg in ('-', '--files-from=-', '--diff=-') for arg in args)
+
+
+def Forward(path, args, cwd, stdin, stdout, stderr):
+  """Runs cpplint.py in the daemon listening on a Unix socket.
+
+  Args:
+    path: The path of the socket.
+    args: The arguments to run cpplint.py with.
+    cwd: The directory to run it in.
+    stdin: The bytes of the standard input of the run, or None.
+    stdout: The file to copy the standard output of the run to.
+    stderr: The file to copy the standard error of the run to.
+
+  Returns:
+    The exit status of the run.
+
+  Raises:
+    socket.error: No daemon listens on the socket; nothing was sent.
+  """
+  connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    connection.connect(path)
+  except socket.error:
+    connection.close()
+    raise
+
+  request = {'argv': args, 'cwd': cwd}
+  if stdin is not None:
+    request['stdin'] = stdin.decode('latin-1')
+  reader = connection.makefile('rb')
+  try:
+    connection.sendall(json.dumps(request).encode('ascii') + b'\n')
+    for line in reader:
+      message = json.loads(line.decode('ascii'))
+      if 'exit' in message:
+        return message['exit']
+      if 'stdout' in message:
+        stdout.write(message['stdout'])
+      else:
+        stderr.write(message['stderr'])
+  except socket.error:
+    pass  # Reported below, like a connection closed early.
+  finally:
+    reader.close()
+    connection.close()
+  stderr.write('The cpplint daemon at %s closed the connection.\n' % path)
+  return 1
+
+
+def main():
+  args = sys.argv[1:]
+  paths = [arg for arg in args if arg.startswith('--daemon=')]
+  if not paths:
+    sys.stderr.write(_USAGE)
+    sys.exit('\nFATAL ERROR: No --daemon=socket was given.')
+  args = [arg for arg in args if not arg.startswith('--daemon=')]
+  path = paths[-1][len('--daemon='):]
+
+  stdin = None
+  if ReadsStdin(args):
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin).read()
+  stdout = sys.stdout
+  stderr = sys.stderr
+  if bytes is str:  # Python 2 writes text to its streams as bytes.
+    stdout = codecs.getwriter('utf8')(stdout)
+    stderr = codecs.getwriter('utf8')(stderr)
+
+  try:
+    status = Forward(path, args, os.getcwd(), stdin, stdout, stderr)
+  except socket.error:
+    # No daemon is running, so lint in a cpplint.py of our own.
+    process = subprocess.Popen(
+        [sys.executable, _CPPLINT] + args,
+        stdin=subprocess.PIPE if stdin is not None else None)
+    process.communicate(stdin)
+    status = process.returncode
+  sys.exit(status)
+
+
+if __name__ == '__main__':
+  main()
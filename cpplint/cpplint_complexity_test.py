@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2009 Google Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Scaling tests for cpplint.py on inputs that invite superlinear time.
+
+Each test lints inputs of growing size n made of one pathological pattern,
+fits the exponent k of time ~ n**k by least squares on a log-log scale, and
+fails if k exceeds the complexity class declared for the pattern by more
+than _SLACK.  These tests take several seconds and depend on the machine
+being otherwise idle, so they are kept out of cpplint_unittest.py.
+"""
+
+import time
+import unittest
+
+import cpplint
+import cpplint_benchmark
+
+try:
+  xrange          # Python 2
+except NameError:
+  xrange = range  # Python 3
+
+
+LINEAR = 1
+QUADRATIC = 2
+
+# How much the fitted exponent may exceed the declared one.  A linear
+# pattern gets a fitted exponent between 0.9 and 1.1 on an idle machine,
+# while the quadratic behavior these tests guard against shows up as 1.5
+# or more at the default sizes.
+_SLACK = 0.3
+
+# The sizes for patterns declared linear, and for the ones declared
+# quadratic, whose inputs would take too long at the linear sizes.
+_LINEAR_SIZES = (500, 1000, 2000, 4000)
+_QUADRATIC_SIZES = (50, 100, 200, 400)
+
+# Each input is timed this many times and the fastest run is kept.
+_REPEAT = 2
+
+_COPYRIGHT = '// Copyright 2014 Google Inc. All Rights Reserved.'
+
+_Timer = getattr(time, 'perf_counter', time.time)
+
+
+def _DiscardError(filename, linenum, category, confidence, message):
+  pass
+
+
+def _Lint(lines):
+  """Returns a function that lints lines as foo.cc."""
+  return lambda: cpplint.ProcessFileData('foo.cc', 'cc', lines + [''],
+                                         _DiscardError)
+
+
+class ComplexityTest(unittest.TestCase):
+
+  def assertGrowth(self, declared, make_run, sizes=None):
+    """Checks that the time of make_run(n)() grows no faster than declared.
+
+    Args:
+      declared: LINEAR or QUADRATIC.
+      make_run: A function that builds the input of size n and returns a
+                function without arguments that processes it.
+      sizes: The sizes to time; defaults to the ones for declared.
+    """
+    if sizes is None:
+      sizes = _QUADRATIC_SIZES if declared == QUADRATIC else _LINEAR_SIZES
+    seconds = []
+    for size in sizes:
+      run = make_run(size)
+      best = None
+      for _ in xrange(_REPEAT):
+        start = _Timer()
+        run()
+        elapsed = _Timer() - start
+        if best is None or elapsed < best:
+          best = elapsed
+      seconds.append(best)
+    exponent = cpplint_benchmark.FitExponent(sizes, seconds)
+    self.assertTrue(
+        exponent <= declared + _SLACK,
+        'time grows as n**%.2f, faster than n**%d; seconds for n in %s: %s' %
+        (exponent, declared, sizes,
+         ', '.join('%.3f' % elapsed for elapsed in seconds)))
+
+  def testFitExponent(self):
+    sizes = (10, 20, 40, 80)
+    self.assertAlmostEqual(1.0, cpplint_benchmark.FitExponent(
+        sizes, [3 * n for n in sizes]))
+    self.assertAlmostEqual(2.0, cpplint_benchmark.FitExponent(
+        sizes, [n * n for n in sizes]))
+
+  # _ClassInfo scans forward from each class to its closing brace.
+  def testManyClasses(self):
+    self.assertGrowth(LINEAR, lambda n: _Lint(
+        [_COPYRIGHT] +
+        sum([['class C%d {' % i, ' public:', '  int a;', '};']
+             for i in xrange(n // 4)], [])))
+
+  def testLongClass(self):
+    self.assertGrowth(LINEAR, lambda n: _Lint(
+        [_COPYRIGHT, 'class C {', ' public:'] +
+        ['  int member%d;' % i for i in xrange(n)] +
+        ['};']))
+
+  # Every class scans to its own end, so nesting depth n costs n**2.
+  def testNestedClasses(self):
+    self.assertGrowth(QUADRATIC, lambda n: _Lint(
+        [_COPYRIGHT] +
+        ['class C%d {' % i for i in xrange(n)] +
+        ['};'] * n))
+
+  # CloseExpression and ReverseCloseExpression match brackets across lines.
+  def testNestedCallsOverManyLines(self):
+    self.assertGrowth(LINEAR, lambda n: _Lint(
+        [_COPYRIGHT, 'int x = f('] +
+        ['    g(' for _ in xrange(n)] +
+        ['    1' + ')' * n + ');']))
+
+  def testManyArgumentsOverManyLines(self):
+    self.assertGrowth(LINEAR, lambda n: _Lint(
+        [_COPYRIGHT, 'int x = f('] +
+        ['    a%d,' % i for i in xrange(n)] +
+        ['    b);']))
+
+  def testNestedParenthesesOnOneLine(self):
+    self.assertGrowth(LINEAR, lambda n: _Lint(
+        [_COPYRIGHT, 'int x = ' + '(' * n + '1' + ')' * n + ';']))
+
+  # GetPreviousNonBlankLine scans back over blank and comment lines.
+  def testLongCommentRun(self):
+    self.assertGrowth(LINEAR, lambda n: _Lint(
+        [_COPYRIGHT, 'void f() {'] +
+        ['  // comment'] * n +
+        ['  {', '  }', '  a; b;', '}']))
+
+  def testManyCommentRuns(self):
+    self.assertGrowth(LINEAR, lambda n: _Lint(
+        [_COPYRIGHT, 'void f() {'] +
+        (['  // comment'] * 10 + ['  {', '  }']) * (n // 12) +
+        ['}']))
+
+  # CleanseRawStrings checks that the text before a raw string has no '//'
+  # outside of literals, which took exponential time on escaped quotes.
+  def testEscapedQuotesBeforeRawString(self):
+    self.assertGrowth(LINEAR, lambda n: lambda: cpplint.CleanseRawStrings(
+        ['x = "a\\' * n + 'R"(b)";']))
+
+  # Lines over _long_line_threshold only get the checks of CheckLongLine; a
+  # minified line took quadratic time in the other checks.
+  def testMinifiedLine(self):
+    statement = 'if(a<b){x::y[a]=f(a,b)*2;}else{return g(b);}'
+    self.assertGrowth(
+        LINEAR,
+        lambda n: _Lint([_COPYRIGHT, statement * (n // len(statement))]),
+        (20000, 40000, 80000, 160000))
+
+  # _IncludeState.FindHeader is called for every #include.
+  def testManyIncludes(self):
+    def MakeRun(n):
+      headers = ['dir/header%d.h' % i for i in xrange(n)]
+
+      def Run():
+        include_state = cpplint._IncludeState()
+        for (linenum, header) in enumerate(headers):
+          self.assertEquals(-1, include_state.FindHeader(header))
+          include_state.AddInclude(header, linenum)
+      return Run
+    self.assertGrowth(LINEAR, MakeRun, (2000, 4000, 8000, 16000))
+
+  def testManyIncludesInFile(self):
+    self.assertGrowth(LINEAR, lambda n: _Lint(
+        [_COPYRIGHT] +
+        ['#include "dir/header%d.h"' % i for i in xrange(n)]))
+
+  # UpdatePreprocessor deep-copies the nesting stack at each #if and #else.
+  def testPreprocessorBlocks(self):
+    self.assertGrowth(LINEAR, lambda n: _Lint(
+        [_COPYRIGHT, 'namespace a {', 'class B {'] +
+        ['#if A', 'int a;', '#else', 'int b;', '#endif'] * (n // 5) +
+        ['};', '}  // namespace a']))
+
+  # The copied stack is as deep as the nesting, so n blocks at depth n cost
+  # n**2.
+  def testPreprocessorBlocksInDeepNesting(self):
+    self.assertGrowth(QUADRATIC, lambda n: _Lint(
+        [_COPYRIGHT] +
+        ['namespace n%d {' % i for i in xrange(n)] +
+        ['#if A', 'int a;', '#else', 'int b;', '#endif'] * n +
+        ['}'] * n), (16, 32, 64, 128))
+
+
+if __name__ == '__main__':
+  unittest.main()
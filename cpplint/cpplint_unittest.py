@@ -34,14 +34,25 @@
 # TODO(unknown): Add a good test that tests UpdateIncludeState.
 
 import codecs
+import io
+import json
+import multiprocessing.pool
 import os
+import pstats
 import random
 import re
+import shutil
+import socket
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
 import cpplint
+import cpplint_benchmark
+import cpplint_client
 
 try:
   xrange          # Python 2
@@ -254,6 +265,51 @@ class CpplintTestBase(unittest.TestCase):
             'should be deleted.  [whitespace/blank_line] [3]'))
 
 
+class TemporaryDirectoryTestBase(CpplintTestBase):
+  """Gives each test a temporary directory, and runs cpplint.py in it."""
+
+  def setUp(self):
+    CpplintTestBase.setUp(self)
+    self.temp_directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_directory)
+    CpplintTestBase.tearDown(self)
+
+  def WriteFile(self, name, contents):
+    """Writes text or bytes to a file of the temporary directory.
+
+    The directories of the file are created if needed.
+
+    Returns:
+      The path of the file.
+    """
+    path = os.path.join(self.temp_directory, name)
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    if not isinstance(contents, bytes):
+      contents = contents.encode('utf8')
+    with open(path, 'wb') as output:
+      output.write(contents)
+    return path
+
+  def RunCpplint(self, args, stdin=None, cwd=None, env=None):
+    """Returns the exit status, stdout and stderr of a cpplint.py process.
+
+    Args:
+      args: The arguments of cpplint.py.
+      stdin: The bytes of its standard input, by default none.
+      cwd: The directory it runs in, by default the temporary directory.
+      env: Its environment, by default the one of the tests.
+    """
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(cpplint.__file__)] + args,
+        cwd=cwd or self.temp_directory, env=env, stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    (stdout, stderr) = process.communicate(stdin or b'')
+    return (process.returncode, stdout.decode('utf8'), stderr.decode('utf8'))
+
+
 class CpplintTest(CpplintTestBase):
 
   def GetNamespaceResults(self, lines):
@@ -315,6 +371,18 @@ class CpplintTest(CpplintTestBase):
     results = self.GetNamespaceResults(lines)
     self.assertEquals(results, '')
 
+  def testLazyRegex(self):
+    pattern = r'\blazy_regex_test\s*\((\w+)\)'
+    cpplint._regexp_compile_cache.pop(pattern, None)
+    regex = cpplint._LazyRegex(pattern)
+    self.assertNotIn(pattern, cpplint._regexp_compile_cache)
+    self.assertEquals('x', regex.search('y = lazy_regex_test(x);').group(1))
+    # The first call compiles the pattern and binds the compiled methods.
+    self.assertIn(pattern, cpplint._regexp_compile_cache)
+    self.assertEquals(cpplint._regexp_compile_cache[pattern].match,
+                      regex.match)
+    self.assertFalse(regex.match('y = lazy_regex_test(x);'))
+    self.assertEquals('y = F;', regex.sub('F', 'y = lazy_regex_test(x);'))
 
   # Test get line width.
   def testGetLineWidth(self):
@@ -323,6 +391,12 @@ class CpplintTest(CpplintTestBase):
     self.assertEquals(16, cpplint.GetLineWidth(u'都|道|府|県|支庁'))
     self.assertEquals(5 + 13 + 9, cpplint.GetLineWidth(
         u'd𝐱/dt' + u'f : t ⨯ 𝐱 → ℝ' + u't ⨯ 𝐱 → ℝ'))
+    # Combining characters take no column of their own.
+    self.assertEquals(4, cpplint.GetLineWidth(u'cafe\u0301'))
+    self.assertEquals(4, cpplint.GetLineWidth(u'x\u0300\u0301yz\u0302w'))
+    # Cached widths give the same answer the second time around.
+    self.assertEquals(16, cpplint.GetLineWidth(u'都|道|府|県|支庁'))
+    self.assertEquals(12, cpplint.GetLineWidth(u'int x = 0;  '))
 
   def testGetTextInside(self):
     self.assertEquals('', cpplint._GetTextInside('fun()', r'fun\('))
@@ -3892,6 +3966,43 @@ class CpplintTest(CpplintTestBase):
     finally:
       cpplint._line_length = old_line_length
 
+  def testLongLineThreshold(self):
+    old_threshold = cpplint._long_line_threshold
+    long_line = 'int a[] = {%s};\t ' % ('1,' * 50)
+    lines = ['// Copyright 2014 Your Company.',
+             long_line,
+             '/* %s' % ('x' * 100),
+             '*/',
+             'int b[] = {%s};  // NOLINT' % ('1,' * 50),
+             '']
+
+    def Lint(threshold):
+      cpplint._long_line_threshold = threshold
+      error_collector = ErrorCollector(self.assert_)
+      cpplint.ProcessFileData('foo.cc', 'cc', list(lines), error_collector)
+      return error_collector.ResultList()
+
+    try:
+      self.assertEquals([
+          'Line has 115 characters, more than --long_line_threshold=100; '
+          'only its NOLINT, tab, whitespace and length were checked'
+          '  [readability/long_line] [5]',
+          'Tab found; better to use spaces  [whitespace/tab] [1]',
+          'Line ends in whitespace.  Consider deleting these extra spaces.'
+          '  [whitespace/end_of_line] [4]',
+          'Lines should be <= 80 characters long'
+          '  [whitespace/line_length] [2]',
+          'Line has 103 characters, more than --long_line_threshold=100; '
+          'only its NOLINT, tab, whitespace and length were checked'
+          '  [readability/long_line] [5]',
+          'Lines should be <= 80 characters long'
+          '  [whitespace/line_length] [2]'], Lint(100))
+      # Without the limit, the other checks see the long lines too.
+      self.assertTrue(
+          'Missing space after ,  [whitespace/comma] [3]' in Lint(0))
+    finally:
+      cpplint._long_line_threshold = old_threshold
+
   def testFilter(self):
     old_filters = cpplint._cpplint_state.filters
     try:
@@ -4689,6 +4800,1350 @@ class CleansedLinesTest(unittest.TestCase):
                       collapse('\'"\' "foo"'))
 
 
+class ReadSourceFileTest(unittest.TestCase):
+
+  def ReadBytes(self, raw_bytes):
+    (fd, path) = tempfile.mkstemp(suffix='.cc')
+    try:
+      os.write(fd, raw_bytes)
+      os.close(fd)
+      return cpplint.ReadSourceFile(path)
+    finally:
+      os.remove(path)
+
+  def testLfLines(self):
+    source = self.ReadBytes('int a;\nint b;\n')
+    self.assertEquals([u'int a;', u'int b;', u''], source.lines)
+    self.assertEquals([], source.mixed_crlf_lines)
+    self.assertFalse(source.has_bad_characters)
+
+  def testCrlfLines(self):
+    source = self.ReadBytes('int a;\r\nint b;\r\r\nint c;\r')
+    self.assertEquals([u'int a;', u'int b;', u'int c;\r'], source.lines)
+    # Uniform line endings are not reported.
+    self.assertEquals([], source.mixed_crlf_lines)
+
+  def testMixedLineEndings(self):
+    source = self.ReadBytes('int a;\r\nint b;\n\nint c;\r\n')
+    self.assertEquals([u'int a;', u'int b;', u'', u'int c;', u''],
+                      source.lines)
+    self.assertEquals([1, 4], source.mixed_crlf_lines)
+
+  def testBadCharacters(self):
+    self.assertFalse(self.ReadBytes('\xe9\x8e\xbd\n').has_bad_characters)
+    source = self.ReadBytes('\xe9x\x8e\xbd\n')
+    self.assertTrue(source.has_bad_characters)
+    self.assertIn(u'\ufffd', source.lines[0])
+    self.assertTrue(self.ReadBytes('\xef\xbf\xbd\n').has_bad_characters)
+    self.assertTrue(self.ReadBytes('int a;\0\n').has_bad_characters)
+
+  def testMappedFile(self):
+    old_threshold = cpplint._mmap_threshold
+    try:
+      for raw_bytes in ('int a;\nint b;\n', 'int a;\r\nint b;\r\r\nint c;\r',
+                        'int a;\r\nint b;\n\nint c;\r\n', '\xe9x\x8e\xbd\n',
+                        'int a;\0\n', '\xe9\x8e\xbd'):
+        cpplint._mmap_threshold = 1
+        mapped = self.ReadBytes(raw_bytes)
+        cpplint._mmap_threshold = old_threshold
+        read = self.ReadBytes(raw_bytes)
+        self.assertTrue(isinstance(mapped.lines, cpplint._LazyLines))
+        self.assertEquals(read.lines, list(mapped.lines))
+        self.assertEquals(read.mixed_crlf_lines, mapped.mixed_crlf_lines)
+        self.assertEquals(read.has_bad_characters, mapped.has_bad_characters)
+        mapped.Close()
+    finally:
+      cpplint._mmap_threshold = old_threshold
+
+  def testLazyLines(self):
+    lines = cpplint._LazyLines(3, lambda index: 'line %d' % index)
+    self.assertEquals(3, len(lines))
+    self.assertEquals('line 2', lines[-1])
+    self.assertEquals(['line 1', 'line 2'], lines[1:])
+    lines[1] = 'assigned'
+    self.assertEquals(['line 0', 'assigned', 'line 2'], list(lines))
+    self.assertRaises(IndexError, lines.__getitem__, 3)
+    surrounded = lines.Surround('first', 'last')
+    self.assertEquals(['first', 'line 0', 'assigned', 'line 2', 'last'],
+                      list(surrounded))
+
+  def testLazyCleansedLines(self):
+    raw = ['const char* s = R"(', ' // x', ')";  // y', 'a = "b";  /* c */']
+    eager = cpplint.CleansedLines(list(raw))
+    lazy = cpplint.CleansedLines(
+        cpplint._LazyLines(len(raw), raw.__getitem__))
+    self.assertEquals(eager.NumLines(), lazy.NumLines())
+    self.assertEquals(eager.lines_without_raw_strings,
+                      list(lazy.lines_without_raw_strings))
+    self.assertEquals(eager.lines, list(lazy.lines))
+    self.assertEquals(eager.elided, list(lazy.elided))
+
+
+class ProcessFileStreamTest(unittest.TestCase):
+
+  def setUp(self):
+    self.old_stream_threshold = cpplint._stream_threshold
+    self.old_context_lines = cpplint._STREAM_CONTEXT_LINES
+
+  def tearDown(self):
+    cpplint._stream_threshold = self.old_stream_threshold
+    cpplint._STREAM_CONTEXT_LINES = self.old_context_lines
+
+  def Lint(self, raw_bytes, stream_threshold):
+    cpplint._stream_threshold = stream_threshold
+    errors = []
+    def Error(unused_filename, linenum, category, confidence, message):
+      errors.append((linenum, category, confidence, message))
+    (fd, path) = tempfile.mkstemp(suffix='.cc')
+    try:
+      os.write(fd, raw_bytes)
+      os.close(fd)
+      source = cpplint.ReadSourceFile(path)
+      cpplint.ProcessFileData(path, 'cc', source.lines, Error, [],
+                              source.has_bad_characters)
+      source.Close()
+    finally:
+      os.remove(path)
+    return errors
+
+  def testSameErrorsAsProcessFileData(self):
+    raw_bytes = ('// Copyright 2014 Your Company.\n'
+                 '#include <string>\n'
+                 '/* A comment\n'
+                 '   over two lines */\n'
+                 'const char* s = R"(\n'
+                 '  raw string  )";\n'
+                 'int main() {\n'
+                 '  std::vector<int> v;\n'
+                 '  int x = 1;;\n'
+                 '  if (x) { return 0; } else {\n'
+                 '  }\n'
+                 '}  // NOLINT(readability/braces)\n'
+                 'int y = "\xff";\n'
+                 '/* Never closed\n'
+                 'int z;')
+    streamed = self.Lint(raw_bytes, 1)
+    self.assertEquals(self.Lint(raw_bytes, 0), streamed)
+    self.assertIn((15, 'readability/multiline_comment', 5,
+                   'Could not find end of multi-line comment'), streamed)
+    for raw_bytes in ('// LINT_C_FILE\nint f(void);\n', ''):
+      self.assertEquals(self.Lint(raw_bytes, 0), self.Lint(raw_bytes, 1))
+
+  def testLongLines(self):
+    raw_bytes = ('// Copyright 2014 Your Company.\n'
+                 'int a[] = {%s};\n'
+                 '/* %s\n'
+                 '*/\n' % ('1,' * 6000, 'x' * 12000))
+    streamed = self.Lint(raw_bytes, 1)
+    # The long lines are reported as they are read, so the order differs.
+    self.assertEquals(sorted(self.Lint(raw_bytes, 0)), sorted(streamed))
+    self.assertEquals([2, 3], [linenum for (linenum, category, _, _)
+                               in streamed
+                               if category == 'readability/long_line'])
+
+  def testWindow(self):
+    cpplint._STREAM_CONTEXT_LINES = 2
+    lines = ['int a%d;' % i for i in range(10)]
+    clean_lines = cpplint._StreamingCleansedLines(lines, len(lines), None)
+    self.assertEquals(10, clean_lines.NumLines())
+    clean_lines.Seek(5)
+    self.assertEquals(['', 'int a3;', 'int a4;', 'int a5;', 'int a6;',
+                       'int a7;', ''], clean_lines.elided[2:9])
+    clean_lines.Seek(9)
+    self.assertEquals('int a8;', clean_lines.raw_lines[-2])
+    self.assertEquals('', clean_lines.raw_lines[5])
+
+
+class CheckProfileTest(CpplintTestBase):
+
+  def testProfile(self):
+    original_check_style = cpplint.CheckStyle
+    profile = cpplint._CheckProfile()
+    profile.Enable()
+    try:
+      self.assertNotEqual(original_check_style, cpplint.CheckStyle)
+      error_collector = ErrorCollector(self.assert_)
+      cpplint.ProcessFileData('foo.cc', 'cc',
+                              ['// Copyright 2014 Your Company.',
+                               'int a = 1 ;', ''], error_collector)
+    finally:
+      profile.Disable()
+    self.assertEqual(original_check_style, cpplint.CheckStyle)
+    self.assertEquals('Extra space before last semicolon. If this should be '
+                      'an empty statement, use {} instead.'
+                      '  [whitespace/semicolon] [5]',
+                      error_collector.Results())
+
+    # Two marker lines are added around the three lines.
+    (calls, total, own, errors) = profile.stats['CheckStyle']
+    self.assertEquals(5, calls)
+    self.assertEquals(0, errors)
+    self.assertTrue(0 <= own <= total)
+    self.assertEquals(1, profile.stats['CheckBracesSpacing'][3])
+    self.assertEquals(1, profile.stats['CleansedLines'][0])
+    self.assertEquals(5, profile.stats['NestingState.Update'][0])
+
+    profile.Merge({'CheckStyle': [5, total, own, 2]})
+    self.assertEquals([10, 2 * total, 2 * own, 2],
+                      profile.stats['CheckStyle'])
+
+
+class RegexStatsTest(CpplintTestBase):
+
+  def testRegexStats(self):
+    original_search = cpplint.Search
+    regex_stats = cpplint._RegexStats()
+    cpplint._cpplint_state.regex_stats = regex_stats
+    regex_stats.Enable()
+    try:
+      self.assertTrue(cpplint.Search(r'b+', 'abbc'))
+      self.assertFalse(cpplint.Match(r'b+', 'abbc'))
+      self.assertEquals('a-c', cpplint.ReplaceAll(r'b+', '-', 'abbc'))
+      lazy = cpplint._LazyRegex(r'x')
+      self.assertFalse(lazy.search('abc'))
+      self.assertTrue(lazy.search('axc'))
+      (fd, path) = tempfile.mkstemp(suffix='.json')
+      os.close(fd)
+      try:
+        regex_stats.WriteJson(path)
+        with open(path) as stats_file:
+          written = json.load(stats_file)
+      finally:
+        os.remove(path)
+    finally:
+      regex_stats.Disable()
+      cpplint._cpplint_state.regex_stats = None
+    self.assertEqual(original_search, cpplint.Search)
+
+    self.assertEquals([3, 2], regex_stats.stats['b+'][:2])
+    self.assertEquals([2, 1], regex_stats.stats['x'][:2])
+    self.assertEquals(['b+', 'x'],
+                      sorted(entry['pattern'] for entry in written['patterns']))
+    self.assertFalse(written['patterns'][0]['suspect_backtracking'])
+
+    regex_stats.Merge({'x': [1, 1, 1.0, 1.0, 'slow']})
+    self.assertEquals([3, 2], regex_stats.stats['x'][:2])
+    self.assertEquals('slow', regex_stats.stats['x'][4])
+
+
+class SlowReportTest(CpplintTestBase):
+
+  def testSlowReport(self):
+    original_process_line = cpplint.ProcessLine
+    slow_report = cpplint._SlowReport(2)
+    slow_report.Enable()
+    try:
+      cpplint.ProcessFileData('foo.cc', 'cc', ['int a;', 'int b;', ''],
+                              ErrorCollector(self.assert_))
+    finally:
+      slow_report.Disable()
+    self.assertEqual(original_process_line, cpplint.ProcessLine)
+    self.assertEquals(2, len(slow_report.lines))
+    for (seconds, filename, linenum) in slow_report.lines:
+      self.assertTrue(seconds >= 0)
+      self.assertEquals('foo.cc', filename)
+      self.assertTrue(0 <= linenum <= 4)
+
+    slow_report.Add(slow_report.files, (1.0, 'a.cc'))
+    slow_report.Add(slow_report.files, (3.0, 'b.cc'))
+    slow_report.Add(slow_report.files, (2.0, 'c.cc'))
+    self.assertEquals([(2.0, 'c.cc'), (3.0, 'b.cc')],
+                      sorted(slow_report.files))
+
+
+class ProfileOutputTest(TemporaryDirectoryTestBase):
+
+  def testSpeedscopeProfile(self):
+    original_check_spacing = cpplint.CheckSpacing
+    profile = cpplint._SpeedscopeProfile()
+    profile.Enable()
+    try:
+      for filename in ('foo.cc', 'bar.cc'):
+        cpplint.ProcessFileData(filename, 'cc', ['int a;', ''],
+                                ErrorCollector(self.assert_))
+      # Not within a linted file, so not recorded.
+      cpplint.CheckSpacing('foo.cc', cpplint.CleansedLines(['int a;']), 0,
+                           cpplint.NestingState(),
+                           ErrorCollector(self.assert_))
+    finally:
+      profile.Disable()
+    self.assertEqual(original_check_spacing, cpplint.CheckSpacing)
+    self.assertEquals(['foo.cc', 'bar.cc'],
+                      [filename for (filename, _) in profile.files])
+    stacks = profile.files[0][1]
+    self.assertTrue(('ProcessFileData', 'ProcessLine', 'CheckStyle',
+                     'CheckSpacing') in stacks)
+    self.assertTrue(('ProcessFileData', 'CleansedLines') in stacks)
+
+    path = os.path.join(self.temp_directory, 'profile.json')
+    profile.Write(path)
+    with open(path) as input_file:
+      written = json.load(input_file)
+    frames = [frame['name'] for frame in written['shared']['frames']]
+    self.assertEquals(['foo.cc', 'bar.cc'],
+                      [entry['name'] for entry in written['profiles']])
+    for entry in written['profiles']:
+      self.assertEquals('sampled', entry['type'])
+      self.assertEquals(len(entry['samples']), len(entry['weights']))
+      self.assertAlmostEqual(sum(entry['weights']), entry['endValue'])
+      for sample in entry['samples']:
+        self.assertEquals('ProcessFileData', frames[sample[0]])
+
+  def testPstatsProfile(self):
+    profile = cpplint._PstatsProfile()
+    profile.Enable()
+    cpplint.ProcessFileData('foo.cc', 'cc', ['int a;', ''],
+                            ErrorCollector(self.assert_))
+    path = os.path.join(self.temp_directory, 'profile.prof')
+    profile.Write(path)
+    stats = pstats.Stats(path)
+    self.assertTrue([function for function in stats.stats
+                     if function[2] == 'CheckSpacing'])
+
+
+class RunMetricsTest(TemporaryDirectoryTestBase):
+
+  def testRunMetrics(self):
+    filename = self.WriteFile('foo.cc', b'int a; \nint b;\n')
+    metrics_path = os.path.join(self.temp_directory, 'metrics.prom')
+    self.WriteFile('CPPLINT.cfg', 'set noparent\nfilter=-legal\n')
+    metrics = cpplint._RunMetrics()
+    old_state = cpplint._cpplint_state.metrics
+    old_stdout = sys.stdout
+    old_stderr = sys.stderr
+    cpplint._cpplint_state.metrics = metrics
+    metrics.Enable()
+    try:
+      sys.stdout = sys.stderr = codecs.open(os.devnull, 'w', 'utf8')
+      cpplint.ProcessFile(filename, 0)
+      # The CPPLINT.cfg file is cached, and only counted once.
+      cpplint._BackupFilters()
+      cpplint.ProcessConfigOverrides(filename)
+      cpplint._RestoreFilters()
+      cpplint.Search(r'\bmetrics_test_pattern\b', 'x')
+      cpplint.Search(r'\bmetrics_test_pattern\b', 'x')
+      metrics.Write(metrics_path)
+      with open(metrics_path) as metrics_file:
+        written = metrics_file.read().splitlines()
+    finally:
+      sys.stdout.close()
+      sys.stdout = old_stdout
+      sys.stderr = old_stderr
+      metrics.Disable()
+      cpplint._cpplint_state.metrics = old_state
+    self.assertEquals(1, metrics.files)
+    self.assertEquals(3, metrics.lines)
+    self.assertEquals(15, metrics.bytes_read)
+    self.assertEquals(1, metrics.config_files)
+    self.assertTrue(metrics.cache_hits >= 1)
+    self.assertTrue(metrics.cache_misses >= 1)
+    self.assertEquals({'whitespace/end_of_line': 1},
+                      metrics.errors_by_category)
+    self.assertTrue('cpplint_files_total 1' in written)
+    self.assertTrue('cpplint_read_bytes_total 15' in written)
+    self.assertTrue('cpplint_errors_total{category="whitespace/end_of_line"} 1'
+                    in written)
+    self.assertTrue('# TYPE cpplint_cpu_seconds gauge' in written)
+    self.assertEquals('# EOF', written[-1])
+
+
+class GeneratedFilesTest(TemporaryDirectoryTestBase):
+
+  def setUp(self):
+    TemporaryDirectoryTestBase.setUp(self)
+    self.old_generated_files = cpplint._generated_files
+
+  def tearDown(self):
+    TemporaryDirectoryTestBase.tearDown(self)
+    cpplint._generated_files = self.old_generated_files
+
+  def Lint(self, path):
+    """Returns the error count and the messages on stderr of ProcessFile."""
+    old_stdout = sys.stdout
+    old_stderr = sys.stderr
+    messages = []
+    cpplint._cpplint_state.ResetErrorCounts()
+    try:
+      sys.stdout = codecs.open(os.devnull, 'w', 'utf8')
+      sys.stderr = codecs.open(os.devnull, 'w', 'utf8')
+      sys.stderr.write = messages.append
+      cpplint.ProcessFile(path, 0)
+    finally:
+      sys.stdout.close()
+      sys.stdout = old_stdout
+      sys.stderr = old_stderr
+    return (cpplint._cpplint_state.error_count, ''.join(messages))
+
+  def testFindGeneratedFileMarker(self):
+    markers = cpplint._GENERATED_FILE_MARKERS
+    self.assertEquals('@generated', cpplint.FindGeneratedFileMarker(
+        ['// Copyright 2014 Your Company.', '// @generated', 'int a;'],
+        markers))
+    self.assertEquals(None, cpplint.FindGeneratedFileMarker(
+        ['int a;'] * 1000 + ['// DO NOT EDIT'], markers))
+    self.assertEquals(None, cpplint.FindGeneratedFileMarker([], markers))
+
+  def testPolicies(self):
+    self.WriteFile('CPPLINT.cfg', b'set noparent\n')
+    path = self.WriteFile(
+        'foo.pb.cc',
+        b'// Generated by the protocol buffer compiler.  DO NOT EDIT!\n'
+        b'int a; \n')
+    bad_path = self.WriteFile('bad.pb.cc', b'// @generated\nint b = "\xff";\n')
+
+    cpplint._generated_files = 'full'
+    self.assertTrue(self.Lint(path)[0] > 0)
+
+    cpplint._generated_files = 'reduced'
+    self.assertEquals((1, '%s:2:  Line ends in whitespace.  Consider deleting '
+                       'these extra spaces.  [whitespace/end_of_line] [4]\n' %
+                       path), self.Lint(path))
+    self.assertEquals(1, self.Lint(bad_path)[0])
+
+    cpplint._generated_files = 'skip'
+    (error_count, messages) = self.Lint(path)
+    self.assertEquals(0, error_count)
+    self.assertTrue('Ignoring "%s": generated file (found "DO NOT EDIT")' %
+                    path in messages, messages)
+
+  def testReducedChecks(self):
+    lines = ['// @generated', 'int\ta;', 'int b; ', 'int c;  // NOLINT ',
+             u'int d = "\ufffd\0";', '#include "%s.h"' % ('x' * 80),
+             '// ' + 'y' * 80, '']
+    error_collector = ErrorCollector(self.assert_)
+    cpplint.ProcessGeneratedFileData(
+        'foo.pb.cc', lines, error_collector, check_bad_characters=True)
+    self.assertEquals([
+        'Tab found; better to use spaces  [whitespace/tab] [1]',
+        'Line ends in whitespace.  Consider deleting these extra spaces.  '
+        '[whitespace/end_of_line] [4]',
+        'Line contains invalid UTF-8 (or Unicode replacement character).  '
+        '[readability/utf8] [5]',
+        'Line contains NUL byte.  [readability/nul] [5]',
+        'Lines should be <= 80 characters long  [whitespace/line_length] [2]'],
+                      error_collector.ResultList())
+
+  def testConfig(self):
+    self.WriteFile('CPPLINT.cfg',
+                   b'set noparent\n'
+                   b'generated_files=skip\n'
+                   b'generated_marker=Made by gen.py\n')
+    path = self.WriteFile('foo.cc', b'// Made by gen.py\nint a; \n')
+    # The nearest configuration wins, and its markers add to the parent's.
+    self.WriteFile('full/CPPLINT.cfg', b'generated_files=full\n')
+    full_path = self.WriteFile('full/foo.cc', b'// Made by gen.py\nint a; \n')
+
+    cpplint._generated_files = 'full'
+    self.assertEquals(0, self.Lint(path)[0])
+    self.assertTrue(self.Lint(full_path)[0] > 0)
+    self.assertEquals(list(cpplint._GENERATED_FILE_MARKERS) +
+                      ['Made by gen.py'],
+                      cpplint._cpplint_state.generated_file_markers)
+    # Each file gets the settings of its own configuration files.
+    self.assertEquals(0, self.Lint(path)[0])
+
+
+class DaemonTest(TemporaryDirectoryTestBase):
+
+  def setUp(self):
+    TemporaryDirectoryTestBase.setUp(self)
+    self.daemon = cpplint._LintDaemon(
+        os.path.join(self.temp_directory, 'cpplint.sock'))
+
+  def tearDown(self):
+    self.daemon.Close()
+    TemporaryDirectoryTestBase.tearDown(self)
+
+  def Forward(self, args, stdin=None):
+    """Returns the exit status, stdout and stderr of a request.
+
+    Like cpplint_client.py, stdin is only sent if the arguments read it.
+    """
+    if not cpplint_client.ReadsStdin(args):
+      stdin = None
+    thread = threading.Thread(
+        target=lambda: self.daemon.Serve(self.daemon.socket.accept()[0]))
+    thread.start()
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    try:
+      status = cpplint_client.Forward(self.daemon.path, args,
+                                      self.temp_directory, stdin, stdout,
+                                      stderr)
+    finally:
+      thread.join()
+    return (status, stdout.getvalue(), stderr.getvalue())
+
+  def Send(self, data):
+    """Returns the decoded reply of the daemon to the bytes sent."""
+    thread = threading.Thread(
+        target=lambda: self.daemon.Serve(self.daemon.socket.accept()[0]))
+    thread.start()
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      client.connect(self.daemon.path)
+      client.sendall(data)
+      reply = b''
+      while True:
+        chunk = client.recv(4096)
+        if not chunk:
+          break
+        reply += chunk
+    finally:
+      client.close()
+      thread.join()
+    return [json.loads(line) for line in reply.decode('utf8').splitlines()]
+
+  def testMalformedRequests(self):
+    for (request, message) in (
+        (b'[]', u'A request must be a JSON object.'),
+        (b'null', u'A request must be a JSON object.'),
+        (b'{"argv": ["foo.cc"]}', u'A request must have "cwd".'),
+        (b'{"argv": "foo.cc", "cwd": "/"}',
+         u'"argv" must be a list of strings.'),
+        (b'{"argv": ["-"], "cwd": "/", "stdin": 1}',
+         u'"stdin" must be a string.')):
+      self.assertEquals([{u'stderr': message + u'\n'}, {u'exit': 1}],
+                        self.Send(request + b'\n'))
+    reply = self.Send(b'{"argv": ["-"], "cwd": "/", "stdin": "\\u0100"}\n')
+    self.assertEquals({u'exit': 1}, reply[-1])
+    self.assertEquals((0, u'', u''),
+                      self.Forward(['--quiet', '--filter=-legal', '-'], b''))
+
+  def testSilentClient(self):
+    old_timeout = cpplint._DAEMON_REQUEST_TIMEOUT_SECONDS
+    cpplint._DAEMON_REQUEST_TIMEOUT_SECONDS = 0.1
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      client.connect(self.daemon.path)
+      self.daemon.Serve(self.daemon.socket.accept()[0])
+    finally:
+      cpplint._DAEMON_REQUEST_TIMEOUT_SECONDS = old_timeout
+      client.close()
+    self.assertEquals((0, u'', u''),
+                      self.Forward(['--quiet', '--filter=-legal', '-'], b''))
+
+  def testSameOutputAsCpplint(self):
+    self.WriteFile('foo.cc', b'int a; \n')
+    args = ['--counting=detailed', 'foo.cc']
+    self.assertEquals(self.RunCpplint(args), self.Forward(args))
+
+  def testStdinAndUsageErrors(self):
+    self.assertEquals(
+        (0, u'Done processing -\nTotal errors found: 0\n', u''),
+        self.Forward(['-'], b'// Copyright 2014 Your Company.\nint a;\n'))
+    (status, stdout, stderr) = self.Forward(['--linelength=x', 'foo.cc'])
+    self.assertEquals(1, status)
+    self.assertTrue(stderr.endswith(
+        '\nFATAL ERROR: Line length must be digits.\n'), stderr)
+
+  def testStdinLists(self):
+    self.WriteFile('foo.cc', b'int a; \n')
+    self.WriteFile('bar.cc', b'// Copyright 2014 Your Company.\n')
+    direct = self.RunCpplint(['--files-from=-'], b'foo.cc\nbar.cc\n')
+    self.assertEquals(1, direct[0])
+    self.assertEquals(direct,
+                      self.Forward(['--files-from=-'], b'foo.cc\nbar.cc\n'))
+    diff = (b'--- a/foo.cc\n+++ b/foo.cc\n@@ -0,0 +1 @@\n+int a; \n')
+    (status, stdout, stderr) = self.Forward(['--diff=-', 'foo.cc'], diff)
+    self.assertEquals((1, u'Done processing foo.cc\nTotal errors found: 1\n'),
+                      (status, stdout))
+    self.assertFalse(cpplint_client.ReadsStdin(['--files-from=list.txt']))
+
+  def testRequestsDoNotShareState(self):
+    self.WriteFile('foo.cc', b'// Copyright 2014 Your Company.\nint a; \n')
+    state = cpplint._cpplint_state
+    process_file_data = cpplint.ProcessFileData
+    first = self.Forward(['foo.cc'])
+    self.assertEquals(1, first[0])
+    self.assertEquals(1, self.Forward(['--linelength=5', '--quiet',
+                                   '--metrics=foo.prom', 'foo.cc'])[0])
+    self.assertEquals(first, self.Forward(['foo.cc']))
+    self.assertEquals(80, cpplint._line_length)
+    self.assertTrue(state is cpplint._cpplint_state)
+    self.assertTrue(process_file_data is cpplint.ProcessFileData)
+
+  def testCachesFollowChanges(self):
+    config = self.WriteFile('CPPLINT.cfg', b'set noparent\nlinelength=5\n')
+    self.WriteFile('foo.cc', b'// Copyright 2014 Your Company.\n')
+    self.assertEquals(1, self.Forward(['foo.cc'])[0])
+    with open(config, 'wb') as output:
+      output.write(b'set noparent\nlinelength=100\n')
+    self.assertEquals(0, self.Forward(['foo.cc'])[0])
+
+    os.mkdir(os.path.join(self.temp_directory, 'sub'))
+    header = cpplint.FileInfo(self.WriteFile('sub/foo.h', b''))
+    self.assertEquals(header.FullName(), header.RepositoryName())
+    os.mkdir(os.path.join(self.temp_directory, '.git'))
+    self.assertEquals('sub/foo.h', header.RepositoryName())
+
+
+class PersistentWorkerTest(unittest.TestCase):
+
+  def Answer(self, *requests):
+    """Returns the responses of RunPersistentWorker to requests."""
+    responses = io.BytesIO()
+    cpplint.RunPersistentWorker(
+        io.BytesIO(b''.join(
+            (request if isinstance(request, bytes) else
+             json.dumps(request).encode('ascii')) + b'\n'
+            for request in requests)),
+        responses)
+    return [json.loads(line.decode('ascii'))
+            for line in responses.getvalue().splitlines()]
+
+  def testRequests(self):
+    contents = u'// Copyright 2014 Your Company.\nint a; \nint b;  // NOLINT\n'
+    state = cpplint._cpplint_state
+    responses = self.Answer(
+        {'id': 'a', 'flags': ['--counting=detailed', '--linelength=10'],
+         'files': ['foo.cc'], 'contents': {'foo.cc': contents}},
+        b'',
+        {'id': 'b', 'files': ['foo.cc'], 'contents': {'foo.cc': contents}},
+        b'[]',
+        {'id': 'c', 'flags': ['--linelength=x'], 'files': ['foo.cc']})
+    self.assertEquals(4, len(responses))
+
+    self.assertEquals('a', responses[0]['id'])
+    self.assertEquals(1, responses[0]['exit'])
+    self.assertEquals(4, responses[0]['error_count'])
+    self.assertEquals({'whitespace/end_of_line': 1,
+                       'whitespace/line_length': 3},
+                      responses[0]['errors_by_category'])
+    self.assertEquals({'file': 'foo.cc', 'line': 2,
+                       'category': 'whitespace/end_of_line',
+                       'confidence': 4,
+                       'message': 'Line ends in whitespace.  '
+                                  'Consider deleting these extra spaces.'},
+                      responses[0]['errors'][2])
+    self.assertEquals('Done processing foo.cc\nTotal errors found: 4\n',
+                      responses[0]['stdout'])
+    self.assertTrue(responses[0]['seconds'] >= 0)
+
+    # Nothing is left over from the flags of the first request.
+    self.assertEquals(['whitespace/end_of_line'],
+                      [error['category'] for error in responses[1]['errors']])
+    self.assertEquals({}, responses[1]['errors_by_category'])
+
+    self.assertEquals(
+        {'id': None, 'exit': 1, 'stderr': 'A request must be a JSON object.\n'},
+        responses[2])
+    self.assertEquals(1, responses[3]['exit'])
+    self.assertTrue(responses[3]['stderr'].endswith(
+        'FATAL ERROR: Line length must be digits.\n'))
+
+    self.assertTrue(state is cpplint._cpplint_state)
+    self.assertEquals(80, cpplint._line_length)
+    self.assertEquals({}, cpplint._cpplint_state.file_contents)
+
+  def testMalformedRequests(self):
+    self.assertEquals(
+        [{'id': 'a', 'exit': 1,
+          'stderr': '"flags" must be a list of strings.\n'},
+         {'id': 'b', 'exit': 1,
+          'stderr': '"files" must be a list of strings.\n'},
+         {'id': 'c', 'exit': 1,
+          'stderr': '"contents" must be an object of strings.\n'},
+         {'id': None, 'exit': 1,
+          'stderr': 'A request must be a JSON object.\n'},
+         {'id': 'd', 'exit': 0, 'stderr': ''}],
+        [dict((key, response[key]) for key in ('id', 'exit', 'stderr'))
+         for response in self.Answer(
+             {'id': 'a', 'flags': '--quiet', 'files': ['x.cc']},
+             {'id': 'b', 'files': ['x.cc', 1]},
+             {'id': 'c', 'files': ['x.cc'], 'contents': {'x.cc': None}},
+             b'"x.cc"',
+             {'id': 'd', 'flags': ['--quiet', '--filter=-legal'],
+              'files': ['x.cc'], 'contents': {'x.cc': ''}})])
+
+
+class IncrementalLinterTest(unittest.TestCase):
+
+  def Collect(self, errors):
+    """Returns an error function that appends the printed errors to errors."""
+    def Error(filename, linenum, category, confidence, message):
+      if cpplint._ShouldPrintError(category, confidence, linenum):
+        errors.append((filename, linenum, category, confidence, message))
+    return Error
+
+  def assertUpdateMatches(self, linter, lines):
+    """Checks that linter.Update(lines) reports as ProcessFileData does."""
+    expected = []
+    cpplint.ProcessFileData(linter.filename, linter.file_extension,
+                            list(lines), self.Collect(expected))
+    errors = []
+    linter.Update(lines, self.Collect(errors))
+    self.assertEquals(expected, errors)
+
+  def testEditsReportAsProcessFileData(self):
+    (filename, lines) = cpplint_benchmark.GenerateCorpus(7, 200, 200)[0]
+    lines = list(lines)
+    linter = cpplint.IncrementalLinter(filename, 'cc', checkpoint_interval=20)
+    self.assertUpdateMatches(linter, lines)
+    self.assertEquals(len(lines) + 2, linter.lines_checked)
+
+    lines[100] += '  // NOLINT'
+    self.assertUpdateMatches(linter, lines)
+    self.assertTrue(linter.lines_checked <= 40, linter.lines_checked)
+
+    edits = [
+        lambda: lines.insert(80, '{'),
+        lambda: lines.pop(80),
+        lambda: lines.insert(50, '/*'),
+        lambda: lines.insert(150, '*/'),
+        lambda: lines.insert(30, 'const char* s = R"(x'),
+        lambda: lines.insert(35, ')";'),
+        lambda: lines.__setitem__(slice(100, 105), ['class A {', '};']),
+        lambda: lines.insert(140, '  int x = f(a,'),
+        lambda: lines.insert(10, '#include <string>'),
+        lambda: lines.__delitem__(slice(15, 25)),
+        lambda: lines.insert(len(lines) - 5, '}'),
+    ]
+    for edit in edits:
+      edit()
+      self.assertUpdateMatches(linter, lines)
+
+  def testChecksAgainLinesThatReadTheEdit(self):
+    copyright = '// Copyright 2014 Your Company.'
+    # The check of the opening brace looks for a semicolon after the closing
+    # one, further than a checkpoint away.
+    lines = ([copyright, 'void f() {'] +
+             ['  int a%d;' % i for i in range(60)] + ['};', ''])
+    linter = cpplint.IncrementalLinter('foo.cc', 'cc', checkpoint_interval=20)
+    self.assertUpdateMatches(linter, lines)
+    lines[62] = '}'
+    self.assertUpdateMatches(linter, lines)
+
+    # The check of an opening brace on its own line looks back over the
+    # blank lines before it.
+    lines = [copyright, 'int x = 0;'] + [''] * 60 + ['{', '};', '']
+    linter = cpplint.IncrementalLinter('foo.cc', 'cc', checkpoint_interval=20)
+    self.assertUpdateMatches(linter, lines)
+    lines[1] = 'int x = 0'
+    self.assertUpdateMatches(linter, lines)
+    self.assertTrue(linter.lines_checked < len(lines), linter.lines_checked)
+
+  def testShiftsLineNumbersInMessages(self):
+    lines = (['// Copyright 2014 Your Company.'] + [''] * 30 +
+             ['#include <map>'] + [''] * 30 + ['#include <map>', ''])
+    linter = cpplint.IncrementalLinter('foo.cc', 'cc', checkpoint_interval=20)
+    self.assertUpdateMatches(linter, lines)
+    lines.insert(5, 'int a;')
+    self.assertUpdateMatches(linter, lines)
+    self.assertTrue(linter.lines_checked < len(lines), linter.lines_checked)
+
+  def testCancel(self):
+    (filename, lines) = cpplint_benchmark.GenerateCorpus(7, 200, 200)[0]
+    lines = list(lines)
+    linter = cpplint.IncrementalLinter(filename, 'cc', checkpoint_interval=20)
+    errors = []
+    self.assertRaises(cpplint.LintCancelled, linter.Update, lines,
+                      self.Collect(errors), lambda: True)
+    self.assertEquals([], errors)
+    self.assertUpdateMatches(linter, lines)
+
+    # A cancelled version is not the one the next is compared with.
+    lines.insert(100, 'int x;')
+    self.assertRaises(cpplint.LintCancelled, linter.Update, lines,
+                      self.Collect(errors), lambda: True)
+    lines.insert(150, '}')
+    self.assertUpdateMatches(linter, lines)
+
+  def testFlagsChangeChecksAllLines(self):
+    lines = ['// Copyright 2014 Your Company.', 'int a;  // ' + 'x' * 90, '']
+    linter = cpplint.IncrementalLinter('foo.cc', 'cc')
+    self.assertUpdateMatches(linter, lines)
+    old_line_length = cpplint._line_length
+    try:
+      cpplint._line_length = 120
+      self.assertUpdateMatches(linter, lines)
+      self.assertEquals(len(lines) + 2, linter.lines_checked)
+    finally:
+      cpplint._line_length = old_line_length
+
+
+class LanguageServerTest(TemporaryDirectoryTestBase):
+
+  def setUp(self):
+    TemporaryDirectoryTestBase.setUp(self)
+    (read_fd, write_fd) = os.pipe()
+    self.client = os.fdopen(write_fd, 'wb')
+    reader = os.fdopen(read_fd, 'rb')
+    self.output = io.BytesIO()
+    self.status = []
+    self.server = threading.Thread(target=lambda: self.status.append(
+        cpplint.RunLanguageServer(['--filter=-legal'], reader, self.output,
+                                  debounce=0.2)))
+    self.server.start()
+
+  def tearDown(self):
+    self.client.close()
+    self.server.join()
+    TemporaryDirectoryTestBase.tearDown(self)
+
+  def Send(self, message):
+    body = json.dumps(dict(message, jsonrpc='2.0')).encode('ascii')
+    self.client.write(('Content-Length: %d\r\n\r\n' % len(body)).encode('ascii')
+                      + body)
+    self.client.flush()
+
+  def Messages(self):
+    """Returns the messages the server sent so far."""
+    messages = []
+    output = io.BytesIO(self.output.getvalue())
+    while True:
+      message = cpplint._ReadLspMessage(output)
+      if message is None:
+        return messages
+      messages.append(message)
+
+  def WaitFor(self, predicate):
+    """Returns the messages sent so far once one satisfies predicate."""
+    for _ in xrange(200):
+      messages = self.Messages()
+      if any(predicate(message) for message in messages):
+        return messages
+      time.sleep(0.05)
+    self.fail('No such message in %s' % messages)
+
+  def testDiagnostics(self):
+    uri = 'file://' + os.path.join(self.temp_directory, 'a%20b.cc')
+    self.Send({'id': 1, 'method': 'initialize', 'params': {}})
+    messages = self.WaitFor(lambda message: message.get('id') == 1)
+    self.assertEquals(1, messages[0]['result']['capabilities']
+                      ['textDocumentSync']['change'])
+
+    def Diagnostics(version):
+      """Waits for the diagnostics of a version of the document."""
+      return [message['params']['diagnostics']
+              for message in self.WaitFor(lambda message: IsPublished(
+                  message, version))
+              if IsPublished(message, version)]
+
+    def IsPublished(message, version):
+      return (message.get('method') == 'textDocument/publishDiagnostics' and
+              message['params'].get('version') == version)
+
+    self.Send({'method': 'textDocument/didOpen', 'params': {'textDocument': {
+        'uri': uri, 'version': 1, 'text': u'int a; \n'}}})
+    self.assertEquals(
+        [[{'range': {'start': {'line': 0, 'character': 0},
+                     'end': {'line': 1, 'character': 0}},
+           'severity': 2, 'source': 'cpplint',
+           'code': 'whitespace/end_of_line',
+           'message': 'Line ends in whitespace.  '
+                      'Consider deleting these extra spaces.',
+           'data': {'confidence': 4}}]],
+        Diagnostics(1))
+
+    # A burst of changes is linted once, at its end.
+    for version in (2, 3, 4):
+      self.Send({'method': 'textDocument/didChange', 'params': {
+          'textDocument': {'uri': uri, 'version': version},
+          'contentChanges': [{'text': u'int a;\n' + u'int b; \n' * version}]}})
+    self.assertEquals(4, len(Diagnostics(4)[0]))
+    self.assertEquals([], [message for message in self.Messages()
+                           if IsPublished(message, 2) or
+                           IsPublished(message, 3)])
+
+    self.Send({'id': 2, 'method': 'textDocument/hover', 'params': {}})
+    self.Send({'method': 'textDocument/didClose',
+               'params': {'textDocument': {'uri': uri}}})
+    self.assertEquals([[]], Diagnostics(None))
+    messages = self.WaitFor(lambda message: message.get('id') == 2)
+    self.assertEquals(-32601, [message for message in messages
+                               if message.get('id') == 2][0]['error']['code'])
+
+    self.Send({'id': 3, 'method': 'shutdown'})
+    self.Send({'method': 'exit'})
+    self.server.join()
+    self.assertEquals([0], self.status)
+
+
+class LintTextsTest(TemporaryDirectoryTestBase):
+
+  def testFindings(self):
+    findings = list(cpplint.LintTexts([
+        ('foo.cc', u'// Copyright 2014 Your Company.\nint a ;\n'),
+        ('bar.txt', 'int a ;\n'),
+        ('baz.cc', b'// Copyright 2014 Your Company.\r\nint b;\r\n')]))
+    self.assertEquals([
+        cpplint.Finding('foo.cc', 2, 'whitespace/semicolon', 5,
+                        'Extra space before last semicolon. If this should '
+                        'be an empty statement, use {} instead.')],
+                      findings)
+
+  def testConfig(self):
+    text = (u'// Copyright 2014 Your Company.\n'
+            u'int a ;  // ' + u'\xe9' * 50 + u'\n')
+    config = cpplint.LintConfig(filters='-whitespace/semicolon',
+                                linelength=60, extensions=['cpp'])
+    self.assertEquals(
+        [('foo.cpp', 2, 'whitespace/line_length', 2)],
+        [finding[:4] for finding in cpplint.LintTexts([
+            ('foo.cc', text), ('foo.cpp', text)], config)])
+    self.assertEquals(80, cpplint._line_length)
+    self.assertRaises(ValueError, cpplint.LintConfig, filters='whitespace')
+    self.assertRaises(ValueError, cpplint.LintConfig, generated_files='some')
+
+  def testClosesEverySource(self):
+    sources = []
+    closed = []
+    read_source_file = cpplint.ReadSourceFile
+
+    def ReadAndTrack(filename):
+      source = read_source_file(filename)
+      sources.append(filename)
+      close = source.Close
+      source.Close = lambda: (closed.append(filename), close())
+      return source
+
+    generated = u'// Generated by the protocol buffer compiler.\nint a ;\n'
+    cpplint.ReadSourceFile = ReadAndTrack
+    try:
+      findings = list(cpplint.LintTexts(
+          [('foo.cc', u'int a ;\n'), ('bar.txt', u'int a ;\n'),
+           ('baz.pb.cc', generated)],
+          cpplint.LintConfig(filters='-legal', generated_files='skip')))
+    finally:
+      cpplint.ReadSourceFile = read_source_file
+    self.assertEquals(['foo.cc'], [finding.file for finding in findings])
+    self.assertEquals(['foo.cc', 'bar.txt', 'baz.pb.cc'], sources)
+    self.assertEquals(sources, closed)
+
+  def testReadsNothingFromDiskUnlessAsked(self):
+    os.mkdir(os.path.join(self.temp_directory, '.git'))
+    self.WriteFile('foo/CPPLINT.cfg', 'filter=-legal/copyright\nunknown=1\n')
+    self.WriteFile('foo/bar.h', '#include <string>\n')
+    files = [(self.WriteFile('foo/bar.cc', '#include "foo/bar.h"\n'),
+              u'#include <vector>\nstd::string F();\n')]
+
+    old_streams = (sys.stdout, sys.stderr)
+    (sys.stdout, sys.stderr) = (None, None)
+    try:
+      default = list(cpplint.LintTexts(files))
+      configured = list(cpplint.LintTexts(files, cpplint.LintConfig(
+          config_files=True, filesystem_lookups=True)))
+    finally:
+      (sys.stdout, sys.stderr) = old_streams
+    self.assertEquals(['legal/copyright'],
+                      [finding.category for finding in default])
+    self.assertEquals([(1, 'build/include', 'foo/bar.cc should include its '
+                        'header file foo/bar.h')],
+                      [(finding.line, finding.category, finding.message)
+                       for finding in configured])
+    self.assertTrue(cpplint._cpplint_state.filesystem_lookups)
+
+  def testFailedSwapReleasesTheModule(self):
+    class Uncopyable(object):
+
+      def __copy__(self):
+        raise RuntimeError('uncopyable')
+
+    old_root = cpplint._root
+    cpplint._root = Uncopyable()
+    try:
+      self.assertRaises(RuntimeError, list,
+                        cpplint.LintTexts([('foo.cc', u'int a ;\n')]))
+    finally:
+      cpplint._root = old_root
+    findings = []
+    thread = threading.Thread(target=lambda: findings.extend(
+        cpplint.LintTexts([('foo.cc', u'int a ;\n')])))
+    thread.daemon = True
+    thread.start()
+    thread.join(10)
+    self.assertFalse(thread.is_alive())
+    self.assertTrue(findings)
+
+  def testInterleaves(self):
+    findings = cpplint.LintTexts(
+        [('foo.cc', u'int a ;\n'), ('bar.cc', u'int b ;\n')],
+        cpplint.LintConfig(filters='-legal'))
+    self.assertEquals('foo.cc', next(findings).file)
+    self.assertEquals(
+        [('foo.cc', 1, 'whitespace/semicolon', 5)],
+        [finding[:4] for finding in cpplint.LintTexts(
+            [('foo.cc', u'int a ;\n' + u'x' * 81 + u'\n')],
+            cpplint.LintConfig(filters='-legal', linelength=100))])
+    self.assertEquals('bar.cc', next(findings).file)
+    self.assertRaises(StopIteration, next, findings)
+
+
+class LintFilesConcurrentlyTest(TemporaryDirectoryTestBase):
+
+  def setUp(self):
+    TemporaryDirectoryTestBase.setUp(self)
+    self.filenames = [
+        self.WriteFile('foo%d.cc' % i,
+                       '// Copyright 2014 Your Company.\n' + 'int a ;\n' * i)
+        for i in range(10)]
+
+  def testProcessPool(self):
+    missing = os.path.join(self.temp_directory, 'missing.cc')
+    results = sorted(cpplint.LintFilesConcurrently(
+        self.filenames + [missing], max_pending=3))
+    self.assertEquals(sorted(self.filenames + [missing]),
+                      [result.file for result in results])
+    for (i, filename) in enumerate(self.filenames):
+      result = [result for result in results if result.file == filename][0]
+      self.assertEquals(None, result.error)
+      self.assertEquals(
+          [(filename, line, 'whitespace/semicolon', 5)
+           for line in range(2, i + 2)],
+          [finding[:4] for finding in result.findings])
+    self.assertEquals(cpplint.FileFindings(missing, [],
+                                           "Can't open for reading"),
+                      results[-1])
+
+  def testBoundsPendingFiles(self):
+    taken = []
+
+    def Filenames():
+      for filename in self.filenames:
+        taken.append(filename)
+        yield filename
+
+    pool = multiprocessing.pool.ThreadPool(2)
+    try:
+      results = cpplint.LintFilesConcurrently(
+          Filenames(), cpplint.LintConfig(filters='-whitespace'), pool, 3)
+      self.assertEquals([], next(results).findings)
+      self.assertEquals(3, len(taken))
+      self.assertEquals(len(self.filenames) - 1, len(list(results)))
+    finally:
+      pool.terminate()
+
+  def testReportsFailedFiles(self):
+    (result,) = cpplint.LintFilesConcurrently(
+        self.filenames[:1], cpplint.LintConfig(extensions=iter(['cc'])))
+    self.assertEquals((self.filenames[0], []), result[:2])
+    self.assertTrue('pickle' in result.error, result.error)
+
+    class LostResult(object):
+
+      def ready(self):
+        return False
+
+      def wait(self, timeout):
+        time.sleep(timeout)
+
+    class LosingPool(object):
+
+      def apply_async(self, func, args):
+        return LostResult()
+
+    self.assertEquals(
+        [cpplint.FileFindings(self.filenames[0], [],
+                              'Not linted within 0.1 seconds')],
+        list(cpplint.LintFilesConcurrently(self.filenames[:1], None,
+                                           LosingPool(), timeout=0.1)))
+
+
+class DiffTest(TemporaryDirectoryTestBase):
+
+  def Git(self, *args):
+    subprocess.check_call(
+        ['git', '-c', 'user.name=a', '-c', 'user.email=a@b', '-c',
+         'commit.gpgsign=false'] + list(args),
+        cwd=self.temp_directory, stdout=subprocess.PIPE)
+
+  def testParseUnifiedDiff(self):
+    self.assertEquals({'foo.cc': set([3, 7, 8]), 'new.h': set([0, 1, 2]),
+                       'qu"o\\te\t\xc3\xa9.cc': set([1])},
+                      cpplint.ParseUnifiedDiff("""\
+diff --git a/foo.cc b/foo.cc
+--- a/foo.cc
++++ b/foo.cc
+@@ -3 +3 @@ int a;
+--- removed line that looks like a header
++++ added line that looks like a header
+@@ -10,0 +7,2 @@
++int b;
++int c;
+@@ -20,2 +18,0 @@
+-int d;
+-int e;
+--- a/gone.cc
++++ /dev/null
+@@ -1 +0,0 @@
+-int f;
+--- old.cc\t2014-01-01
++++ old.cc\t2014-01-02
+@@ -5 +4,0 @@
+-int g;
+--- /dev/null
++++ b/new.h
+@@ -0,0 +1,2 @@
++int h;
++int i;
+\\ No newline at end of file
+--- "a/qu\\"o\\\\te\\t\\303\\251.cc"
++++ "b/qu\\"o\\\\te\\t\\303\\251.cc"
+@@ -1 +1 @@
+-int j;
++int k;
+""".split('\n')))
+
+  def testLinesToCheck(self):
+    lines = ['// Copyright 2014 Your Company.',
+             'namespace {',
+             'class A {',
+             ' public:',
+             '  void F() { if(a) {} }',
+             '};',
+             'int b ;',
+             'int c ;',
+             '}  // namespace',
+             '']
+    all_errors = []
+    cpplint.ProcessFileData('foo.cc', 'cc', list(lines), lambda *error:
+                            all_errors.append(error))
+    errors = []
+    cpplint.ProcessFileData('foo.cc', 'cc', list(lines), lambda *error:
+                            errors.append(error), lines_to_check=set([5, 6]))
+    self.assertEquals([error for error in all_errors
+                       if error[1] in (0, 5, 6)], errors)
+    self.assertTrue([error for error in all_errors if error[1] == 7])
+
+  def testGitDiff(self):
+    self.WriteFile('foo.cc', '// Copyright 2014 Your Company.\n'
+                   'int a ;\nint b;\nint c;\n')
+    self.WriteFile('bar.cc', 'int a ;\nint b ;\n')
+    self.WriteFile('baz.txt', 'text\n')
+    self.Git('init', '-q')
+    self.Git('add', '.')
+    self.Git('commit', '-q', '-m', 'Initial')
+    self.WriteFile('foo.cc', '// Copyright 2014 Your Company.\n'
+                   'int a ;\nint b;\nint c ;\nint d ;\n')
+    self.WriteFile('bar.cc', 'int a ;\n')
+    self.WriteFile('baz.txt', 'more text\n')
+    self.WriteFile('new.cc', 'int e;\n')
+    self.Git('add', 'new.cc')
+
+    semicolon = ('Extra space before last semicolon. If this should be an '
+                 'empty statement, use {} instead.  [whitespace/semicolon] [5]')
+    self.assertEquals(
+        (1, 'Done processing foo.cc\nDone processing new.cc\n'
+         'Total errors found: 3\n',
+         'foo.cc:4:  %s\nfoo.cc:5:  %s\n'
+         'new.cc:0:  No copyright message found.  You should have a line: '
+         '"Copyright [year] <Copyright Owner>"  [legal/copyright] [5]\n' %
+         (semicolon, semicolon)),
+        self.RunCpplint(['--diff=HEAD']))
+    self.assertEquals(
+        (1, 'Done processing foo.cc\nTotal errors found: 1\n',
+         'foo.cc:5:  %s\n' % semicolon),
+        self.RunCpplint(['--diff=-', 'foo.cc', 'bar.cc'],
+                        b'--- a/foo.cc\n+++ b/foo.cc\n'
+                        b'@@ -4,0 +5 @@\n+int d ;\n'))
+    (status, stdout, stderr) = self.RunCpplint(['--diff=nosuchrev'])
+    self.assertEquals((1, ''), (status, stdout))
+    self.assertTrue(stderr.startswith('git diff nosuchrev failed: '), stderr)
+    # Not git diff's usage, which it prints outside of a work tree.
+    self.assertEquals(
+        (1, '', 'git diff HEAD failed: fatal: not a git repository (or any '
+         'of the parent directories): .git\n'),
+        self.RunCpplint(['--diff=HEAD'], cwd=tempfile.gettempdir()))
+    self.assertEquals(
+        (1, '', 'git diff --cached failed: not in a work tree\n'),
+        self.RunCpplint(['--staged'],
+                        cwd=os.path.join(self.temp_directory, '.git')))
+
+  def testStaged(self):
+    os.mkdir(os.path.join(self.temp_directory, 'src'))
+    self.WriteFile('src/foo.h', '// Copyright 2014 Your Company.\n'
+                   '#ifndef SRC_FOO_H_\n#define SRC_FOO_H_\n'
+                   'int a ;\n#endif  // SRC_FOO_H_\n')
+    self.WriteFile('src/CPPLINT.cfg', 'filter=-legal\n')
+    self.Git('init', '-q')
+    self.Git('add', '.')
+    self.Git('commit', '-q', '-m', 'Initial')
+    self.WriteFile('src/foo.h', '// Copyright 2014 Your Company.\n'
+                   '#ifndef SRC_FOO_H_\n#define SRC_FOO_H_\n'
+                   'int a ;\nint b ;\n#endif  // SRC_FOO_H_\n')
+    self.WriteFile('src/bar.cc', 'int c ;\n')
+    self.Git('add', 'src/foo.h', 'src/bar.cc')
+    self.WriteFile('src/foo.h', '')
+    self.WriteFile('src/bar.cc', '')
+    self.WriteFile('src/baz.cc', 'int d ;\n')
+
+    for (args, errors) in (
+        (['--staged'], ['src/bar.cc:1', 'src/foo.h:4', 'src/foo.h:5']),
+        (['--staged', '--diff=HEAD'], ['src/bar.cc:1', 'src/foo.h:5']),
+        (['--staged', 'src/bar.cc', 'src/baz.cc'], ['src/bar.cc:1'])):
+      stderr = self.RunCpplint(['--filter=-whitespace/ending_newline'] +
+                               args)[2]
+      self.assertEquals(errors, [line.split(':  ')[0]
+                                 for line in stderr.splitlines()])
+
+  def testFilesFromGit(self):
+    os.mkdir(os.path.join(self.temp_directory, 'sub'))
+    for name in ('a.cc', 'b.h', 'c.txt', 'sub/d.cc', 'sub/e.cc'):
+      self.WriteFile(name, '// Copyright 2014 Your Company.\n')
+    self.WriteFile('sub/CPPLINT.cfg', 'exclude_files=d\\.cc\n')
+    self.Git('init', '-q')
+    self.Git('add', '.')
+    self.WriteFile('f.cc', '')
+
+    self.assertEquals((1, 'Done processing a.cc\nDone processing b.h\n'
+                       'Done processing sub/e.cc\nTotal errors found: 1\n',
+                       'b.h:0:  No #ifndef header guard found, suggested CPP '
+                       'variable is: B_H_  [build/header_guard] [5]\n'),
+                      self.RunCpplint(['--files-from-git']))
+    self.assertEquals(
+        (0, 'Done processing sub/e.cc\nTotal errors found: 0\n', ''),
+        self.RunCpplint(['--files-from-git', 'sub']))
+    stderr = self.RunCpplint(['--files-from-git', '--staged'])[2]
+    self.assertTrue(stderr.endswith('FATAL ERROR: --files-from-git cannot be '
+                                    'combined with --diff or --staged.\n'),
+                    stderr)
+
+    # Failures are reported before anything is linted.
+    for (run, message) in (
+        (self.RunCpplint(['--files-from-git'], cwd=tempfile.gettempdir()),
+         'git ls-files failed: fatal: not a git repository'),
+        (self.RunCpplint(['--files-from-git', '..']),
+         'git ls-files failed: fatal: ..: '),
+        (self.RunCpplint(['--files-from-git'],
+                         env=dict(os.environ, PATH=self.temp_directory)),
+         'Cannot run git: ')):
+      (status, stdout, stderr) = run
+      self.assertEquals((1, ''), (status, stdout))
+      self.assertTrue(stderr.startswith(message), stderr)
+
+  def testSplitStream(self):
+    stream = io.BytesIO(b'a.cc\0bb.cc\0\0c.cc')
+    self.assertEquals(
+        [b'a.cc', b'bb.cc', b'c.cc'],
+        list(cpplint._SplitStream(lambda size: stream.read(3), b'\0')))
+
+
+class FileListTest(TemporaryDirectoryTestBase):
+
+  def setUp(self):
+    TemporaryDirectoryTestBase.setUp(self)
+    for name in ('a.cc', 'b c.cc', 'd.cc'):
+      self.WriteFile(name, '// Copyright 2014 Your Company.\nint a; \n')
+
+  def testResponseFile(self):
+    self.WriteFile('args.txt', '--filter=-whitespace\r\nb c.cc\n\nd.cc\n')
+    self.assertEquals(
+        (0, 'Done processing b c.cc\nDone processing d.cc\n'
+         'Done processing a.cc\nTotal errors found: 0\n', ''),
+        self.RunCpplint(['@args.txt', 'a.cc']))
+    (status, _, stderr) = self.RunCpplint(['@missing.txt'])
+    self.assertEquals(1, status)
+    self.assertTrue(stderr.endswith(
+        'FATAL ERROR: Cannot read the response file missing.txt.\n'), stderr)
+
+  def testFilesFrom(self):
+    self.WriteFile('files.txt', 'b c.cc\r\nd.cc\n')
+    self.assertEquals(
+        u'Done processing a.cc\nDone processing b c.cc\n'
+        u'Done processing d.cc\nTotal errors found: 0\n',
+        self.RunCpplint(['--filter=-whitespace', '--files-from=files.txt',
+                         'a.cc'])[1])
+    self.assertEquals(
+        u'Done processing b c.cc\nDone processing d.cc\n'
+        u'Total errors found: 0\n',
+        self.RunCpplint(['--filter=-whitespace', '--files-from=-'],
+                        b'b c.cc\0d.cc\0')[1])
+    self.assertEquals(
+        u'Done processing a.cc\nTotal errors found: 1\n',
+        self.RunCpplint(['--files-from=-'], b'a.cc\n')[1])
+    (status, _, stderr) = self.RunCpplint(['--files-from=-', '-'])
+    self.assertEquals(1, status)
+    self.assertTrue(stderr.endswith(
+        'FATAL ERROR: Only one of --files-from, --diff and the files can be '
+        'stdin.\n'), stderr)
+
+  def testReadFileList(self):
+    self.assertEquals(
+        ['a.cc', 'b\nc.cc'],
+        list(cpplint._ReadFileList(io.BytesIO(b'a.cc\0b\nc.cc\0'), False)))
+    self.assertEquals(
+        ['a.cc', 'b.cc'],
+        list(cpplint._ReadFileList(io.BytesIO(b'a.cc\r\n\nb.cc'), True)))
+    self.assertEquals([], list(cpplint._ReadFileList(io.BytesIO(), True)))
+
+
+class BenchmarkTest(unittest.TestCase):
+
+  def testCorpusIsReproducible(self):
+    corpus = cpplint_benchmark.GenerateCorpus(7, 200, 400)
+    self.assertEquals(corpus, cpplint_benchmark.GenerateCorpus(7, 200, 400))
+    self.assertNotEquals(corpus, cpplint_benchmark.GenerateCorpus(8, 200, 400))
+    self.assertEquals(['bench/file0.cc', 'bench/file0.h'],
+                      [path for (path, _) in corpus])
+    for (_, lines) in corpus:
+      self.assertTrue(200 <= len(lines) < 300)
+      self.assertEquals('', lines[-1])
+
+  def testRunAndCompare(self):
+    results = cpplint_benchmark.RunBenchmark(1, 100, 1, ['small'])
+    self.assertEquals(['small'], list(results['sizes']))
+    size = results['sizes']['small']
+    self.assertEquals(1, size['files'])
+    self.assertTrue(size['lines_per_second'] > 0)
+    baseline = json.loads(json.dumps(results))
+    old_stderr = sys.stderr
+    sys.stderr = codecs.open(os.devnull, 'w', 'utf8')
+    try:
+      self.assertEquals([], cpplint_benchmark.CompareResults(
+          results, baseline, 0.1))
+      baseline['sizes']['small']['lines_per_second'] *= 2
+      self.assertEquals(['small'], cpplint_benchmark.CompareResults(
+          results, baseline, 0.1))
+    finally:
+      sys.stderr.close()
+      sys.stderr = old_stderr
+
+  def testFindLineChecks(self):
+    checks = dict(cpplint_benchmark.FindLineChecks())
+    self.assertEquals(['filename', 'clean_lines', 'linenum', 'nesting_state',
+                       'error'], checks['CheckSpacing'])
+    self.assertEquals(['filename', 'nesting_state', 'clean_lines', 'line',
+                       'error'], checks['CheckForNamespaceIndentation'])
+    for name in ('CheckCasts', 'CheckLanguage', 'CheckForFunctionLengths',
+                 'CheckForNonConstReference', 'FlagCxx11Features'):
+      self.assertTrue(name in checks)
+    # Run from other checks, or once per file.
+    for name in ('CheckComment', 'CheckCStyleCast', 'CheckForHeaderGuard',
+                 'CheckForIncludeWhatYouUse'):
+      self.assertFalse(name in checks)
+    self.assertRaises(ValueError, cpplint_benchmark.FindLineChecks,
+                      ['CheckForHeaderGuard'])
+
+  def testRunCheckBenchmark(self):
+    results = cpplint_benchmark.RunCheckBenchmark(
+        1, 100, 1, ['CheckBraces', 'CheckForFunctionLengths'])
+    self.assertEquals(['CheckBraces', 'CheckForFunctionLengths'],
+                      sorted(results['checks']))
+    for check in results['checks'].values():
+      self.assertTrue(check['calls'] > 100)
+      self.assertTrue(check['seconds'] >= 0)
+
+  def testRegexFuzz(self):
+    rng = random.Random(1)
+    self.assertEquals('a::a:', cpplint_benchmark.FuzzInput(rng, 'scope', 5))
+    self.assertEquals(7, len(cpplint_benchmark.FuzzInput(rng, 'mixed', 7)))
+    regexps = cpplint_benchmark.FindRegexps(1)
+    # A _LazyRegex, a compiled regexp and a pattern passed to Match.
+    for pattern in (cpplint._RE_UNQUOTED_LINE_COMMENT.pattern,
+                    cpplint._RE_PATTERN_INCLUDE.pattern,
+                    r'^#define'):
+      self.assertTrue(pattern in regexps, pattern)
+
+    results = cpplint_benchmark.RunRegexFuzz(1, 16, 1)
+    self.assertEquals(sorted(regexps), sorted(results['regexps']))
+    regexp = results['regexps'][cpplint._RE_UNQUOTED_LINE_COMMENT.pattern]
+    self.assertEquals(len(cpplint_benchmark._FUZZ_INPUTS),
+                      len(regexp['inputs']))
+    self.assertEquals([2, 4, 8, 16], regexp['inputs']['quote']['lengths'])
+    self.assertTrue(regexp['worst_input'] in regexp['inputs'])
+
+
 class OrderOfIncludesTest(CpplintTestBase):
 
   def setUp(self):
@@ -4696,6 +6151,17 @@ class OrderOfIncludesTest(CpplintTestBase):
     self.include_state = cpplint._IncludeState()
     os.path.abspath = lambda value: value
 
+  def testFindHeader(self):
+    self.include_state.AddInclude('foo.h', 3)
+    self.include_state.ResetSection('if')
+    self.include_state.AddInclude('bar.h', 5)
+    self.assertEquals(3, self.include_state.FindHeader('foo.h'))
+    self.assertEquals(5, self.include_state.FindHeader('bar.h'))
+    self.include_state.ResetSection('else')
+    self.assertEquals(3, self.include_state.FindHeader('foo.h'))
+    self.assertEquals(-1, self.include_state.FindHeader('bar.h'))
+    self.assertEquals([[('foo.h', 3)], []], self.include_state.include_list)
+
   def testCheckNextIncludeOrder_OtherThenCpp(self):
     self.assertEqual('', self.include_state.CheckNextIncludeOrder(
         cpplint._OTHER_HEADER))